@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from card_store import CardStore
+from search_index import SearchIndex, field_texts
+from synthetic_corpus import generate_cards
+
+QUERIES = ["nuclear war", "economic growth", "ab", "climate change causes extinction", "trade"]
+PAGE_SIZE = 50
+
+
+# Return (result, seconds, bytes still allocated) for building something.
+# Timing and memory are measured in separate runs since tracing slows allocation.
+def measure(build):
+    start = time.perf_counter()
+    build()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, current
+
+
+# Scan a list of card dicts the way get_data did before the card store
+def search_dicts(cards, tokens, side):
+    results = []
+    for card in cards:
+        if side and card.get("side", "").lower() != side.lower():
+            continue
+        tagline_text, evidence_text, citation_text = field_texts(card)
+        score = 0.0
+        for token in tokens:
+            if token in tagline_text:
+                score += 50.0
+            if token in evidence_text:
+                score += 10.0
+            if token in citation_text:
+                score += 1.0
+        if score >= 5.0:
+            results.append((score, card))
+    results.sort(key=lambda x: x[0], reverse=True)
+    return len(results), [card for _, card in results[:PAGE_SIZE]]
+
+
+# Score through the inverted index and rebuild only the page's card dicts
+def search_store(store, index, tokens, side):
+    filters = store.filter_codes(side=side)
+    ranked = sorted(
+        (-score, card_id) for card_id, score in index.score(tokens).items()
+        if score >= 5.0 and store.matches_filters(card_id, filters)
+    )
+    return len(ranked), store.cards(card_id for _, card_id in ranked[:PAGE_SIZE])
+
+
+def time_queries(search, repeat):
+    timings = {}
+    for query in QUERIES:
+        tokens = query.split()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            total, page = search(tokens, "aff")
+        timings[query] = ((time.perf_counter() - start) / repeat * 1000, total)
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare list-of-dicts cards with the columnar card store.")
+    parser.add_argument("--num_cards", type=int, default=20000, help="Number of synthetic cards")
+    parser.add_argument("--input_json", help="Use a real card JSON file instead of synthetic cards")
+    parser.add_argument("--repeat", type=int, default=3, help="Times to run each query")
+    args = parser.parse_args()
+
+    if args.input_json:
+        with open(args.input_json, "r", encoding="utf-8") as f:
+            raw = f.read()
+    else:
+        raw = json.dumps(generate_cards(args.num_cards))
+
+    cards, load_s, dicts_bytes = measure(lambda: json.loads(raw))
+    store, store_s, store_bytes = measure(lambda: CardStore.from_cards(cards))
+    index, index_s, index_bytes = measure(lambda: SearchIndex.from_cards(cards))
+
+    print(f"Cards: {len(cards)}")
+    print(f"{'':<22}{'build (s)':>12}{'memory (MB)':>14}")
+    print(f"{'list of dicts':<22}{load_s:>12.2f}{dicts_bytes / 1e6:>14.1f}")
+    print(f"{'card store':<22}{store_s:>12.2f}{store_bytes / 1e6:>14.1f}")
+    print(f"{'search index':<22}{index_s:>12.2f}{index_bytes / 1e6:>14.1f}")
+
+    dict_times = time_queries(lambda tokens, side: search_dicts(cards, tokens, side), args.repeat)
+    store_times = time_queries(lambda tokens, side: search_store(store, index, tokens, side), args.repeat)
+
+    print(f"\n{'query':<36}{'hits':>8}{'dicts (ms)':>12}{'store (ms)':>12}")
+    for query in QUERIES:
+        dict_ms, total = dict_times[query]
+        store_ms, _ = store_times[query]
+        print(f"{query:<36}{total:>8}{dict_ms:>12.1f}{store_ms:>12.1f}")
@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tournament_classifier import DEFAULT_SEASON_FILE, TournamentClassifier, scan_files
+from synthetic_corpus import make_vocabulary
+
+ROUNDS = ["round-1", "round-2", "round-3", "round-4", "round-5", "round-6", "octas", "quarters", "semis", "finals"]
+SIDES = ["aff", "neg", "pro", "con"]
+
+
+# --------------- ORIGINAL CLASSIFICATION ---------------
+# extract_cards.py before the tables were compiled (with the same tables,
+# read from the season file), kept as the reference output
+def legacy_wanted(file, tournaments):
+    ext = os.path.splitext(file)[1].lower()
+    return ext in ['.docx', '.pdf'] and any(t in file.lower() for t in tournaments)
+
+
+def legacy_find_files(root_folders, tournaments):
+    files_found = []
+    for root_folder in root_folders:
+        for dirpath, _, filenames in os.walk(root_folder):
+            for file in filenames:
+                if legacy_wanted(file, tournaments):
+                    files_found.append(os.path.join(dirpath, file))
+    return files_found
+
+
+def legacy_determine_topic(filename, topics):
+    filename = filename.lower()
+    for table in topics:
+        for t in table["tournaments"]:
+            if t in filename:
+                return table["topic"]
+    return None
+
+
+# --------------- FILE TREE ---------------
+# File names laid out like OpenCaselist downloads: school, team, side,
+# tournament and round, with some files from tournaments outside the season
+# tables and some that are not .docx/.pdf
+def make_names(num_files, season, seed=0):
+    rng = random.Random(seed)
+    words, _ = make_vocabulary(rng, 3000)
+    slugs = season["tournaments"] + [t.strip("-") for table in season["topics"] for t in table["tournaments"]]
+    names = []
+    for _ in range(num_files):
+        school = rng.choice(words).capitalize()
+        team = rng.choice(words)[:2].upper() + rng.choice(words)[:2].upper()
+        tournament = rng.choice(slugs) if rng.random() < 0.7 else f"{rng.choice(words)}-{rng.choice(words)}"
+        if rng.random() < 0.3:
+            tournament = "-".join(part.capitalize() for part in tournament.split("-"))
+        ext = rng.choices([".docx", ".pdf", ".DOCX", ".doc", ".txt", ""], [70, 15, 3, 5, 5, 2])[0]
+        names.append(f"{school}-{team}-{rng.choice(SIDES)}-{tournament}-{rng.choice(ROUNDS)}{ext}")
+    return names
+
+
+# Write the names as empty files, files_per_folder to a folder, under
+# event/school-group folders
+def make_tree(root, names, files_per_folder=200):
+    paths = []
+    for i, name in enumerate(names):
+        folder = os.path.join(root, ["LD", "PF", "CX"][i % 3], f"group-{i // (files_per_folder * 3)}")
+        if i < 3 * files_per_folder or i % (3 * files_per_folder) < 3:
+            os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{i}-{name}")
+        open(path, "w").close()
+        paths.append(path)
+    return paths
+
+
+def bare_walk(root):
+    # Reading every directory and nothing else: the floor for any filter
+    count = 0
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    stack.append(entry.path)
+                else:
+                    count += 1
+    return count
+
+
+def best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the compiled tournament classifier against the original checks and time both.")
+    parser.add_argument("--num_files", type=int, default=120000, help="Number of files in the synthetic tree")
+    parser.add_argument("--season_file", default=DEFAULT_SEASON_FILE, help="Season file with the tournament tables")
+    parser.add_argument("--input_dir", help="Walk a real directory tree instead of a synthetic one")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (the best is shown)")
+    args = parser.parse_args()
+
+    with open(args.season_file, "r", encoding="utf-8") as f:
+        season = json.load(f)
+    classifier = TournamentClassifier(season)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        root = args.input_dir
+        if root is None:
+            root = tmp_dir
+            start = time.perf_counter()
+            paths = make_tree(root, make_names(args.num_files, season))
+            print(f"Created {len(paths)} files in {time.perf_counter() - start:.1f} s")
+        else:
+            paths = [os.path.join(dirpath, name) for dirpath, _, names in os.walk(root) for name in names]
+        names = [os.path.basename(path) for path in paths]
+        print(f"{len(paths)} files\n")
+
+        # 1) Classifying names in memory
+        legacy_wanted_time, legacy_flags = best_time(lambda: [legacy_wanted(name, season["tournaments"]) for name in names], args.repeat)
+        wanted_time, flags = best_time(lambda: [classifier.wanted(name) for name in names], args.repeat)
+        legacy_topic_time, legacy_topics = best_time(lambda: [legacy_determine_topic(path, season["topics"]) for path in paths], args.repeat)
+        topic_time, topics = best_time(lambda: [classifier.topic(path) for path in paths], args.repeat)
+
+        print(f"{'':<24}{'original (s)':>14}{'compiled (s)':>14}{'names/s':>12}{'speedup':>9}")
+        for label, old, new in [("tournament filter", legacy_wanted_time, wanted_time),
+                                ("topic", legacy_topic_time, topic_time)]:
+            print(f"{label:<24}{old:>14.3f}{new:>14.3f}{len(names) / new:>12.0f}{old / new:>8.1f}x")
+
+        # 2) Walking the tree (after one walk to warm the directory cache)
+        bare_walk(root)
+        bare_time, _ = best_time(lambda: bare_walk(root), args.repeat)
+        legacy_walk_time, legacy_found = best_time(lambda: legacy_find_files([root], season["tournaments"]), args.repeat)
+        walk_time, found = best_time(lambda: scan_files(root, classifier), args.repeat)
+        print(f"{'walk + filter':<24}{legacy_walk_time:>14.3f}{walk_time:>14.3f}{len(paths) / walk_time:>12.0f}"
+              f"{legacy_walk_time / walk_time:>8.1f}x")
+        print(f"{'bare directory scan':<24}{'':>14}{bare_time:>14.3f}{len(paths) / bare_time:>12.0f}")
+
+        wanted_mismatches = sum(a != b for a, b in zip(legacy_flags, flags))
+        topic_mismatches = sum(a != b for a, b in zip(legacy_topics, topics))
+        print(f"\nWanted files: {sum(flags)}, with a topic: {sum(topic is not None for topic in topics)}")
+        print(f"Parity: {wanted_mismatches} filter and {topic_mismatches} topic mismatches, "
+              f"walk {'identical' if found == legacy_found else 'differs'}")
+        sys.exit(1 if wanted_mismatches or topic_mismatches or found != legacy_found else 0)
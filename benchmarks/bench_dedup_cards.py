@@ -0,0 +1,137 @@
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from bench_filter_cards import peak_rss_mb
+from dedup_cards import (BANDS, ROWS, THRESHOLD, SignatureStore, canonical_cards, cluster_signatures,
+                         compute_signatures, evidence_words, shingle_hashes, word_hashes)
+from synthetic_corpus import generate_cards
+
+
+# --------------- NEAR-DUPLICATES ---------------
+# A copy of a card as another team would cut it: some words reworded, the
+# highlighting moved and sometimes a paragraph left out
+def recut(rng, paragraphs, words, reword):
+    if len(paragraphs) > 1 and rng.random() < 0.3:
+        paragraphs = paragraphs[:-1]
+    copy = []
+    for paragraph in paragraphs:
+        text = paragraph.replace("<mark>", "").replace("</mark>", "").split()
+        text = [rng.choice(words) if rng.random() < reword else word for word in text]
+        start = rng.randint(0, len(text) - 1)
+        for i in range(start, min(len(text), start + rng.randint(3, 25))):
+            text[i] = f"<mark>{text[i]}</mark>"
+        copy.append(" ".join(text))
+    return copy
+
+
+# Filtered cards where about a fifth are re-cut copies of another card.
+# Returns the cards and, for each, the card it was copied from (itself for originals).
+def make_cards(num_cards, reword, seed=0):
+    rng = random.Random(seed)
+    num_originals = int(num_cards * 0.8)
+    cards = generate_cards(num_originals, seed)
+    words = sorted({word for card in cards[:1000] for word in card["tagline"].lower().split()})
+    source = list(range(num_originals))
+    while len(cards) < num_cards:
+        original = rng.randrange(num_originals)
+        card = dict(cards[original])
+        card["evidence"] = recut(rng, card["evidence"], words, reword)
+        card["tagline"] = card["tagline"] + " " + rng.choice(words)
+        cards.append(card)
+        source.append(original)
+
+    order = list(range(num_cards))
+    rng.shuffle(order)
+    for card in cards:
+        card["evidence"] = " ".join(card["evidence"])
+    return [cards[i] for i in order], np.array([source[i] for i in order])
+
+
+def cluster_pairs(labels):
+    df = pd.DataFrame({"label": labels, "card": np.arange(len(labels))})
+    groups = df.groupby("label")["card"].apply(list)
+    return {(a, b) for members in groups if len(members) > 1
+            for i, a in enumerate(members) for b in members[i + 1:]}
+
+
+# Pairs of true copies whose evidence shingles really are at least THRESHOLD similar
+def similar_pairs(pairs, evidence):
+    shingles = {}
+
+    def shingle_set(i):
+        if i not in shingles:
+            shingles[i] = set(shingle_hashes(word_hashes(evidence_words(evidence[i]))).tolist())
+        return shingles[i]
+
+    return {(a, b) for a, b in pairs
+            if len(shingle_set(a) & shingle_set(b)) / len(shingle_set(a) | shingle_set(b)) >= THRESHOLD}
+
+
+# --------------- RUNS ---------------
+def run_dedup(input_csv, checkpoint_dir, chunksize, workers, results):
+    store = SignatureStore(checkpoint_dir, {"input_csv": input_csv})
+    start = time.perf_counter()
+    chunks, counts = compute_signatures(input_csv, store, chunksize, workers)
+    hashed = time.perf_counter()
+    roots = cluster_signatures(chunks, BANDS, ROWS, THRESHOLD)
+    keep, _ = canonical_cards(roots, counts)
+    clustered = time.perf_counter()
+    results.put((hashed - start, clustered - hashed, int(keep.sum()), roots, peak_rss_mb()))
+
+
+def timed(input_csv, checkpoint_dir, chunksize, workers):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=run_dedup, args=(input_csv, checkpoint_dir, chunksize, workers, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure MinHash/LSH near-duplicate clustering speed, memory and accuracy.")
+    parser.add_argument("--num_cards", type=int, default=20000, help="Number of synthetic filtered cards")
+    parser.add_argument("--reword", type=float, default=0.02, help="Fraction of words changed in a re-cut copy")
+    parser.add_argument("--chunksize", type=int, default=5000, help="Cards per chunk")
+    parser.add_argument("--workers", default="1,4", help="Comma separated worker counts to try")
+    args = parser.parse_args()
+
+    cards, source = make_cards(args.num_cards, args.reword)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_csv = os.path.join(tmp_dir, "cards.csv")
+        pd.DataFrame(cards).to_csv(input_csv, index=False)
+        true_pairs = cluster_pairs(source)
+        close_pairs = similar_pairs(true_pairs, [card["evidence"] for card in cards])
+        del cards
+        print(f"{args.num_cards} cards, {len(set(source.tolist()))} distinct, "
+              f"{os.path.getsize(input_csv) / 1e6:.1f} MB")
+        print(f"{len(true_pairs)} pairs of copies, {len(close_pairs)} of them with Jaccard >= {THRESHOLD}\n")
+
+        # recall counts every pair of copies, recall@J only the pairs at least THRESHOLD similar
+        print(f"{'workers':>8}{'hash (s)':>10}{'cards/s':>10}{'LSH (s)':>10}{'clusters':>10}"
+              f"{'precision':>11}{'recall':>8}{'recall@J':>10}{'peak RSS':>10}")
+        for workers in [int(w) for w in args.workers.split(",")]:
+            checkpoint_dir = os.path.join(tmp_dir, f"minhash-{workers}")
+            hash_time, lsh_time, clusters, roots, peak_mb = timed(input_csv, checkpoint_dir, args.chunksize, workers)
+            found = cluster_pairs(roots)
+            precision = len(found & true_pairs) / len(found) if found else 1.0
+            recall = len(found & true_pairs) / len(true_pairs) if true_pairs else 1.0
+            recall_close = len(found & close_pairs) / len(close_pairs) if close_pairs else 1.0
+            print(f"{workers:>8}{hash_time:>10.2f}{args.num_cards / hash_time:>10.0f}{lsh_time:>10.2f}{clusters:>10}"
+                  f"{precision:>11.3f}{recall:>8.3f}{recall_close:>10.3f}{peak_mb:>7.0f} MB")
+
+        # A rerun finds every chunk in the checkpoint and only clusters
+        hash_time, lsh_time, _, _, _ = timed(input_csv, checkpoint_dir, args.chunksize, workers)
+        print(f"\nResumed from checkpoint: hashing {hash_time:.2f} s, LSH {lsh_time:.2f} s")
+        print(f"CPU cores available: {os.cpu_count()}")
@@ -0,0 +1,160 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
+from docx.enum.text import WD_BREAK, WD_COLOR_INDEX, WD_UNDERLINE
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+
+from extract_cards import parse_docx
+from fast_docx import parse_docx_fast
+from synthetic_corpus import make_vocabulary
+
+
+# Add a hyperlink (a w:hyperlink holding one run) to a paragraph
+def add_hyperlink(paragraph, text):
+    hyperlink = OxmlElement("w:hyperlink")
+    run = OxmlElement("w:r")
+    t = OxmlElement("w:t")
+    t.text = text
+    run.append(t)
+    hyperlink.append(run)
+    paragraph._p.append(hyperlink)
+
+
+# Set a run's highlight to "none", which Word writes but python-docx cannot read
+def add_none_highlight(run):
+    highlight = OxmlElement("w:highlight")
+    highlight.set(qn("w:val"), "none")
+    run._r.get_or_add_rPr().append(highlight)
+
+
+# The same file without its "none" highlights, which python-docx can read
+def drop_none_highlights(path, out_path):
+    with zipfile.ZipFile(path) as src, zipfile.ZipFile(out_path, "w", zipfile.ZIP_DEFLATED) as dst:
+        for item in src.infolist():
+            data = src.read(item.filename)
+            if item.filename == "word/document.xml":
+                data = data.replace(b'<w:highlight w:val="none"/>', b"")
+            dst.writestr(item, data)
+
+
+# Write a case file laid out like the ones extract_cards.py reads: tagline,
+# citation with a link, then evidence paragraphs made of many formatted runs.
+# With none_highlights, a few runs are highlighted "none".
+def make_docx(path, rng, words, num_cards, none_highlights=False):
+    document = Document()
+    underline_style = document.styles.add_style("StyleUnderline", WD_STYLE_TYPE.CHARACTER)
+    underline_style.font.underline = True
+
+    for card in range(num_cards):
+        document.add_paragraph(" ".join(rng.choices(words, k=rng.randint(5, 20))).capitalize())
+        citation = document.add_paragraph(f"{rng.choice(words).capitalize()} {rng.randint(14, 25)} - ")
+        citation.add_run(" ".join(rng.choices(words, k=10))).bold = True
+        add_hyperlink(citation, f"https://www.{rng.choice(words)}.com/{card}")
+
+        for _ in range(rng.randint(1, 3)):
+            paragraph = document.add_paragraph()
+            for _ in range(rng.randint(10, 40)):
+                run = paragraph.add_run(" ".join(rng.choices(words, k=rng.randint(1, 8))) + " ")
+                kind = rng.random()
+                if kind < 0.2:
+                    run.bold = True
+                    run.underline = True
+                    run.font.highlight_color = WD_COLOR_INDEX.YELLOW
+                elif kind < 0.35:
+                    run.style = underline_style
+                elif kind < 0.45:
+                    run.underline = rng.choice([WD_UNDERLINE.DOUBLE, False])
+                    run.bold = False
+                elif kind < 0.5:
+                    run.font.highlight_color = WD_COLOR_INDEX.AUTO
+                elif kind < 0.51 and none_highlights:
+                    add_none_highlight(run)
+                elif kind < 0.52:
+                    run.add_tab()
+                    run.add_break(rng.choice([WD_BREAK.LINE, WD_BREAK.PAGE]))
+            if rng.random() < 0.1:
+                table = document.add_table(rows=1, cols=1)
+                table.cell(0, 0).text = "table text https://example.com"
+    document.save(path)
+
+
+def time_parser(parse, files, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for file in files:
+            parse(file)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(files) / best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the fast DOCX parser against python-docx and compare files/sec.")
+    parser.add_argument("--input_dir", help="Directory of real .docx files (default: generate synthetic ones)")
+    parser.add_argument("--num_files", type=int, default=20, help="Number of synthetic files to generate")
+    parser.add_argument("--cards_per_file", type=int, default=150, help="Cards per synthetic file")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing runs per parser (best is reported)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.input_dir:
+            files = [os.path.join(dirpath, name)
+                     for dirpath, _, names in os.walk(args.input_dir)
+                     for name in names if name.lower().endswith(".docx")]
+        else:
+            rng = random.Random(0)
+            words, _ = make_vocabulary(rng, 5000)
+            files = []
+            for number in range(args.num_files):
+                path = os.path.join(tmp_dir, f"synthetic-{number}.docx")
+                make_docx(path, rng, words, args.cards_per_file, none_highlights=number % 5 == 4)
+                files.append(path)
+
+        # 1) Parity: the fast parser must return exactly what python-docx returns.
+        # python-docx rejects highlight "none" (extract_cards.py then skips the
+        # file); the fast parser reads it as no highlight, so it must match
+        # python-docx on the file without those highlights
+        mismatches = errors = 0
+        readable_files = []
+        for number, file in enumerate(files):
+            try:
+                expected = parse_docx(file)
+                readable_files.append(file)
+            except Exception:
+                errors += 1
+                readable = os.path.join(tmp_dir, f"readable-{number}.docx")
+                drop_none_highlights(file, readable)
+                try:
+                    expected = parse_docx(readable)
+                except Exception:
+                    continue
+                readable_files.append(readable)
+            if parse_docx_fast(file) != expected:
+                mismatches += 1
+                print(f"Mismatch: {file}")
+        print(f"Parity: {len(files) - mismatches}/{len(files)} files identical "
+              f"({errors} files python-docx can only read without their \"none\" highlights)")
+
+        # 2) Throughput, on the files python-docx can read
+        files = readable_files
+        size_mb = sum(os.path.getsize(file) for file in files) / 1e6
+        print(f"\n{len(files)} files, {size_mb:.1f} MB")
+        for name, parse in [
+            ("python-docx", parse_docx),
+            ("fast", parse_docx_fast),
+            ("fast + styles", lambda file: parse_docx_fast(file, resolve_styles=True)),
+        ]:
+            print(f"{name:<15}{time_parser(parse, files, args.repeat):>10.1f} files/sec")
+
+        sys.exit(1 if mismatches else 0)
@@ -0,0 +1,180 @@
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from bs4 import BeautifulSoup
+
+from card_shards import ShardWriter
+from filter_cards import filter_cards, filter_cards_to_csv, flatten_evidence, read_chunks
+from synthetic_corpus import SIDES, EVENTS, TOPICS, make_sentence, make_vocabulary
+
+
+# --------------- RAW CARDS ---------------
+# Evidence paragraphs as extract_cards.py cuts them: every formatted run
+# wrapped on its own (so marks never nest), a few highlighted stretches per
+# paragraph, the odd entity and now and then a link
+def make_raw_evidence(rng, words, weights):
+    paragraphs = []
+    for _ in range(rng.randint(1, 4)):
+        text = make_sentence(rng, words, weights, rng.randint(20, 400)).split()
+        if rng.random() < 0.1:
+            text.insert(rng.randint(0, len(text)), rng.choice(["&amp;", "R&amp;D", "&lt;", "&quot;x&quot;"]))
+        if rng.random() < 0.02:
+            text.append(f"https://www.{rng.choice(words)}.com")
+        marks = sorted(rng.sample(range(len(text)), min(len(text), rng.choice([0, 2, 2, 4, 6]))))
+        for start, end in zip(marks[::2], marks[1::2]):
+            for i in range(start, end + 1):
+                text[i] = rng.choice(["<mark>{}</mark>", "<mark><u><b>{}</b></u></mark>", "<u><mark>{} </mark></u>"]).format(text[i])
+        paragraphs.append(" ".join(text))
+    return paragraphs
+
+
+# Cards laid out like an extract_cards.py CSV shard, with duplicated taglines
+# and cards on both sides of every word count limit
+def make_raw_cards(num_cards, seed=0):
+    rng = random.Random(seed)
+    words, weights = make_vocabulary(rng, 5000)
+    taglines = []
+    cards = []
+    for i in range(num_cards):
+        if taglines and rng.random() < 0.3:
+            tagline = rng.choice(taglines)
+        else:
+            tagline = make_sentence(rng, words, weights, rng.randint(2, 35)).capitalize()
+            if rng.random() < 0.02:
+                tagline += " http://link"
+            taglines.append(tagline)
+        citation = f"{rng.choice(words).capitalize()} {rng.randint(14, 25)} - " \
+                   f"{make_sentence(rng, words, weights, rng.randint(10, 90))}"
+        cards.append({
+            "tagline": tagline,
+            "citation": citation,
+            "evidence": make_raw_evidence(rng, words, weights),
+            "side": rng.choice(SIDES) if rng.random() > 0.01 else "",
+            "event": rng.choice(EVENTS),
+            "topic": rng.choice(TOPICS),
+            "file_path": f"data/raw/{rng.choice(words)}-{i // 50}.docx",
+        })
+    return cards
+
+
+# --------------- ORIGINAL PIPELINE ---------------
+# filter_cards.py before it was vectorized, kept as the reference output
+def legacy_extract_marked_text(df):
+    for index, row in df.iterrows():
+        soup = BeautifulSoup(row['evidence'], 'html.parser')
+        mark_tags = soup.find_all('mark')
+        extracted_text = ' '.join([tag.get_text() for tag in mark_tags])
+        df.loc[index, 'marked_evidence'] = extracted_text
+    return df
+
+
+def legacy_filter_cards(input_csv):
+    df = pd.read_csv(input_csv)
+    df["evidence"] = df["evidence"].apply(flatten_evidence)
+    df = legacy_extract_marked_text(df)
+    df["tagline_count"] = df["tagline"].astype(str).apply(lambda x: len(x.split()))
+    df["citation_count"] = df["citation"].astype(str).apply(lambda x: len(x.split()))
+    df["evidence_count"] = df["evidence"].astype(str).apply(lambda x: len(x.split()))
+    df["marked_evidence_count"] = df["marked_evidence"].astype(str).apply(lambda x: len(x.split()))
+    df = df[~df["tagline"].str.contains("http", na=False)]
+    df = df[~df["evidence"].str.contains("http", na=False)]
+    df = df[df["tagline_count"].between(5, 29)]
+    df = df[df["citation_count"].between(19, 84)]
+    df = df[df["evidence_count"].between(200, 2701)]
+    df = df[df["marked_evidence_count"].between(15, 150)]
+    df.reset_index(drop=True, inplace=True)
+    tagline_counts = df["tagline"].value_counts()
+    df["duplicate_count"] = df["tagline"].map(tagline_counts)
+    df = df.drop_duplicates(subset=["tagline"], keep="last")
+    drop_cols = ['Unnamed: 0', 'tagline_count', 'citation_count', 'evidence_count', 'marked_evidence_count']
+    df.drop([col for col in drop_cols if col in df.columns], axis=1, inplace=True)
+    df.dropna(inplace=True)
+    df.reset_index(drop=True, inplace=True)
+    return df
+
+
+# --------------- RUNS ---------------
+# Peak RSS of this process in MB. VmHWM starts over at exec, while ru_maxrss
+# carries over the parent's peak into a spawned process on Linux.
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(mode, input_csv, output_csv, chunksize, workers, results):
+    start = time.perf_counter()
+    if mode == "original":
+        legacy_filter_cards(input_csv).to_csv(output_csv, index=False)
+    elif mode == "in memory":
+        filter_cards(read_chunks(input_csv), workers).to_csv(output_csv, index=False)
+    else:
+        filter_cards_to_csv(read_chunks(input_csv, chunksize=chunksize), output_csv, workers)
+    results.put((time.perf_counter() - start, peak_rss_mb()))
+
+
+# Run one mode in a fresh process so its peak RSS is its own
+def timed(mode, input_csv, output_csv, chunksize=None, workers=1):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=run_mode, args=(mode, input_csv, output_csv, chunksize, workers, results))
+    process.start()
+    elapsed, peak_mb = results.get()
+    process.join()
+    name = mode if chunksize is None else f"{mode} ({chunksize} rows, {workers} workers)"
+    print(f"{name:<40}{elapsed:>10.2f} s{peak_mb:>10.0f} MB")
+    return output_csv
+
+
+def same_file(a, b):
+    with open(a, "rb") as fa, open(b, "rb") as fb:
+        return fa.read() == fb.read()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check filter_cards.py against the original pipeline and compare run times.")
+    parser.add_argument("--input_csv", help="Raw cards CSV to filter (default: generate synthetic cards)")
+    parser.add_argument("--num_cards", type=int, default=20000, help="Number of synthetic raw cards")
+    parser.add_argument("--chunksize", type=int, default=2000, help="Rows per chunk for the streamed runs")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes for the parallel streamed run")
+    parser.add_argument("--skip_original", action="store_true",
+                        help="Skip the (slow) original pipeline and check against the in-memory run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_csv = args.input_csv
+        if not input_csv:
+            writer = ShardWriter(tmp_dir, "csv", args.num_cards)
+            writer.write(make_raw_cards(args.num_cards))
+            writer.close()
+            input_csv = os.path.join(tmp_dir, writer.shard)
+        print(f"Input: {input_csv} ({os.path.getsize(input_csv) / 1e6:.1f} MB)\n")
+
+        print(f"{'mode':<40}{'time':>12}{'peak RSS':>13}")
+        outputs = {}
+        if not args.skip_original:
+            outputs["original"] = timed("original", input_csv, os.path.join(tmp_dir, "original.csv"))
+        outputs["in memory"] = timed("in memory", input_csv, os.path.join(tmp_dir, "in_memory.csv"))
+        outputs["streamed"] = timed("streamed", input_csv, os.path.join(tmp_dir, "streamed.csv"), args.chunksize)
+        outputs["parallel"] = timed("streamed", input_csv, os.path.join(tmp_dir, "parallel.csv"),
+                                    args.chunksize, args.workers)
+
+        reference_name, reference = next(iter(outputs.items()))
+        mismatches = [name for name, path in outputs.items() if not same_file(path, reference)]
+        print(f"\nParity: " + (f"all outputs identical to {reference_name}" if not mismatches
+                               else f"differs from {reference_name}: {', '.join(mismatches)}"))
+        sys.exit(1 if mismatches else 0)
@@ -0,0 +1,127 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_search import sample_taglines
+from bench_suggest import percentile
+from synthetic_corpus import build_synthetic_corpus
+
+ENCODINGS = ["identity", "gzip", "br"]
+
+
+# Searches made of one or two words of real taglines, plus filter-only
+# browsing, each for the first few infinite scroll pages
+def make_requests(taglines, num_queries, pages, seed=0):
+    rng = random.Random(seed)
+    requests = []
+    for _ in range(num_queries):
+        words = rng.choice(taglines).lower().split()
+        params = {"search": " ".join(rng.sample(words, min(len(words), rng.choice([1, 2]))))}
+        if rng.random() < 0.2:
+            params = {"side": rng.choice(["Aff", "Neg"])}
+        for page in range(1, pages + 1):
+            requests.append({**params, "page": page, "size": 50})
+    return requests
+
+
+def timed_get(client, url, params, encoding):
+    start = time.perf_counter()
+    response = client.get(url, params=params, headers={"Accept-Encoding": encoding})
+    return time.perf_counter() - start, response
+
+
+def measure(client, requests, view, encodings, visible_cards):
+    """
+    Wire bytes of every /data page per encoding, plus (with the first
+    encoding that compresses) the response time, JSON parse time and, for
+    the compact view, the /cards request that loads the evidence of the
+    first visible_cards cards after the page is shown.
+    """
+    results = {"bytes": {encoding: [] for encoding in encodings}, "seconds": [], "parse": [],
+               "evidence_bytes": [], "evidence_seconds": []}
+    for params in requests:
+        params = {**params, "view": view}
+        # Rank first, so only the page itself is timed
+        client.get("/data", params=params)
+        for encoding in encodings:
+            seconds, response = timed_get(client, "/data", params, encoding)
+            results["bytes"][encoding].append(response.num_bytes_downloaded)
+        start = time.perf_counter()
+        data = json.loads(response.content)
+        results["parse"].append(time.perf_counter() - start)
+        results["seconds"].append(seconds)
+
+        if view == "compact" and data["cards"]:
+            ids = ",".join(str(card["id"]) for card in data["cards"][:visible_cards])
+            seconds, response = timed_get(client, "/cards", {"ids": ids, "v": data["version"]}, encodings[-1])
+            results["evidence_bytes"].append(response.num_bytes_downloaded)
+            results["evidence_seconds"].append(seconds)
+    return results
+
+
+def mean(values):
+    return sum(values) / len(values) if values else 0.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare /data bytes per page and time to first render for full and compact cards.")
+    parser.add_argument("--num_cards", type=int, default=50000, help="Number of synthetic cards")
+    parser.add_argument("--corpus", help="Use an existing corpus file (e.g. the full 600K set)")
+    parser.add_argument("--queries", type=int, default=40, help="Number of queries to replay")
+    parser.add_argument("--pages", type=int, default=3, help="Infinite scroll pages per query")
+    parser.add_argument("--visible_cards", type=int, default=10, help="Cards on the first screen, whose evidence the page loads next")
+    parser.add_argument("--bandwidth_mbps", type=float, default=20.0, help="Client bandwidth for the time to first render estimate")
+    parser.add_argument("--rtt_ms", type=float, default=50.0, help="Client round trip time for the time to first render estimate")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus_file = args.corpus
+        if corpus_file is None:
+            corpus_file = os.path.join(tmp_dir, "synthetic.corpus")
+            start = time.perf_counter()
+            build_synthetic_corpus(corpus_file, args.num_cards)
+            print(f"{args.num_cards} cards: corpus ready in {time.perf_counter() - start:.1f} s")
+
+        os.environ.update({
+            "DEBATEVAULT_DATA_FILE": os.path.join(tmp_dir, "no-data.json"),
+            "DEBATEVAULT_CORPUS_FILE": corpus_file,
+            "DEBATEVAULT_SEARCH_WORKERS": "0",
+            "DEBATEVAULT_RELOAD_POLL_SECONDS": "0",
+        })
+        from fastapi.testclient import TestClient
+        import card_views
+        import main
+
+        encodings = ENCODINGS if card_views.brotli is not None else ENCODINGS[:2]
+        requests = make_requests(sample_taglines(corpus_file), args.queries, args.pages)
+        with TestClient(main.app) as client:
+            results = {view: measure(client, requests, view, encodings, args.visible_cards) for view in ("full", "compact")}
+
+    print(f"\n{len(requests)} pages of 50 cards ({args.queries} queries x {args.pages} pages)")
+    print(f"\n{'bytes per page':<16}" + "".join(f"{encoding:>12}" for encoding in encodings))
+    for view, result in results.items():
+        print(f"{view:<16}" + "".join(f"{mean(result['bytes'][encoding]):>12.0f}" for encoding in encodings))
+
+    # Time to first render: the /data response (served in-process, so no
+    # network), one round trip, the compressed bytes at the given bandwidth
+    # and parsing the JSON (Python's json.loads standing in for the browser's)
+    bytes_per_second = args.bandwidth_mbps * 1e6 / 8
+    print(f"\ntime to first render (ms), {args.bandwidth_mbps:g} Mbit/s and {args.rtt_ms:g} ms round trip, {encodings[-1]}:")
+    print(f"{'':<16}{'server':>10}{'transfer':>10}{'parse':>10}{'mean':>10}{'p95':>10}")
+    for view, result in results.items():
+        transfer = [args.rtt_ms / 1000 + size / bytes_per_second for size in result["bytes"][encodings[-1]]]
+        total = [server + wire + parse for server, wire, parse in zip(result["seconds"], transfer, result["parse"])]
+        print(f"{view:<16}{mean(result['seconds']) * 1000:>10.1f}{mean(transfer) * 1000:>10.1f}"
+              f"{mean(result['parse']) * 1000:>10.1f}{mean(total) * 1000:>10.1f}{percentile(total, 0.95) * 1000:>10.1f}")
+
+    compact = results["compact"]
+    evidence = [args.rtt_ms / 1000 + seconds + size / bytes_per_second
+                for seconds, size in zip(compact["evidence_seconds"], compact["evidence_bytes"])]
+    print(f"\nthen evidence of the first {args.visible_cards} cards (/cards): {mean(compact['evidence_bytes']):.0f} bytes, "
+          f"{mean(evidence) * 1000:.1f} ms")
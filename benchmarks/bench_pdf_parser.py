@@ -0,0 +1,138 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz
+
+from extract_cards import parse_pdf
+from synthetic_corpus import make_vocabulary
+
+
+# --------------- ORIGINAL PARSER ---------------
+# extract_cards.parse_pdf before the image blocks were dropped, kept as the
+# reference output
+def legacy_parse_pdf(pdf_file):
+    doc = fitz.open(pdf_file)
+    plain_paragraphs = []
+    marked_paragraphs = []
+
+    for page in doc:
+        blocks = page.get_text("dict")["blocks"]
+        for block in blocks:
+            if block["type"] == 0:
+                plain_spans = []
+                marked_spans = []
+
+                for line in block.get("lines", []):
+                    for span in line.get("spans", []):
+                        plain_spans.append(span["text"])
+                        span_text = span["text"]
+                        if "Bold" in span["font"]:
+                            span_text = f"<b>{span_text}</b>"
+                        marked_spans.append(span_text)
+                    plain_spans.append("\n")
+                    marked_spans.append("\n")
+
+                paragraph_plain = "".join(plain_spans).strip()
+                paragraph_marked = "".join(marked_spans).strip()
+                if paragraph_plain:
+                    plain_paragraphs.append(paragraph_plain)
+                    marked_paragraphs.append(paragraph_marked)
+
+    return plain_paragraphs, marked_paragraphs
+
+
+# --------------- SYNTHETIC PDFS ---------------
+# A case file printed to PDF: per page a few cards (tagline, citation, then
+# evidence with bold and underlined runs) and, on some pages, a screenshot
+# (random pixels, so it does not compress to nothing)
+def make_pdf(path, rng, words, num_pages, image_every=3):
+    picture = fitz.Pixmap(fitz.csRGB, 800, 600, bytes(rng.getrandbits(8) for _ in range(800 * 600 * 3)), False)
+    doc = fitz.open()
+    for number in range(num_pages):
+        page = doc.new_page()
+        html = []
+        for _ in range(rng.randint(2, 3)):
+            html.append(f"<p><b>{' '.join(rng.choices(words, k=rng.randint(5, 15))).capitalize()}</b></p>")
+            html.append(f"<p>{rng.choice(words).capitalize()} {rng.randint(14, 25)} - {' '.join(rng.choices(words, k=8))}</p>")
+            runs = []
+            for _ in range(rng.randint(8, 20)):
+                text = " ".join(rng.choices(words, k=rng.randint(1, 8)))
+                kind = rng.random()
+                runs.append(f"<b><u>{text}</u></b>" if kind < 0.25 else f"<u>{text}</u>" if kind < 0.4 else text)
+            html.append(f"<p>{' '.join(runs)}</p>")
+        has_image = image_every and number % image_every == 0
+        page.insert_htmlbox(fitz.Rect(40, 40, 570, 560 if has_image else 800), "".join(html))
+        if has_image:
+            page.insert_image(fitz.Rect(40, 580, 440, 800), pixmap=picture)
+    doc.save(path)
+    doc.close()
+
+
+def time_parser(parse, files, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for file in files:
+            parse(file)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the PDF parser against the original and compare pages/sec.")
+    parser.add_argument("--input_dir", help="Directory of real .pdf files (default: generate synthetic ones)")
+    parser.add_argument("--num_files", type=int, default=4, help="Number of synthetic files to generate")
+    parser.add_argument("--pages_per_file", type=int, default=150, help="Pages per synthetic file")
+    parser.add_argument("--page_workers", default="2,4", help="Comma-separated page_workers values to time")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing runs per parser (best is reported)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.input_dir:
+            files = [os.path.join(dirpath, name)
+                     for dirpath, _, names in os.walk(args.input_dir)
+                     for name in names if name.lower().endswith(".pdf")]
+        else:
+            rng = random.Random(0)
+            words, _ = make_vocabulary(rng, 5000)
+            files = []
+            for number in range(args.num_files):
+                path = os.path.join(tmp_dir, f"synthetic-{number}.pdf")
+                make_pdf(path, rng, words, args.pages_per_file)
+                files.append(path)
+
+        page_workers = [int(value) for value in args.page_workers.split(",") if value]
+
+        # 1) Parity: serial and page-parallel parsing must return exactly
+        # what the original parser returns
+        mismatches = 0
+        for file in files:
+            expected = legacy_parse_pdf(file)
+            for workers in [1] + page_workers:
+                if parse_pdf(file, page_workers=workers) != expected:
+                    mismatches += 1
+                    print(f"Mismatch: {file} (page_workers={workers})")
+        print(f"Parity: {mismatches} mismatches over {len(files)} files")
+
+        # 2) Throughput
+        pages = 0
+        for file in files:
+            with fitz.open(file) as doc:
+                pages += doc.page_count
+        size_mb = sum(os.path.getsize(file) for file in files) / 1e6
+        print(f"\n{len(files)} files, {pages} pages, {size_mb:.1f} MB (CPUs: {os.cpu_count()})")
+        legacy_time = time_parser(legacy_parse_pdf, files, args.repeat)
+        print(f"{'original':<22}{pages / legacy_time:>10.1f} pages/sec")
+        for workers in [1] + page_workers:
+            elapsed = time_parser(lambda file: parse_pdf(file, page_workers=workers), files, args.repeat)
+            label = "text only" if workers == 1 else f"page_workers={workers}"
+            print(f"{label:<22}{pages / elapsed:>10.1f} pages/sec{legacy_time / elapsed:>8.1f}x")
+
+        sys.exit(1 if mismatches else 0)
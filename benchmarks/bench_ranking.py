@@ -0,0 +1,162 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_search import make_sessions, sample_taglines
+from bench_suggest import percentile
+from corpus_segments import delta_files, make_segmented, open_segments
+from search_engine import RANKINGS, SCORERS
+from search_index import SEARCH_FIELDS
+from suggest_index import card_weight
+from synthetic_corpus import SEGMENT_CARDS, build_synthetic_corpus, parse_size
+
+# Cards ranked per search (a few infinite scroll pages)
+K = 200
+
+# Searches of a known card: words of its tagline, of which it should be the
+# top result or close to it
+KNOWN_ITEM_WORDS = 3
+
+# Random cards read per known-item search, to draw them from
+CANDIDATE_POOL = 20
+
+
+def workload(taglines, num_sessions, seed=0):
+    """
+    (kind, filters, search tokens) of every search in the replayed /data
+    workload of bench_search.py. Browsing without a search is not ranked and
+    scroll pages come from the query cache, so both are left out.
+    """
+    searches = []
+    for session in make_sessions(taglines, num_sessions, seed):
+        for kind, params in session:
+            if kind in ("browse", "scroll"):
+                continue
+            filters = {field: value for field, value in params.items() if field != "search"}
+            searches.append((kind, filters, params["search"].lower().split()))
+    return searches
+
+
+def time_engine(engine, searches):
+    latencies = {}
+    rankings = []
+    for kind, filters, tokens in searches:
+        start = time.perf_counter()
+        ranked_ids, total, _ = engine.rank(filters, tokens, K)
+        seconds = time.perf_counter() - start
+        latencies.setdefault(kind, []).append(seconds)
+        latencies.setdefault("all", []).append(seconds)
+        rankings.append((ranked_ids, total))
+    return latencies, rankings
+
+
+def known_items(store, num_queries, seed=0):
+    """
+    (card id, search tokens) pairs: KNOWN_ITEM_WORDS distinct words of a
+    card's tagline. Cards are drawn in proportion to their duplicate_count,
+    as searched-for cards are: a tagline cut by many teams is looked up more
+    than a one-off (and uniform draws would mostly pick one-offs, which the
+    duplicate boost is meant to rank below them).
+    """
+    rng = random.Random(seed)
+    pool = []
+    for card_id in rng.sample(range(len(store)), min(len(store), num_queries * CANDIDATE_POOL)):
+        card = store.card(card_id, ("tagline", "duplicate_count"))
+        words = list(dict.fromkeys(str(card.get("tagline", "")).lower().split()))
+        if len(words) >= KNOWN_ITEM_WORDS:
+            pool.append((card_weight(card), card_id, words))
+    items = []
+    for _, card_id, words in rng.choices(pool, [weight for weight, _, _ in pool], k=num_queries):
+        items.append((card_id, rng.sample(words, KNOWN_ITEM_WORDS)))
+    return items
+
+
+def known_item_quality(engine, items):
+    # Mean reciprocal rank of the card (within K) and how often it is first
+    reciprocal = 0.0
+    first = 0
+    for card_id, tokens in items:
+        ranked_ids = engine.rank({}, tokens, K)[0]
+        if card_id in ranked_ids:
+            rank = ranked_ids.index(card_id) + 1
+            reciprocal += 1 / rank
+            first += rank == 1
+    return reciprocal / len(items), first / len(items)
+
+
+def ranking_bytes(segments):
+    # Bytes of the per-posting term counts, per-card length norms and boosts
+    total = 0
+    for _, index, _ in segments:
+        total += memoryview(index.boosts).nbytes
+        for field in SEARCH_FIELDS:
+            total += memoryview(index.fields[field].term_freqs).nbytes
+            total += memoryview(index.fields[field].norms).nbytes
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare BM25F and presence ranking: latency on the /data search mix and known-item rank.")
+    parser.add_argument("--size", default="600k", help="Synthetic corpus size (10k, 100k, 600k, 2m or a number of cards)")
+    parser.add_argument("--corpus", help="Use an existing corpus file (e.g. the full 600K set) and its deltas")
+    parser.add_argument("--corpus_dir", help="Keep the generated corpus here and reuse it (default: a temporary directory)")
+    parser.add_argument("--segment_cards", type=int, default=SEGMENT_CARDS, help="Cards per corpus segment (0 for one segment)")
+    parser.add_argument("--scorers", default=",".join(SCORERS), help="Comma separated scoring backends to time")
+    parser.add_argument("--sessions", type=int, default=300, help="User sessions of the /data workload to replay")
+    parser.add_argument("--known_items", type=int, default=200, help="Known-item searches for the ranking quality check")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus_file = args.corpus
+        if corpus_file is None:
+            num_cards = parse_size(args.size)
+            corpus_dir = args.corpus_dir or tmp_dir
+            os.makedirs(corpus_dir, exist_ok=True)
+            corpus_file = os.path.join(corpus_dir, f"synthetic-{num_cards}-0.corpus")
+            start = time.perf_counter()
+            build_synthetic_corpus(corpus_file, num_cards, segment_cards=args.segment_cards)
+            print(f"{num_cards} cards: corpus ready in {time.perf_counter() - start:.1f} s")
+
+        corpus_files = [corpus_file] + delta_files(corpus_file)
+        segments = open_segments(corpus_files)
+        searches = workload(sample_taglines(corpus_file), args.sessions)
+        corpus_bytes = sum(os.path.getsize(path) for path in corpus_files)
+        print(f"{sum(len(store) for store, _, _ in segments)} cards in {len(segments)} segments, {len(searches)} searches, k = {K}")
+        print(f"Term counts, length norms and boosts: {ranking_bytes(segments) / 1e6:.0f} MB "
+              f"of {corpus_bytes / 1e6:.0f} MB corpus")
+
+        results = {}
+        for scorer in args.scorers.split(","):
+            for ranking in RANKINGS:
+                store, engine, _ = make_segmented(segments, scorer, ranking=ranking)
+                engine.rank({}, ["warm"], K)
+                latencies, rankings = time_engine(engine, searches)
+                quality = known_item_quality(engine, known_items(store, args.known_items))
+                results[scorer, ranking] = (latencies, rankings, quality)
+
+        kinds = list(results[next(iter(results))][0])
+        print(f"\n{'latency (ms)':<20}" + "".join(f"{kind + ' p50':>13}{kind + ' p95':>13}" for kind in kinds))
+        for (scorer, ranking), (latencies, _, _) in results.items():
+            print(f"{scorer + ' ' + ranking:<20}" + "".join(
+                f"{percentile(latencies[kind], 0.5) * 1000:>13.1f}{percentile(latencies[kind], 0.95) * 1000:>13.1f}"
+                for kind in kinds))
+
+        print(f"\n{'known card':<20}{'MRR':>8}{'first':>8}")
+        for (scorer, ranking), (_, _, (mrr, first)) in results.items():
+            print(f"{scorer + ' ' + ranking:<20}{mrr:>8.3f}{first:>8.1%}")
+
+        # Both rankings order the same matches, and the scorers agree
+        mismatches = 0
+        for (scorer, ranking), (_, rankings, _) in results.items():
+            reference = results[next(iter(results))[0], ranking][1]
+            presence = results[scorer, "presence"][1]
+            for (ranked_ids, total), (expected_ids, _), (_, presence_total) in zip(rankings, reference, presence):
+                if ranked_ids != expected_ids or total != presence_total:
+                    mismatches += 1
+        print(f"\nParity: {mismatches} of {len(searches) * len(results)} rankings differ between scorers or totals between rankings")
+        sys.exit(1 if mismatches else 0)
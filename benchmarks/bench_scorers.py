@@ -0,0 +1,63 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from build_corpus import build_corpus, load_json_cards
+from corpus_file import open_corpus
+from search_engine import SCORERS, make_engine
+from synthetic_corpus import generate_cards
+
+# (filters, search tokens) pairs; None tokens means no search
+QUERIES = [
+    ({}, ["nuclear", "war"]),
+    ({"side": "Aff"}, ["economic", "growth"]),
+    ({}, ["ab"]),
+    ({"event": "LD", "topic": "Jan/Feb 25"}, ["climate", "change", "causes", "extinction"]),
+    ({}, ["trade"]),
+    ({"side": "Neg"}, None),
+]
+K = 200
+
+
+def time_engine(engine, repeat):
+    timings = []
+    for filters, tokens in QUERIES:
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            _, total, _ = engine.rank(filters, tokens, K)
+            runs.append(time.perf_counter() - start)
+        timings.append((statistics.median(runs) * 1000, total))
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the python and numpy scoring backends.")
+    parser.add_argument("--num_cards", type=int, default=20000, help="Number of synthetic cards")
+    parser.add_argument("--input_json", help="Use a real card JSON file instead of synthetic cards")
+    parser.add_argument("--corpus", help="Use an existing corpus file (e.g. the full 600K set)")
+    parser.add_argument("--repeat", type=int, default=5, help="Times to run each query")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus_file = args.corpus
+        if corpus_file is None:
+            cards = load_json_cards(args.input_json) if args.input_json else generate_cards(args.num_cards)
+            corpus_file = os.path.join(tmp_dir, "cards.corpus")
+            build_corpus(cards, corpus_file)
+            del cards
+
+        parts = open_corpus(corpus_file)
+        results = {scorer: time_engine(make_engine(*parts, scorer), args.repeat) for scorer in SCORERS}
+
+        print(f"\nCards: {len(parts[0])}, k = {K}, median of {args.repeat} runs")
+        print(f"{'query':<50}{'hits':>8}" + "".join(f"{scorer + ' (ms)':>14}" for scorer in SCORERS))
+        for position, (filters, tokens) in enumerate(QUERIES):
+            label = f"{' '.join(tokens) if tokens is not None else '<no search>'} {filters or ''}"
+            total = results[SCORERS[0]][position][1]
+            print(f"{label[:48]:<50}{total:>8}" + "".join(f"{results[scorer][position][0]:>14.1f}" for scorer in SCORERS))
@@ -0,0 +1,335 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_suggest import percentile
+from bench_workers import wait_until_ready
+from corpus_file import open_corpus
+from search_engine import SCORERS
+from search_index import MATCH_MODES
+from synthetic_corpus import EVENTS, EVIDENCE_SETS, SEGMENT_CARDS, SIDES, SIZES, TOPICS, build_synthetic_corpus, parse_size
+
+# Share of sessions of each kind in the replayed workload
+SESSION_MIX = {"search": 0.35, "filtered": 0.2, "browse": 0.1, "typing": 0.35}
+
+# Chance that the user scrolls on to the next page after a session's last request
+SCROLL_CHANCE = 0.4
+
+# A debounced search box sends the text typed so far when the user pauses:
+# usually at the end of a word, sometimes in the middle of one
+PAUSE_AT_WORD_END = 0.7
+PAUSE_IN_WORD = 0.15
+
+
+# --------------- WORKLOAD ---------------
+def random_filters(rng):
+    choices = {"side": SIDES, "event": EVENTS, "topic": TOPICS, "evidence_set": EVIDENCE_SETS}
+    fields = rng.sample(sorted(choices), rng.randint(1, 2))
+    return {field: rng.choice(choices[field]) for field in fields}
+
+
+def typed_prefixes(rng, text):
+    """
+    What a debounced search box sends while text is typed letter by letter:
+    the text at each pause, and always the whole text at the end.
+    """
+    prefixes = []
+    for end in range(1, len(text)):
+        at_word_end = text[end] == " "
+        if rng.random() < (PAUSE_AT_WORD_END if at_word_end else PAUSE_IN_WORD):
+            prefix = text[:end].strip()
+            if prefix and (not prefixes or prefixes[-1] != prefix):
+                prefixes.append(prefix)
+    if not prefixes or prefixes[-1] != text:
+        prefixes.append(text)
+    return prefixes
+
+
+def make_sessions(taglines, num_sessions, seed=0):
+    """
+    A reproducible list of user sessions, each a list of (kind, /data params)
+    requests sent one after the other: searches for tagline words with or
+    without filters, browsing by filters alone and debounced typing, some
+    followed by infinite scroll pages.
+    """
+    rng = random.Random(seed)
+    kinds, weights = zip(*SESSION_MIX.items())
+    sessions = []
+    for _ in range(num_sessions):
+        kind = rng.choices(kinds, weights)[0]
+        words = rng.choice(taglines).lower().split()
+        start = rng.randrange(max(1, len(words) - 2))
+        text = " ".join(words[start:start + rng.randint(1, 3)])
+        if kind == "search":
+            requests = [("search", {"search": text})]
+        elif kind == "filtered":
+            requests = [("filtered", {"search": text, **random_filters(rng)})]
+        elif kind == "browse":
+            requests = [("browse", random_filters(rng))]
+        else:
+            requests = [("typing", {"search": prefix}) for prefix in typed_prefixes(rng, text)]
+        page = 1
+        while rng.random() < SCROLL_CHANCE and page < 5:
+            page += 1
+            requests.append(("scroll", {**requests[-1][1], "page": page}))
+        sessions.append(requests)
+    return sessions
+
+
+def sample_taglines(corpus_file, count=2000, seed=0):
+    store = open_corpus(corpus_file)[0]
+    rng = random.Random(seed)
+    tagline = store.columns["tagline"]
+    return [tagline.get(rng.randrange(len(store))) for _ in range(count)]
+
+
+# --------------- MEMORY ---------------
+def _status_kb(pid, field):
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith(field):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _children(pid):
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children += [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+    return children
+
+
+def tree_peak_rss_mb(pid):
+    """
+    Sum of the peak RSS of a process and all its live descendants (the
+    uvicorn workers and search worker processes), in MB. Pages of the
+    memory-mapped corpus count once per process that touched them, so this
+    is an upper bound. Linux only (0 elsewhere).
+    """
+    total = 0
+    pending = [pid]
+    while pending:
+        pid = pending.pop()
+        total += _status_kb(pid, "VmHWM:")
+        pending += _children(pid)
+    return total / 1024
+
+
+# --------------- REPLAY ---------------
+class Replay:
+    """
+    Latencies per request kind of a replay by `concurrency` clients, each
+    taking the next session from a shared list.
+    """
+
+    def __init__(self, sessions):
+        self.sessions = sessions
+        self.next_session = 0
+        self.latencies = {}
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def take(self):
+        with self.lock:
+            if self.next_session >= len(self.sessions):
+                return None
+            self.next_session += 1
+            return self.sessions[self.next_session - 1]
+
+    def record(self, kind, seconds, ok):
+        with self.lock:
+            if ok:
+                self.latencies.setdefault(kind, []).append(seconds)
+            else:
+                self.errors += 1
+
+
+class FakeRequest:
+    # The one Request method get_data uses
+    async def is_disconnected(self):
+        return False
+
+
+def run_in_process(env, sessions, concurrency, results):
+    """
+    Import main.py with the benchmark settings and await get_data directly
+    from `concurrency` coroutines on one event loop, like uvicorn would,
+    with the same search executor and query cache.
+    """
+    os.environ.update(env)
+    start = time.perf_counter()
+    import main
+    main.CORPUS.current.executor.warm_up()
+    load_seconds = time.perf_counter() - start
+    replay = Replay(sessions)
+
+    async def client():
+        while (session := replay.take()) is not None:
+            for kind, params in session:
+                start = time.perf_counter()
+                try:
+                    response = await main.get_data(FakeRequest(), **params)
+                    ok = response.status_code == 200
+                except Exception:
+                    ok = False
+                replay.record(kind, time.perf_counter() - start, ok)
+
+    async def run():
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    wall = time.perf_counter() - start
+    peak_mb = tree_peak_rss_mb(os.getpid())
+    main.CORPUS.close()
+    results.put((replay.latencies, replay.errors, wall, load_seconds, peak_mb))
+
+
+def run_http(env, sessions, concurrency, workers, port):
+    """
+    Start serve.py with the benchmark settings and replay the sessions over
+    HTTP from `concurrency` client threads.
+    """
+    base_url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", str(workers), "--port", str(port)],
+        cwd=ROOT, env=dict(os.environ, **env), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_ready(base_url, timeout=600)
+        load_seconds = time.perf_counter() - start
+        replay = Replay(sessions)
+
+        def client():
+            while (session := replay.take()) is not None:
+                for kind, params in session:
+                    url = f"{base_url}/data?{urllib.parse.urlencode(params)}"
+                    start = time.perf_counter()
+                    try:
+                        urllib.request.urlopen(url, timeout=120).read()
+                        ok = True
+                    except (OSError, urllib.error.HTTPError):
+                        ok = False
+                    replay.record(kind, time.perf_counter() - start, ok)
+
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+        peak_mb = tree_peak_rss_mb(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+    return replay.latencies, replay.errors, wall, load_seconds, peak_mb
+
+
+def timed_in_process(env, sessions, concurrency):
+    # In a fresh process, so the server's memory is measured on its own
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=run_in_process, args=(env, sessions, concurrency, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def summarize(latencies, errors, wall, load_seconds, peak_mb):
+    every = [seconds for values in latencies.values() for seconds in values]
+    summary = {"requests": len(every), "errors": errors, "wall_seconds": wall, "load_seconds": load_seconds,
+               "requests_per_second": len(every) / wall if wall else 0.0, "peak_rss_mb": peak_mb, "kinds": {}}
+    for kind, values in sorted(latencies.items()) + [("all", every)]:
+        if values:
+            summary["kinds"][kind] = {"requests": len(values),
+                                      **{f"p{q}_ms": percentile(values, q / 100) * 1000 for q in (50, 95, 99)}}
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a realistic /data workload against synthetic corpora, in-process and over HTTP.")
+    parser.add_argument("--sizes", default="10k,100k", help=f"Comma separated corpus sizes ({', '.join(SIZES)} or numbers of cards)")
+    parser.add_argument("--modes", default="inprocess,http", help="Comma separated: inprocess and/or http")
+    parser.add_argument("--sessions", type=int, default=300, help="User sessions to replay per run")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the corpus and the workload")
+    parser.add_argument("--corpus_dir", help="Keep the generated corpora here and reuse them (default: a temporary directory)")
+    parser.add_argument("--segment_cards", type=int, default=SEGMENT_CARDS, help="Cards per corpus segment (0 for one segment)")
+    parser.add_argument("--scorer", choices=SCORERS, default="python", help="Scoring backend")
+    parser.add_argument("--match_mode", choices=MATCH_MODES, default="substring", help="How search words match")
+    parser.add_argument("--search_workers", type=int, default=os.cpu_count() or 1, help="Search processes per web worker")
+    parser.add_argument("--http_workers", type=int, default=1, help="uvicorn workers for the HTTP runs")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the HTTP runs")
+    parser.add_argument("--output_json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    modes = args.modes.split(",")
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus_dir = args.corpus_dir or tmp_dir
+        os.makedirs(corpus_dir, exist_ok=True)
+        for size in args.sizes.split(","):
+            num_cards = parse_size(size)
+            corpus_file = os.path.join(corpus_dir, f"synthetic-{num_cards}-{args.seed}.corpus")
+            start = time.perf_counter()
+            build_synthetic_corpus(corpus_file, num_cards, args.seed, args.segment_cards)
+            print(f"\n{num_cards} cards: corpus ready in {time.perf_counter() - start:.1f} s")
+
+            sessions = make_sessions(sample_taglines(corpus_file, seed=args.seed), args.sessions, args.seed)
+            env = {
+                "DEBATEVAULT_DATA_FILE": os.path.join(corpus_dir, "no-data.json"),
+                "DEBATEVAULT_CORPUS_FILE": corpus_file,
+                "DEBATEVAULT_SCORER": args.scorer,
+                "DEBATEVAULT_MATCH_MODE": args.match_mode,
+                "DEBATEVAULT_SEARCH_WORKERS": str(args.search_workers),
+                "DEBATEVAULT_RELOAD_POLL_SECONDS": "0",
+            }
+
+            print(f"{'mode':<12}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 (ms)':>10}{'p95 (ms)':>10}"
+                  f"{'p99 (ms)':>10}{'load (s)':>10}{'peak RSS':>11}")
+            for mode in modes:
+                if mode == "inprocess":
+                    run = timed_in_process(env, sessions, args.concurrency)
+                elif mode == "http":
+                    run = run_http(env, sessions, args.concurrency, args.http_workers, args.port)
+                else:
+                    parser.error(f"unknown mode {mode!r}")
+                summary = summarize(*run)
+                every = summary["kinds"]["all"]
+                print(f"{mode:<12}{summary['requests']:>9}{summary['errors']:>8}{summary['requests_per_second']:>9.1f}"
+                      f"{every['p50_ms']:>10.1f}{every['p95_ms']:>10.1f}{every['p99_ms']:>10.1f}"
+                      f"{summary['load_seconds']:>10.1f}{summary['peak_rss_mb']:>8.0f} MB")
+                for kind, stats in summary["kinds"].items():
+                    if kind != "all":
+                        print(f"  {kind:<10}{stats['requests']:>9}{'':>17}{stats['p50_ms']:>10.1f}"
+                              f"{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+                results.append({"cards": num_cards, "mode": mode, **summary})
+
+    print(f"\nCPU cores available: {os.cpu_count()}")
+    if args.output_json:
+        with open(args.output_json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
@@ -0,0 +1,93 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_search import sample_taglines
+from bench_suggest import percentile
+from card_views import compact_cards
+from corpus_file import open_corpus
+from search_engine import make_engine
+from search_index import MAX_TERM_POSITIONS, POSITION_FIELDS, field_texts
+from synthetic_corpus import build_synthetic_corpus
+
+FIELD_POSITIONS = {"tagline": 0, "evidence": 1}
+
+
+# --------------- RESCAN ---------------
+# What highlighting without term positions takes: decode every result's
+# whole card and scan its tagline and evidence words for the tokens. Keeps
+# the same first MAX_TERM_POSITIONS positions per term, so the snippets
+# must come out identical.
+def rescan_matches(store, search_tokens, card_ids, prefix=False):
+    found = {}
+    for card_id in card_ids:
+        texts = field_texts(store.card(card_id))
+        for field in POSITION_FIELDS:
+            words = texts[FIELD_POSITIONS[field]].split()
+            for token in dict.fromkeys(search_tokens):
+                seen = {}
+                positions = []
+                for position, word in enumerate(words):
+                    if (word.startswith(token) if prefix else token in word) and seen.get(word, 0) < MAX_TERM_POSITIONS:
+                        seen[word] = seen.get(word, 0) + 1
+                        positions.append(position)
+                if positions:
+                    found.setdefault(card_id, {}).setdefault(field, {})[token] = positions
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check snippets from term positions against a rescan of the evidence and time both.")
+    parser.add_argument("--num_cards", type=int, default=50000, help="Number of synthetic cards")
+    parser.add_argument("--corpus", help="Use an existing corpus file (e.g. the full 600K set)")
+    parser.add_argument("--queries", type=int, default=200, help="Number of searches")
+    parser.add_argument("--size", type=int, default=50, help="Cards per page")
+    parser.add_argument("--prefix", action="store_true", help="Match tokens as word prefixes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus_file = args.corpus
+        if corpus_file is None:
+            corpus_file = os.path.join(tmp_dir, "synthetic.corpus")
+            build_synthetic_corpus(corpus_file, args.num_cards)
+
+        store, index, facets = open_corpus(corpus_file)
+        engine = make_engine(store, index, facets, match_mode="prefix" if args.prefix else "substring")
+        rng = random.Random(0)
+        queries = []
+        for tagline in sample_taglines(corpus_file, args.queries):
+            words = tagline.lower().split()
+            queries.append(rng.sample(words, min(len(words), rng.choice([1, 2, 3]))))
+
+        mismatches = 0
+        positions_times = []
+        rescan_times = []
+        num_matches = 0
+        for search_tokens in queries:
+            card_ids = engine.rank({}, search_tokens, args.size)[0]
+
+            start = time.perf_counter()
+            matches = index.match_positions(search_tokens, card_ids, args.prefix)
+            page = compact_cards(store, card_ids, matches)
+            positions_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            rescanned = compact_cards(store, card_ids, rescan_matches(store, search_tokens, card_ids, args.prefix))
+            rescan_times.append(time.perf_counter() - start)
+
+            num_matches += sum(len(positions) for fields in matches.values()
+                               for tokens in fields.values() for positions in tokens.values())
+            if page != rescanned:
+                mismatches += 1
+
+    print(f"{len(queries)} searches, {args.size} cards per page, {num_matches / len(queries):.0f} matches per page")
+    print(f"{'':<22}{'mean (ms)':>10}{'p95 (ms)':>10}")
+    for label, times in [("term positions", positions_times), ("rescan evidence", rescan_times)]:
+        print(f"{label:<22}{sum(times) / len(times) * 1000:>10.2f}{percentile(times, 0.95) * 1000:>10.2f}")
+    print(f"Parity: {mismatches} of {len(queries)} pages differ")
+    sys.exit(1 if mismatches else 0)
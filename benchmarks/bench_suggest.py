@@ -0,0 +1,79 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from build_corpus import build_corpus, load_json_cards
+from corpus_file import open_corpus
+from search_engine import SCORERS, make_engine
+from search_index import MATCH_MODES
+from synthetic_corpus import generate_cards
+
+K = 200
+
+
+# Every prefix of the first words of some taglines, as typed letter by letter
+def typing_sequences(store, num_sequences, seed=0):
+    rng = random.Random(seed)
+    tagline = store.columns["tagline"]
+    sequences = []
+    for _ in range(num_sequences):
+        words = tagline.get(rng.randrange(len(store))).lower().split()[:2]
+        text = " ".join(words)
+        sequences.append([text[:end] for end in range(1, len(text) + 1)])
+    return sequences
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time /suggest completions and prefix vs substring /data matching.")
+    parser.add_argument("--num_cards", type=int, default=100000, help="Number of synthetic cards")
+    parser.add_argument("--input_json", help="Use a real card JSON file instead of synthetic cards")
+    parser.add_argument("--corpus", help="Use an existing corpus file (e.g. the full 600K set)")
+    parser.add_argument("--sequences", type=int, default=50, help="Number of typed queries to replay")
+    parser.add_argument("--scorer", choices=SCORERS, default="python", help="Scoring backend for /data")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus_file = args.corpus
+        if corpus_file is None:
+            cards = load_json_cards(args.input_json) if args.input_json else generate_cards(args.num_cards)
+            corpus_file = os.path.join(tmp_dir, "cards.corpus")
+            build_corpus(cards, corpus_file)
+            del cards
+
+        store, index, facets = open_corpus(corpus_file)
+        sequences = typing_sequences(store, args.sequences)
+        print(f"\nCards: {len(store)}, completions: {len(index.suggest)}, "
+              f"keystrokes: {sum(len(sequence) for sequence in sequences)}")
+
+        # 1) /suggest on every keystroke
+        timings = []
+        for sequence in sequences:
+            for typed in sequence:
+                start = time.perf_counter()
+                index.suggest.suggest(typed, 10)
+                timings.append((time.perf_counter() - start) * 1000)
+        print(f"suggest        median {statistics.median(timings):.3f} ms, "
+              f"p99 {percentile(timings, 0.99):.3f} ms, max {max(timings):.3f} ms")
+
+        # 2) /data ranking of every keystroke in each match mode
+        for match_mode in MATCH_MODES:
+            engine = make_engine(store, index, facets, args.scorer, match_mode)
+            timings = []
+            for sequence in sequences:
+                for typed in sequence:
+                    start = time.perf_counter()
+                    engine.rank({}, typed.split(), K)
+                    timings.append((time.perf_counter() - start) * 1000)
+            print(f"data {match_mode:<9} median {statistics.median(timings):.3f} ms, "
+                  f"p99 {percentile(timings, 0.99):.3f} ms, max {max(timings):.3f} ms")
@@ -0,0 +1,120 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from build_corpus import build_corpus
+from synthetic_corpus import generate_cards
+
+# Mix of unfiltered, filtered and scrolled requests
+REQUESTS = [
+    {"search": "nuclear war"},
+    {"search": "economic growth", "side": "Aff"},
+    {"search": "climate"},
+    {"side": "Neg", "event": "LD"},
+    {"search": "trade deficit", "page": 2},
+    {"topic": "Jan/Feb 25"},
+]
+
+
+def wait_until_ready(base_url, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"{base_url}/data?size=1", timeout=5).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not start")
+
+
+# Fire requests from `concurrency` threads for `duration` seconds
+def run_load(base_url, concurrency, duration, vary):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.time() + duration
+
+    def client(client_id):
+        count = 0
+        while time.time() < deadline:
+            params = dict(REQUESTS[count % len(REQUESTS)])
+            if vary and "search" in params:
+                # A distinct suffix per request defeats the per-worker query cache
+                params["search"] += f" {client_id}x{count}"
+            url = f"{base_url}/data?{urllib.parse.urlencode(params)}"
+            start = time.perf_counter()
+            try:
+                urllib.request.urlopen(url, timeout=60).read()
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+            except OSError:
+                with lock:
+                    errors[0] += 1
+            count += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": len(latencies) / duration,
+        "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure /data requests/sec for different uvicorn worker counts.")
+    parser.add_argument("--num_cards", type=int, default=20000, help="Number of synthetic cards")
+    parser.add_argument("--workers", default="1,2,4", help="Comma separated worker counts to try")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent client threads")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load per worker count")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the benchmark server")
+    parser.add_argument("--vary", action="store_true", help="Make every search unique so the query cache never hits")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_file = os.path.join(tmp_dir, "cards.json")
+        corpus_file = os.path.join(tmp_dir, "cards.corpus")
+        cards = generate_cards(args.num_cards)
+        with open(data_file, "w", encoding="utf-8") as f:
+            json.dump(cards, f)
+        build_corpus(cards, corpus_file)
+        del cards
+
+        env = dict(os.environ,
+                   DEBATEVAULT_DATA_FILE=data_file,
+                   DEBATEVAULT_CORPUS_FILE=corpus_file,
+                   DEBATEVAULT_STATIC_DIR=os.path.join(ROOT, "static"))
+        base_url = f"http://127.0.0.1:{args.port}"
+
+        print(f"\n{'workers':>8}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}")
+        for workers in [int(w) for w in args.workers.split(",")]:
+            server = subprocess.Popen(
+                [sys.executable, "serve.py", "--workers", str(workers), "--port", str(args.port)],
+                cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                wait_until_ready(base_url)
+                result = run_load(base_url, args.concurrency, args.duration, args.vary)
+            finally:
+                server.terminate()
+                server.wait()
+            print(f"{workers:>8}{result['requests']:>10}{result['errors']:>8}{result['rps']:>10.1f}"
+                  f"{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}")
+        print(f"\nCPU cores available: {os.cpu_count()}")
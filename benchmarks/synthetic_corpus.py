@@ -0,0 +1,146 @@
+import argparse
+import json
+import os
+import random
+import sys
+from itertools import accumulate, islice
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Corpus sizes the benchmarks are run at (600K is about the real card set)
+SIZES = {"10k": 10_000, "100k": 100_000, "600k": 600_000, "2m": 2_000_000}
+
+# Larger corpora are built as a base corpus plus delta segments of at most
+# this many cards (see corpus_segments.py), so building one never needs all
+# of its cards in memory at once
+SEGMENT_CARDS = 200_000
+
+# Vocabulary sizes are loosely modelled on the real card corpus
+NUM_WORDS = 20000
+SIDES = ["Aff", "Neg"]
+EVENTS = ["LD", "PF", "CX"]
+TOPICS = ["Jan/Feb 25", "Sep/Oct 24", "Nov/Dec 24", "Jan/Feb 24", "March/April 24", "Nats 24"]
+EVIDENCE_SETS = ["2024", "2022", "2021", "2020", "2019"]
+
+
+# Build a vocabulary of random lowercase words with a Zipf-like frequency skew.
+# The weights are returned cumulated, which rng.choices would otherwise redo
+# over the whole vocabulary on every call.
+def make_vocabulary(rng, num_words=NUM_WORDS):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < num_words:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 11))))
+    words = sorted(words)
+    weights = [1.0 / (rank + 1) for rank in range(len(words))]
+    return words, list(accumulate(weights))
+
+
+def make_sentence(rng, words, cum_weights, num_words):
+    return " ".join(rng.choices(words, cum_weights=cum_weights, k=num_words))
+
+
+# Evidence paragraphs carry the same <b>/<u>/<mark> markup extract_cards emits
+def make_evidence(rng, words, weights):
+    paragraphs = []
+    for _ in range(rng.randint(1, 4)):
+        text = make_sentence(rng, words, weights, rng.randint(60, 400)).split()
+        start = rng.randint(0, len(text) - 1)
+        end = min(len(text), start + rng.randint(3, 25))
+        text[start] = "<mark><u><b>" + text[start]
+        text[end - 1] = text[end - 1] + "</b></u></mark>"
+        paragraphs.append(" ".join(text))
+    return paragraphs
+
+
+# Yield cards with the same schema as the processed card JSON
+def iter_cards(num_cards, seed=0):
+    rng = random.Random(seed)
+    words, weights = make_vocabulary(rng)
+    for i in range(num_cards):
+        tagline = make_sentence(rng, words, weights, rng.randint(5, 29)).capitalize()
+        author = rng.choice(words).capitalize()
+        citation = (f"{author} {rng.randint(14, 25)} - {make_sentence(rng, words, weights, rng.randint(15, 60))} "
+                    f"https://www.{rng.choice(words)}.com/{rng.choice(words)}")
+        yield {
+            "tagline": tagline,
+            "citation": citation,
+            "evidence": make_evidence(rng, words, weights),
+            "side": rng.choice(SIDES),
+            "event": rng.choice(EVENTS),
+            "topic": rng.choice(TOPICS),
+            "evidence_set": rng.choice(EVIDENCE_SETS),
+            "file_path": f"data/raw/{rng.choice(words)}-{rng.choice(['aff', 'neg'])}-{i}.docx",
+            "duplicate_count": rng.choices([1, 2, 3, 5, 10, 40], [60, 20, 10, 5, 4, 1])[0],
+        }
+
+
+# Return a list of cards with the same schema as the processed card JSON
+def generate_cards(num_cards, seed=0):
+    return list(iter_cards(num_cards, seed))
+
+
+# "100k", "2m" or a plain number of cards
+def parse_size(size):
+    return SIZES.get(size.lower()) or int(size)
+
+
+# Write the cards as a JSON list one card at a time
+def write_cards_json(path, num_cards, seed=0):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for i, card in enumerate(iter_cards(num_cards, seed)):
+            f.write(", " if i else "")
+            json.dump(card, f)
+        f.write("]")
+
+
+def build_synthetic_corpus(corpus_file, num_cards, seed=0, segment_cards=SEGMENT_CARDS):
+    """
+    Build (or reuse, if it was built before with the same size and seed) a
+    corpus of synthetic cards. Past segment_cards cards the rest go into
+    delta segments next to it, which main.py loads along with the base.
+    """
+    from build_corpus import build_corpus
+    from corpus_segments import delta_files, remove_delta_files, write_delta_manifest
+
+    segment_cards = segment_cards or num_cards
+    num_deltas = max(0, -(-num_cards // segment_cards) - 1)
+    stamp_file = corpus_file + ".synthetic.json"
+    stamp = {"num_cards": num_cards, "seed": seed, "segment_cards": segment_cards}
+    if os.path.exists(stamp_file) and os.path.exists(corpus_file) and len(delta_files(corpus_file)) == num_deltas:
+        with open(stamp_file, encoding="utf-8") as f:
+            if json.load(f) == stamp:
+                return
+
+    remove_delta_files(corpus_file)
+    cards = iter_cards(num_cards, seed)
+    build_corpus(list(islice(cards, segment_cards)), corpus_file)
+    deltas = []
+    for number in range(1, num_deltas + 1):
+        deltas.append(f"{corpus_file}.delta{number}")
+        build_corpus(list(islice(cards, segment_cards)), deltas[-1])
+    if deltas:
+        write_delta_manifest(corpus_file, deltas)
+    with open(stamp_file, "w", encoding="utf-8") as f:
+        json.dump(stamp, f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic card corpus for benchmarks.")
+    parser.add_argument("--num_cards", default="10000", help=f"Number of cards to generate, or one of {', '.join(SIZES)}")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--output_json", help="Path to the output JSON file")
+    parser.add_argument("--output_corpus", help="Path to the output corpus file (built without writing the JSON)")
+    parser.add_argument("--segment_cards", type=int, default=SEGMENT_CARDS,
+                        help="Cards per corpus segment (0 for a single segment)")
+    args = parser.parse_args()
+
+    if not args.output_json and not args.output_corpus:
+        parser.error("give --output_json and/or --output_corpus")
+    num_cards = parse_size(args.num_cards)
+    if args.output_json:
+        write_cards_json(args.output_json, num_cards, args.seed)
+        print(f"Wrote {num_cards} synthetic cards to {args.output_json}")
+    if args.output_corpus:
+        build_synthetic_corpus(args.output_corpus, num_cards, args.seed, args.segment_cards)
@@ -0,0 +1,50 @@
+import argparse
+import csv
+import json
+import time
+
+from card_store import CardStore
+from corpus_file import write_corpus
+from facet_index import FacetIndex
+from search_index import SearchIndex
+
+# Evidence cells can be longer than the csv module's default field limit
+csv.field_size_limit(2**31 - 1)
+
+
+# Load cards from the processed card JSON (a list of card dicts)
+def load_json_cards(json_file):
+    with open(json_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+# Load cards from a filtered card CSV, the same way Misc/csv_to_json.py reads it
+def load_csv_cards(csv_file):
+    with open(csv_file, "r", encoding="utf-8-sig") as f:
+        return list(csv.DictReader(f))
+
+# Build the card store, search index and facet index and write them to one file
+def build_corpus(cards, output_file):
+    start = time.perf_counter()
+    store = CardStore.from_cards(cards)
+    index = SearchIndex.from_cards(cards)
+    facets = FacetIndex.from_store(store)
+    print(f"Built card store and indexes for {len(cards)} cards in {time.perf_counter() - start:.1f}s")
+
+    write_corpus(output_file, store, index, facets)
+    print(f"Corpus file saved to: {output_file}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile processed cards into a memory-mappable corpus file.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input_json", help="Path to the processed card JSON file")
+    source.add_argument("--input_csv", help="Path to the filtered card CSV file")
+    parser.add_argument("--output_corpus", required=True, help="Path to the output corpus file (e.g. cards.corpus)")
+    args = parser.parse_args()
+
+    if args.input_json:
+        cards = load_json_cards(args.input_json)
+    else:
+        cards = load_csv_cards(args.input_csv)
+
+    build_corpus(cards, args.output_corpus)
@@ -0,0 +1,147 @@
+import csv
+import json
+import os
+import re
+
+# Columns of an extracted card, in the order cut_card in extract_cards.py builds them
+CARD_FIELDS = ('tagline', 'citation', 'evidence', 'side', 'event', 'topic', 'file_path')
+
+# Output shards are named cards_batch_<n>.<format>
+OUTPUT_FORMATS = ('jsonl', 'csv')
+SHARD_PATTERN = re.compile(r"cards_batch_(\d+)\.(?:jsonl|csv)$")
+
+# Default number of cards per shard before a new one is started
+DEFAULT_SHARD_SIZE = 20000
+
+# Evidence cells can be longer than the csv module's default field limit
+csv.field_size_limit(2**31 - 1)
+
+
+# Return the number of the next output shard (one past the highest existing one)
+def next_shard_number(output_folder):
+    numbers = [int(m.group(1)) for m in map(SHARD_PATTERN.match, os.listdir(output_folder)) if m]
+    return max(numbers, default=0) + 1
+
+
+# --------------- SHARD WRITER ---------------
+class ShardWriter:
+    """
+    Appends cards to rotating output shards as they arrive, so memory stays
+    flat however many files are processed.
+
+    JSONL shards hold one card per line with evidence as a real list. CSV
+    shards keep the layout the batch CSVs always had (evidence as a Python
+    list literal), which filter_cards.py and Misc/merge_csv.py read.
+    """
+
+    def __init__(self, output_folder, output_format='jsonl', shard_size=DEFAULT_SHARD_SIZE):
+        self.output_folder = output_folder
+        self.output_format = output_format
+        self.shard_size = shard_size
+        self.number = next_shard_number(output_folder)
+        self.count = 0
+        self.file = None
+        self.writer = None
+
+    @property
+    def shard(self):
+        return f"cards_batch_{self.number}.{self.output_format}"
+
+    def next_shard(self):
+        """
+        Return the shard the next write goes to, starting a new one if the
+        current one is full.
+        """
+        if self.count >= self.shard_size:
+            self.close()
+            self.number += 1
+            self.count = 0
+        return self.shard
+
+    def write(self, cards):
+        """
+        Append cards to the shard next_shard() returned and flush them.
+        """
+        if self.file is None:
+            path = os.path.join(self.output_folder, self.next_shard())
+            new_shard = not os.path.exists(path)
+            self.file = open(path, 'a', encoding='utf-8', newline='')
+            if self.output_format == 'csv':
+                self.writer = csv.DictWriter(self.file, fieldnames=CARD_FIELDS)
+                if new_shard:
+                    self.writer.writeheader()
+
+        if self.output_format == 'csv':
+            self.writer.writerows(cards)
+        else:
+            self.file.writelines(json.dumps(card, ensure_ascii=False) + '\n' for card in cards)
+        self.file.flush()
+        self.count += len(cards)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.writer = None
+
+
+# --------------- SHARD CLEANUP ---------------
+def _rewrite_shard(shard_path, paths):
+    """
+    Stream a shard into a temporary file without the cards of the given
+    file paths, then swap it in. Returns (cards removed, cards kept).
+
+    A crash while a card was being written can leave a torn last line (or,
+    in a CSV shard, a row missing its last columns); it is dropped and
+    counted as removed.
+    """
+    removed = kept = 0
+    tmp_path = shard_path + '.tmp'
+    with open(shard_path, 'r', encoding='utf-8', newline='') as src, \
+            open(tmp_path, 'w', encoding='utf-8', newline='') as dst:
+        if shard_path.endswith('.csv'):
+            reader = csv.DictReader(src)
+            writer = csv.DictWriter(dst, fieldnames=reader.fieldnames)
+            writer.writeheader()
+            for row in reader:
+                if row['file_path'] is None or row['file_path'] in paths:
+                    removed += 1
+                else:
+                    writer.writerow(row)
+                    kept += 1
+        else:
+            for line in src:
+                try:
+                    card = json.loads(line)
+                except json.JSONDecodeError:
+                    removed += 1
+                    continue
+                if card['file_path'] in paths:
+                    removed += 1
+                else:
+                    # A whole card cut off before its newline still needs one
+                    dst.write(line if line.endswith('\n') else line + '\n')
+                    kept += 1
+
+    if kept:
+        os.replace(tmp_path, shard_path)
+    else:
+        os.remove(tmp_path)
+        os.remove(shard_path)
+    return removed, kept
+
+
+# Rewrite shards without the cards of the given manifest entries (deleted, changed or
+# unfinished files). Shards are replaced atomically, so this is safe to redo after a crash.
+def remove_file_cards(output_folder, entries):
+    paths_by_shard = {}
+    for entry in entries:
+        if entry.shard:
+            paths_by_shard.setdefault(entry.shard, set()).add(entry.path)
+
+    for shard, paths in paths_by_shard.items():
+        shard_path = os.path.join(output_folder, shard)
+        if not os.path.exists(shard_path):
+            continue
+        removed, _ = _rewrite_shard(shard_path, paths)
+        print(f"Removed {removed} cards of {len(paths)} old files from {shard}")
@@ -0,0 +1,164 @@
+from array import array
+import json
+import zlib
+
+# --------------- COLUMN TYPES ---------------
+# Low-cardinality card fields stored as interned integer codes
+CATEGORICAL_FIELDS = ("side", "topic", "event", "evidence_set")
+
+# Code 0 of every categorical column means "card has no such field"
+MISSING_CODE = 0
+
+# Tags for values in a blob column (an empty value means the field is missing)
+STR_TAG = b"s"
+JSON_TAG = b"j"
+ZLIB_TAG = b"z"
+
+# Values at least this large (e.g. evidence) are stored zlib-compressed
+COMPRESS_MIN_BYTES = 512
+
+
+def encode_value(value) -> bytes:
+    """
+    Encode one card value as tagged bytes for a blob column.
+    """
+    if isinstance(value, str):
+        encoded = STR_TAG + value.encode("utf-8")
+    else:
+        encoded = JSON_TAG + json.dumps(value, ensure_ascii=False).encode("utf-8")
+    if len(encoded) >= COMPRESS_MIN_BYTES:
+        encoded = ZLIB_TAG + zlib.compress(encoded)
+    return encoded
+
+
+def decode_value(encoded: bytes):
+    """
+    Decode tagged bytes produced by encode_value.
+    """
+    tag = encoded[:1]
+    if tag == ZLIB_TAG:
+        encoded = zlib.decompress(encoded[1:])
+        tag = encoded[:1]
+    text = encoded[1:].decode("utf-8")
+    if tag == STR_TAG:
+        return text
+    return json.loads(text)
+
+
+class CategoricalColumn:
+    """
+    Column of interned values: one integer code per card plus a table of
+    distinct values. Also keeps the lowercased form of every value, which is
+    what filters compare against.
+    """
+
+    def __init__(self, values: list, codes: array):
+        self.values = values    # code -> original value (values[0] is unused)
+        self.codes = codes      # card id -> code
+        self.lowered = ["" if v is None else str(v).lower() for v in values]
+
+    @classmethod
+    def build(cls, cards: list[dict], field: str) -> "CategoricalColumn":
+        values = [None]
+        lookup = {}
+        codes = array("I")
+        for card in cards:
+            if field not in card:
+                codes.append(MISSING_CODE)
+                continue
+            value = card[field]
+            key = (type(value), value)
+            code = lookup.get(key)
+            if code is None:
+                code = lookup[key] = len(values)
+                values.append(value)
+            codes.append(code)
+        return cls(values, codes)
+
+    def has(self, card_id: int) -> bool:
+        return self.codes[card_id] != MISSING_CODE
+
+    def get(self, card_id: int):
+        return self.values[self.codes[card_id]]
+
+
+class BlobColumn:
+    """
+    Column of arbitrary values stored back to back in one bytes blob, indexed
+    by an offset table. Strings are stored as tagged UTF-8 and everything else
+    (e.g. the evidence list) as tagged JSON, and large values are compressed,
+    so a value is only decoded when the card is actually returned.
+    """
+
+    def __init__(self, blob: bytes, offsets: array):
+        self.blob = blob          # encoded values, back to back
+        self.offsets = offsets    # start of card i's value in blob, plus end sentinel
+
+    @classmethod
+    def build(cls, cards: list[dict], field: str) -> "BlobColumn":
+        blob = bytearray()
+        offsets = array("Q")
+        for card in cards:
+            offsets.append(len(blob))
+            if field not in card:
+                continue
+            blob += encode_value(card[field])
+        offsets.append(len(blob))
+        return cls(bytes(blob), offsets)
+
+    def has(self, card_id: int) -> bool:
+        return self.offsets[card_id + 1] > self.offsets[card_id]
+
+    def get(self, card_id: int):
+        return decode_value(self.blob[self.offsets[card_id]:self.offsets[card_id + 1]])
+
+
+# --------------- CARD STORE ---------------
+class CardStore:
+    """
+    Compact, column-oriented copy of the card corpus.
+
+    Instead of one Python dict per card, every field is a column: interned
+    codes for side/topic/event/evidence_set and offset-indexed blobs for the
+    rest. Card dicts are only rebuilt for the cards a request returns.
+    Card ids are positions in the original list of cards.
+    """
+
+    def __init__(self, fields: list[str], columns: dict, num_cards: int):
+        self.fields = fields      # field names in the order cards are rebuilt
+        self.columns = columns    # field name -> CategoricalColumn or BlobColumn
+        self.num_cards = num_cards
+
+    @classmethod
+    def from_cards(cls, cards: list[dict]) -> "CardStore":
+        fields = []
+        for card in cards:
+            for field in card:
+                if field not in fields:
+                    fields.append(field)
+
+        columns = {}
+        for field in fields:
+            if field in CATEGORICAL_FIELDS:
+                columns[field] = CategoricalColumn.build(cards, field)
+            else:
+                columns[field] = BlobColumn.build(cards, field)
+        return cls(fields, columns, len(cards))
+
+    def __len__(self) -> int:
+        return self.num_cards
+
+    def card(self, card_id: int, fields=None) -> dict:
+        """
+        Rebuild the card dict for one card id: every field, or only the
+        given fields (the other columns are not decoded).
+        """
+        card = {}
+        for field in self.fields if fields is None else fields:
+            column = self.columns.get(field)
+            if column is not None and column.has(card_id):
+                card[field] = column.get(card_id)
+        return card
+
+    def cards(self, card_ids, fields=None) -> list[dict]:
+        return [self.card(card_id, fields) for card_id in card_ids]
@@ -0,0 +1,227 @@
+from collections import Counter
+import hashlib
+import html
+import re
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# --------------- LIST VIEWS ---------------
+# /data returns whole cards ("full") or, for the results list, only what is
+# shown before a card's evidence is loaded ("compact"); the evidence comes
+# from /card/{id} or /cards
+VIEWS = ("full", "compact")
+
+# Fields of a compact card, besides its id and evidence snippet
+COMPACT_FIELDS = ("tagline", "citation", "side", "event", "topic", "evidence_set", "duplicate_count")
+
+# Words of evidence in a compact card's snippet, and at most how many of
+# them come before the first search match in it
+SNIPPET_WORDS = 40
+SNIPPET_LEAD_WORDS = 8
+
+# Markup in the evidence (<b>, <u>, <mark>, ...)
+TAG_PATTERN = re.compile(r"</?[A-Za-z][^>]*>")
+WORD_PATTERN = re.compile(r"\S+")
+
+
+def clean_word(word: str) -> str:
+    """
+    A word of the evidence without its markup, as plain text.
+    """
+    return html.unescape(TAG_PATTERN.sub("", word))
+
+
+def merge_spans(spans: list) -> list[list[int]]:
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def word_spans(word: str, offset: int, tokens) -> list:
+    """
+    [start, end) offsets (shifted by offset) of the tokens inside a word.
+    """
+    lowered = word.lower()
+    if len(lowered) != len(word):
+        return []    # lowercasing changed the length, so offsets would be off
+    spans = []
+    for token in tokens:
+        position = lowered.find(token)
+        if position != -1:
+            spans.append((offset + position, offset + position + len(token)))
+    return spans
+
+
+def best_window(matches: list[tuple[int, int]], words: int) -> tuple[int, int]:
+    """
+    First and last word position of the matches that fit within `words`
+    words and cover the most distinct tokens (then the most matches, then
+    the earliest). matches are (word position, token number) pairs sorted by
+    position; one pass with a sliding window.
+    """
+    best = None
+    counts = Counter()
+    left = 0
+    for right, (position, token) in enumerate(matches):
+        counts[token] += 1
+        while position - matches[left][0] >= words:
+            dropped = matches[left][1]
+            counts[dropped] -= 1
+            if not counts[dropped]:
+                del counts[dropped]
+            left += 1
+        key = (len(counts), right - left + 1)
+        if best is None or key > best[0]:
+            best = (key, matches[left][0], position)
+    return best[1], best[2]
+
+
+def make_snippet(evidence, token_positions: Optional[dict] = None, words: int = SNIPPET_WORDS) -> tuple[str, list]:
+    """
+    Return (snippet, spans): `words` words of the evidence as plain text,
+    with "..." where it is cut short, and the [start, end) offsets of the
+    search tokens in it. token_positions ({token: word positions}, from
+    SearchIndex.match_positions) picks the window with the most tokens;
+    without it the snippet is the start of the evidence. The evidence text
+    is only split, never searched.
+    """
+    if isinstance(evidence, list):
+        all_words = " ".join(str(paragraph) for paragraph in evidence).split()
+    else:
+        # Positions index evidence lists; a string has none (see field_texts)
+        all_words = evidence.split() if isinstance(evidence, str) else []
+        token_positions = None
+
+    start = 0
+    at = {}
+    matches = []
+    if token_positions:
+        matches = sorted((position, number) for number, positions in enumerate(token_positions.values())
+                         for position in positions)
+    if matches:
+        first, last = best_window(matches, words)
+        start = max(0, first - min(SNIPPET_LEAD_WORDS, (words - (last - first + 1)) // 2))
+        start = max(0, min(start, len(all_words) - words))
+        tokens = list(token_positions)
+        for position, number in matches:
+            at.setdefault(position, []).append(tokens[number])
+    end = min(len(all_words), start + words)
+
+    pieces = ["..."] if start > 0 else []
+    length = 3 if start > 0 else 0
+    spans = []
+    for position in range(start, end):
+        word = clean_word(all_words[position])
+        if not word:
+            continue
+        if pieces:
+            length += 1
+        if position in at:
+            spans += word_spans(word, length, at[position])
+        pieces.append(word)
+        length += len(word)
+    if end < len(all_words):
+        pieces.append("...")
+    return " ".join(pieces), merge_spans(spans)
+
+
+def tagline_spans(tagline, token_positions: Optional[dict]) -> list[list[int]]:
+    """
+    [start, end) offsets of the search tokens in the tagline, from their
+    word positions ({token: word positions}).
+    """
+    if not token_positions or not isinstance(tagline, str):
+        return []
+    at = {}
+    for token, positions in token_positions.items():
+        for position in positions:
+            at.setdefault(position, []).append(token)
+    if not at:
+        return []
+    spans = []
+    last = max(at)
+    for position, match in enumerate(WORD_PATTERN.finditer(tagline)):
+        if position > last:
+            break
+        if position in at:
+            spans += word_spans(match.group(), match.start(), at[position])
+    return merge_spans(spans)
+
+
+def compact_cards(store, card_ids, matches: Optional[dict] = None) -> list[dict]:
+    """
+    Compact cards (id, COMPACT_FIELDS and snippet) of card ids. Only those
+    columns are decoded; the evidence is decoded for the snippet but not
+    returned. With the matches of a search ({card id: {field: {token: word
+    positions}}}) the snippet is the best window of the evidence, and the
+    character offsets of the matches in the snippet and tagline are
+    returned as snippet_matches and tagline_matches, for highlighting.
+    """
+    matches = matches or {}
+    cards = []
+    for card_id, card in zip(card_ids, store.cards(card_ids, COMPACT_FIELDS + ("evidence",))):
+        evidence = card.pop("evidence", None)
+        card_matches = matches.get(card_id, {})
+        card = {"id": card_id, **card}
+        card["snippet"], card["snippet_matches"] = make_snippet(evidence, card_matches.get("evidence"))
+        card["tagline_matches"] = tagline_spans(card.get("tagline"), card_matches.get("tagline"))
+        cards.append(card)
+    return cards
+
+
+# --------------- CACHING ---------------
+# Card ids are positions in the corpus, so the card behind an id is fixed for
+# a corpus version (a reload may change it). Card requests that name the
+# version they got their ids from can be cached for good; the others are
+# revalidated with their ETag.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+def body_etag(body: bytes) -> str:
+    # Weak, since the same body may be sent compressed or not
+    return 'W/"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Whether an If-None-Match header names etag (weak comparison).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == bare for tag in if_none_match.split(","))
+
+
+# --------------- COMPRESSION ---------------
+# Responses at least this large are compressed: with brotli (if the brotli
+# package is installed) for clients that accept it, otherwise with gzip by
+# GZipMiddleware in main.py
+COMPRESS_MIN_BYTES = 1024
+BROTLI_QUALITY = 5
+
+
+def accepts_brotli(accept_encoding: Optional[str]) -> bool:
+    if brotli is None or not accept_encoding:
+        return False
+    return any(coding.split(";")[0].strip() == "br" for coding in accept_encoding.split(","))
+
+
+def brotli_body(body: bytes, accept_encoding: Optional[str]) -> Optional[bytes]:
+    """
+    The body compressed with brotli, or None if it is small, brotli is not
+    installed or the client does not accept it.
+    """
+    if len(body) < COMPRESS_MIN_BYTES or not accepts_brotli(accept_encoding):
+        return None
+    return brotli.compress(body, quality=BROTLI_QUALITY)
@@ -0,0 +1,225 @@
+from array import array
+import json
+import mmap
+import os
+import struct
+import sys
+
+from card_store import BlobColumn, CardStore, CategoricalColumn
+from facet_index import FacetIndex
+from search_index import SEARCH_FIELDS, FieldIndex, SearchIndex
+from suggest_index import SuggestIndex
+
+# --------------- FILE LAYOUT ---------------
+# [preamble][section][section]...[header JSON]
+#
+# The preamble holds the magic string and where the header JSON is. The
+# header describes every section (offset, length, array typecode) plus the
+# small metadata (field names, categorical values, facet labels). Sections
+# are raw native-endian arrays and byte blobs, 8-byte aligned, so they can be
+# used straight out of the memory map without parsing or copying.
+MAGIC = b"DVCORPUS"
+FORMAT_VERSION = 4
+PREAMBLE = struct.Struct("<8sIQQ")   # magic, version, header offset, header length
+ALIGNMENT = 8
+
+
+# --------------- MAPPED BYTES ---------------
+class MappedBytes:
+    """
+    Read-only window onto part of a memory map that supports the bytes
+    operations the indexes use (len, slicing and find) without copying the
+    whole window into the process.
+    """
+
+    def __init__(self, mm: mmap.mmap, start: int, length: int):
+        self.mm = mm
+        self.start = start
+        self.end = start + length
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError("MappedBytes only supports contiguous slices")
+            return self.mm[self.start + start:self.start + max(start, stop)]
+        if key < 0:
+            key += len(self)
+        return self.mm[self.start + key]
+
+    def find(self, sub: bytes, start: int = 0, end: int = None) -> int:
+        end = len(self) if end is None else end
+        position = self.mm.find(sub, self.start + start, self.start + end)
+        return position if position == -1 else position - self.start
+
+
+# --------------- WRITE ---------------
+def _collect_sections(store: CardStore, index: SearchIndex, facets: FacetIndex):
+    """
+    Return (metadata, sections), where sections maps a section name to the
+    bytes-like object or array to store.
+    """
+    sections = {}
+    columns = {}
+    for field in store.fields:
+        column = store.columns[field]
+        if isinstance(column, CategoricalColumn):
+            columns[field] = {"kind": "categorical", "values": column.values}
+            sections[f"column.{field}.codes"] = column.codes
+        else:
+            columns[field] = {"kind": "blob"}
+            sections[f"column.{field}.offsets"] = column.offsets
+            sections[f"column.{field}.blob"] = column.blob
+
+    for field, field_index in index.fields.items():
+        sections[f"index.{field}.term_blob"] = field_index.term_blob
+        sections[f"index.{field}.term_offsets"] = field_index.term_offsets
+        sections[f"index.{field}.post_offsets"] = field_index.post_offsets
+        sections[f"index.{field}.post_ids"] = field_index.post_ids
+        sections[f"index.{field}.term_freqs"] = field_index.term_freqs
+        sections[f"index.{field}.norms"] = field_index.norms
+        if field_index.positions is not None:
+            sections[f"index.{field}.pos_offsets"] = field_index.pos_offsets
+            sections[f"index.{field}.positions"] = field_index.positions
+
+    sections["index.boosts"] = index.boosts
+    sections["suggest.blob"] = index.suggest.blob
+    sections["suggest.offsets"] = index.suggest.offsets
+    sections["suggest.weights"] = index.suggest.weights
+    sections["suggest.by_weight"] = index.suggest.by_weight
+
+    facet_values = {}
+    num_bytes = (facets.num_cards + 7) // 8
+    for field, bitmaps in facets.bitmaps.items():
+        facet_values[field] = list(bitmaps)
+        for position, bitmap in enumerate(bitmaps.values()):
+            sections[f"facet.{field}.{position}"] = bitmap.to_bytes(num_bytes, "little")
+
+    metadata = {
+        "num_cards": store.num_cards,
+        "fields": store.fields,
+        "columns": columns,
+        "facet_values": facet_values,
+        "facet_labels": facets.labels,
+    }
+    return metadata, sections
+
+
+def write_corpus(path: str, store: CardStore, index: SearchIndex, facets: FacetIndex) -> None:
+    """
+    Write the card store, search index and facet index to one binary file.
+    The file is written under a temporary name and then renamed into place,
+    so readers never see a half-written corpus.
+    """
+    metadata, sections = _collect_sections(store, index, facets)
+    layout = {}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(bytes(PREAMBLE.size))
+        for name, data in sections.items():
+            f.write(bytes(-f.tell() % ALIGNMENT))
+            typecode = data.typecode if isinstance(data, array) else "B"
+            raw = memoryview(data).cast("B")
+            layout[name] = [f.tell(), len(raw), typecode]
+            f.write(raw)
+
+        header = dict(metadata, version=FORMAT_VERSION, byteorder=sys.byteorder, sections=layout)
+        header_bytes = json.dumps(header).encode("utf-8")
+        header_offset = f.tell()
+        f.write(header_bytes)
+
+        f.seek(0)
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, header_offset, len(header_bytes)))
+    os.replace(tmp_path, path)
+
+
+# --------------- READ ---------------
+def corpus_version(path: str) -> int:
+    """
+    Return the format version of a corpus file, or 0 if it is not one.
+    """
+    with open(path, "rb") as f:
+        preamble = f.read(PREAMBLE.size)
+    if len(preamble) < PREAMBLE.size:
+        return 0
+    magic, version, _, _ = PREAMBLE.unpack(preamble)
+    return version if magic == MAGIC else 0
+
+
+def open_corpus(path: str) -> tuple:
+    """
+    Memory-map a corpus file and return (store, index, facets) backed by it.
+    Nothing is parsed except the header, so this takes milliseconds, and
+    processes that open the same file share its pages through the OS page
+    cache instead of each holding a private copy.
+    """
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, header_offset, header_length = PREAMBLE.unpack_from(mm, 0)
+    if magic != MAGIC:
+        raise RuntimeError(f"Not a DebateVault corpus file: {path}")
+    if version != FORMAT_VERSION:
+        raise RuntimeError(f"Unsupported corpus file version {version} (expected {FORMAT_VERSION}), rerun build_corpus.py: {path}")
+    header = json.loads(mm[header_offset:header_offset + header_length])
+    if header["byteorder"] != sys.byteorder:
+        raise RuntimeError(f"Corpus file was built on a {header['byteorder']}-endian machine: {path}")
+
+    view = memoryview(mm)
+    layout = header["sections"]
+
+    def section(name):
+        if name not in layout:
+            return None
+        offset, length, typecode = layout[name]
+        if typecode == "B":
+            return MappedBytes(mm, offset, length)
+        return view[offset:offset + length].cast(typecode)
+
+    def array_section(name):
+        # An array section, also one of bytes (which section() maps as a blob)
+        offset, length, typecode = layout[name]
+        return view[offset:offset + length].cast(typecode)
+
+    num_cards = header["num_cards"]
+    columns = {}
+    for field, spec in header["columns"].items():
+        if spec["kind"] == "categorical":
+            columns[field] = CategoricalColumn(spec["values"], section(f"column.{field}.codes"))
+        else:
+            columns[field] = BlobColumn(section(f"column.{field}.blob"), section(f"column.{field}.offsets"))
+    store = CardStore(header["fields"], columns, num_cards)
+
+    fields = {
+        field: FieldIndex(
+            section(f"index.{field}.term_blob"),
+            section(f"index.{field}.term_offsets"),
+            section(f"index.{field}.post_offsets"),
+            section(f"index.{field}.post_ids"),
+            array_section(f"index.{field}.term_freqs"),
+            section(f"index.{field}.norms"),
+            section(f"index.{field}.pos_offsets"),
+            section(f"index.{field}.positions"),
+        )
+        for field in SEARCH_FIELDS
+    }
+    suggest = SuggestIndex(
+        section("suggest.blob"),
+        section("suggest.offsets"),
+        section("suggest.weights"),
+        section("suggest.by_weight"),
+    )
+    index = SearchIndex(fields, num_cards, suggest, section("index.boosts"))
+
+    bitmaps = {}
+    for field, values in header["facet_values"].items():
+        bitmaps[field] = {}
+        for position, lowered in enumerate(values):
+            offset, length, _ = layout[f"facet.{field}.{position}"]
+            bitmaps[field][lowered] = int.from_bytes(view[offset:offset + length], "little")
+    facets = FacetIndex(bitmaps, header["facet_labels"], num_cards)
+
+    return store, index, facets
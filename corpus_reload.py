@@ -0,0 +1,339 @@
+from contextlib import contextmanager
+from typing import Optional
+import asyncio
+import hashlib
+import os
+import threading
+import time
+
+from build_corpus import build_corpus, load_json_cards
+from card_store import CardStore
+from corpus_segments import (DELTAS_SUFFIX, delta_files, make_segmented, next_delta_file, open_segments,
+                             remove_delta_files, segmented_index, write_delta_manifest)
+from facet_index import FacetIndex
+from query_cache import QueryCache
+from search_executor import SearchExecutor
+from search_index import SearchIndex
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+class ReloadBusy(Exception):
+    """
+    Raised when a reload or append is already running (in this process, or
+    in another worker sharing the corpus file).
+    """
+
+
+# Take an exclusive lock on an open file without waiting; False if another
+# process holds it. The OS releases it when the holder exits, even if it
+# crashed, so a lock is never left behind.
+def try_lock(file) -> bool:
+    try:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def unlock(file) -> None:
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# Build the card store, search index and facet index of cards in memory
+def build_segment(cards: list[dict]) -> tuple:
+    store = CardStore.from_cards(cards)
+    return store, SearchIndex.from_cards(cards), FacetIndex.from_store(store)
+
+
+def _stat(path: str):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+# --------------- SNAPSHOT ---------------
+class CorpusSnapshot:
+    """
+    One version of the corpus and everything served from it: the segments,
+    the merged store/engine/suggest index, the search executor whose workers
+    map the same files, and the query cache of rankings made from it.
+
+    Requests hold on to the snapshot they started with, so a reload never
+    changes the cards under a request. A replaced snapshot is closed (its
+    search workers stopped) once the last request using it finishes.
+    """
+
+    def __init__(self, segments: list[tuple], corpus_files: Optional[list[str]], sources: tuple,
+                 generation: int, scorer: str, match_mode: str, ranking: str, search_workers: int,
+                 metrics=None):
+        self.segments = segments
+        self.corpus_files = corpus_files
+        self.sources = sources          # stat of the files it was loaded from
+        self.generation = generation
+        # Names the cards behind the card ids: the same in every worker that
+        # loaded the same files and segments (unlike generation)
+        self.version = hashlib.blake2b(repr((sources, [len(store) for store, _, _ in segments])).encode(),
+                                       digest_size=8).hexdigest()
+        self.loaded_at = time.time()
+        self.store, self.engine, self.suggest = make_segmented(segments, scorer, match_mode, ranking)
+        # Term positions of the cards returned, for snippets and highlights
+        self.index = segmented_index(segments)
+        self.match_mode = match_mode
+        self.executor = SearchExecutor(self.engine, corpus_files, search_workers, scorer, match_mode, ranking,
+                                       metrics)
+        self.cache = QueryCache()
+        self.users = 0
+        self.retired = False
+
+    @property
+    def num_cards(self) -> int:
+        return len(self.store)
+
+    def close(self) -> None:
+        self.executor.shutdown()
+
+
+# --------------- SNAPSHOT MANAGER ---------------
+class CorpusManager:
+    """
+    Holds the current CorpusSnapshot and replaces it without a restart.
+
+    reload() rebuilds the corpus file from the data file (or reopens a
+    corpus file rebuilt with build_corpus.py) and append() adds a delta
+    segment of new cards without a full rebuild. Either builds the new
+    snapshot off to the side, starts its search workers, then swaps it in
+    with one assignment; requests already running finish on the old one.
+
+    With a corpus file, deltas are written next to it and a lock file keeps
+    the uvicorn workers sharing it from rebuilding at the same time; every
+    worker picks up the other workers' changes through poll().
+
+    Search metrics (a SearchMetrics, optional) outlive the snapshots, so
+    their counters keep counting across reloads.
+    """
+
+    def __init__(self, data_file: str, corpus_file: str, scorer: str = "python",
+                 match_mode: str = "substring", ranking: str = "bm25f", search_workers: int = 0, metrics=None):
+        self.data_file = data_file
+        self.corpus_file = corpus_file
+        self.scorer = scorer
+        self.match_mode = match_mode
+        self.ranking = ranking
+        self.search_workers = search_workers
+        self.metrics = metrics
+        self.use_corpus_file = os.path.exists(corpus_file)
+        self.current = None
+        self.generation = 0
+        self.reloading = False
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    # ----- loading -----
+    def load(self) -> CorpusSnapshot:
+        """
+        Load the first snapshot (at startup).
+        """
+        if self.use_corpus_file:
+            # Memory-map the prebuilt card store, search index and facet
+            # index. This takes milliseconds, and uvicorn workers share the
+            # file's pages.
+            if os.path.exists(self.data_file) and os.path.getmtime(self.data_file) > os.path.getmtime(self.corpus_file):
+                print(f"Warning: {self.data_file} is newer than {self.corpus_file}, rerun build_corpus.py")
+            return self._swap(self._open_corpus_files())
+        if not os.path.exists(self.data_file):
+            raise RuntimeError(f"Data file not found: {self.data_file}")
+        return self._swap(self._build_in_memory())
+
+    def _open_corpus_files(self) -> CorpusSnapshot:
+        sources = self._source_stamp()
+        corpus_files = [self.corpus_file] + delta_files(self.corpus_file)
+        return self._snapshot(open_segments(corpus_files), corpus_files, sources)
+
+    def _build_in_memory(self) -> CorpusSnapshot:
+        sources = self._source_stamp()
+        # Cards are kept in a compact columnar store (card dicts are only
+        # rebuilt for the page being returned), and the tagline/evidence/
+        # citation text is tokenized once into an inverted index
+        return self._snapshot([build_segment(load_json_cards(self.data_file))], None, sources)
+
+    def _snapshot(self, segments: list[tuple], corpus_files: Optional[list[str]], sources: tuple) -> CorpusSnapshot:
+        snapshot = CorpusSnapshot(segments, corpus_files, sources, self.generation + 1,
+                                  self.scorer, self.match_mode, self.ranking, self.search_workers, self.metrics)
+        if self.current is not None:
+            # Replacing a live snapshot: have its search workers ready first
+            snapshot.executor.warm_up()
+        return snapshot
+
+    def _source_stamp(self) -> tuple:
+        # The files a snapshot is made from; when any of them changes on disk,
+        # poll() reloads
+        if self.use_corpus_file:
+            return _stat(self.corpus_file), _stat(self.corpus_file + DELTAS_SUFFIX)
+        return (_stat(self.data_file),)
+
+    def _swap(self, snapshot: CorpusSnapshot) -> CorpusSnapshot:
+        with self._lock:
+            old = self.current
+            self.current = snapshot
+            self.generation = snapshot.generation
+            close_old = old is not None and old.users == 0
+            if old is not None:
+                old.retired = True
+        if close_old:
+            old.close()
+        return snapshot
+
+    @contextmanager
+    def snapshot(self):
+        """
+        Use the current snapshot for the duration of a request.
+        """
+        with self._lock:
+            snapshot = self.current
+            snapshot.users += 1
+        try:
+            yield snapshot
+        finally:
+            with self._lock:
+                snapshot.users -= 1
+                close = snapshot.retired and snapshot.users == 0
+            if close:
+                snapshot.close()
+
+    # ----- reload and append -----
+    @contextmanager
+    def _exclusive(self):
+        """
+        Allow one reload or append at a time, in this process and (with a
+        corpus file) across the processes sharing it.
+        """
+        with self._lock:
+            if self.reloading:
+                raise ReloadBusy("A reload is already running")
+            self.reloading = True
+        # The lock file itself stays; holding the lock on it is what counts
+        lock_path = self.corpus_file + ".lock" if self.use_corpus_file else None
+        lock_file = None
+        try:
+            if lock_path is not None:
+                lock_file = open(lock_path, "a")
+                if not try_lock(lock_file):
+                    raise ReloadBusy(f"{lock_path} is locked, another process is rebuilding the corpus")
+            try:
+                yield
+                self.last_error = None
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                if lock_file is not None:
+                    unlock(lock_file)
+        finally:
+            if lock_file is not None:
+                lock_file.close()
+            with self._lock:
+                self.reloading = False
+
+    def data_changed(self) -> bool:
+        """
+        Whether the data file is newer than what is being served.
+        """
+        if not os.path.exists(self.data_file):
+            return False
+        if self.use_corpus_file:
+            return os.path.getmtime(self.data_file) > os.path.getmtime(self.corpus_file)
+        return _stat(self.data_file) != self.current.sources[0]
+
+    def reload(self, rebuild: Optional[bool] = None) -> CorpusSnapshot:
+        """
+        Load a new snapshot and swap it in. With a corpus file it is rebuilt
+        from the data file first when rebuild is set or (by default) when the
+        data file is newer; the rebuild folds in any deltas, which are then
+        removed. Blocking, so call it off the event loop.
+        """
+        with self._exclusive():
+            if rebuild is None:
+                rebuild = self.data_changed()
+            if not self.use_corpus_file:
+                return self._swap(self._build_in_memory())
+            if rebuild:
+                build_corpus(load_json_cards(self.data_file), self.corpus_file)
+                remove_delta_files(self.corpus_file)
+            return self._swap(self._open_corpus_files())
+
+    def append(self, cards: list[dict]) -> CorpusSnapshot:
+        """
+        Add cards as a new delta segment and swap in a snapshot that includes
+        them. With a corpus file the delta is written next to it, so it
+        survives a restart and other workers see it. Blocking.
+        """
+        with self._exclusive():
+            if not self.use_corpus_file:
+                current = self.current
+                return self._swap(self._snapshot(current.segments + [build_segment(cards)], None, current.sources))
+            deltas = delta_files(self.corpus_file)
+            delta_file = next_delta_file(self.corpus_file)
+            build_corpus(cards, delta_file)
+            write_delta_manifest(self.corpus_file, deltas + [delta_file])
+            return self._swap(self._open_corpus_files())
+
+    def poll(self) -> bool:
+        """
+        Reload if the data file changed or another process rebuilt the corpus
+        or appended a delta. Returns whether a new snapshot was swapped in.
+        Blocking.
+        """
+        if self.data_changed():
+            # Checked again under the lock: another worker may have just
+            # rebuilt the corpus, and then it only needs to be reopened
+            self.reload(rebuild=None)
+            return True
+        if self.use_corpus_file and self._source_stamp() != self.current.sources:
+            self.reload(rebuild=False)
+            return True
+        return False
+
+    async def watch(self, poll_seconds: float) -> None:
+        """
+        Call poll() every poll_seconds, off the event loop, until cancelled.
+        """
+        while True:
+            await asyncio.sleep(poll_seconds)
+            try:
+                if await asyncio.to_thread(self.poll):
+                    print(f"Reloaded corpus: generation {self.generation}, {self.current.num_cards} cards")
+            except ReloadBusy:
+                pass
+            except Exception as e:
+                print(f"Corpus reload failed: {type(e).__name__}: {e}")
+
+    def status(self) -> dict:
+        snapshot = self.current
+        return {
+            "generation": snapshot.generation,
+            "version": snapshot.version,
+            "num_cards": snapshot.num_cards,
+            "segments": [len(store) for store, _, _ in snapshot.segments],
+            "loaded_at": snapshot.loaded_at,
+            "reloading": self.reloading,
+            "last_error": self.last_error,
+        }
+
+    def close(self) -> None:
+        if self.current is not None:
+            self.current.close()
@@ -0,0 +1,246 @@
+from bisect import bisect_right
+from itertools import islice
+from typing import Optional
+import heapq
+import json
+import os
+import re
+
+from corpus_file import open_corpus
+from search_engine import make_engine
+from search_metrics import SearchStats
+from suggest_index import split_query
+
+# --------------- DELTA FILES ---------------
+# Cards appended without a full rebuild are written as small corpus files
+# next to the base corpus (<corpus>.delta<n>), listed in order in
+# <corpus>.deltas.json along with the size and mtime of the base corpus they
+# extend. A base corpus rebuilt since then (by the server or by running
+# build_corpus.py) no longer matches, so its stale deltas are ignored.
+DELTAS_SUFFIX = ".deltas.json"
+DELTA_PATTERN = re.compile(r"\.delta(\d+)$")
+
+
+def _base_stamp(corpus_file: str) -> list:
+    stat = os.stat(corpus_file)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def delta_files(corpus_file: str) -> list[str]:
+    """
+    Return the delta corpus files that extend corpus_file, oldest first.
+    """
+    try:
+        with open(corpus_file + DELTAS_SUFFIX, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return []
+    if manifest.get("base") != _base_stamp(corpus_file):
+        return []
+    folder = os.path.dirname(corpus_file)
+    return [os.path.join(folder, name) for name in manifest["deltas"]]
+
+
+def write_delta_manifest(corpus_file: str, deltas: list[str]) -> None:
+    manifest = {"base": _base_stamp(corpus_file), "deltas": [os.path.basename(path) for path in deltas]}
+    tmp_path = corpus_file + DELTAS_SUFFIX + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, corpus_file + DELTAS_SUFFIX)
+
+
+def next_delta_file(corpus_file: str) -> str:
+    folder, name = os.path.split(os.path.abspath(corpus_file))
+    numbers = [int(m.group(1)) for f in os.listdir(folder) if f.startswith(name)
+               for m in [DELTA_PATTERN.search(f)] if m]
+    return f"{corpus_file}.delta{max(numbers, default=0) + 1}"
+
+
+def remove_delta_files(corpus_file: str) -> None:
+    """
+    Delete the delta manifest and every delta file of corpus_file (after a
+    full rebuild has folded their cards into the base corpus).
+    """
+    folder, name = os.path.split(os.path.abspath(corpus_file))
+    for f in os.listdir(folder):
+        if f == name + DELTAS_SUFFIX or (f.startswith(name) and DELTA_PATTERN.search(f)):
+            try:
+                os.remove(os.path.join(folder, f))
+            except OSError:
+                # Still mapped by a process on a platform that refuses to delete it
+                pass
+
+
+def open_segments(corpus_files: list[str]) -> list[tuple]:
+    return [open_corpus(path) for path in corpus_files]
+
+
+# --------------- SEGMENTED CORPUS ---------------
+class SegmentedStore:
+    """
+    Card store over several segments (a base corpus and its deltas). Card
+    ids run on from one segment to the next, so the cards of segment i have
+    ids offsets[i] .. offsets[i + 1] - 1.
+    """
+
+    def __init__(self, stores: list):
+        self.stores = stores
+        self.offsets = [0]
+        for store in stores:
+            self.offsets.append(self.offsets[-1] + len(store))
+        self.num_cards = self.offsets[-1]
+
+    def __len__(self) -> int:
+        return self.num_cards
+
+    def card(self, card_id: int, fields=None) -> dict:
+        segment = bisect_right(self.offsets, card_id) - 1
+        return self.stores[segment].card(card_id - self.offsets[segment], fields)
+
+    def cards(self, card_ids, fields=None) -> list[dict]:
+        return [self.card(card_id, fields) for card_id in card_ids]
+
+
+def merge_facets(facets: dict, more: dict) -> dict:
+    """
+    Add the facet counts of another segment. Values that only differ in case
+    are one facet value, shown the way the first segment with it shows it.
+    """
+    merged = {}
+    for field, counts in facets.items():
+        merged[field] = dict(counts)
+        labels = {label.lower(): label for label in counts}
+        for label, count in more.get(field, {}).items():
+            label = labels.setdefault(label.lower(), label)
+            merged[field][label] = merged[field].get(label, 0) + count
+    return merged
+
+
+class SegmentedEngine:
+    """
+    Ranks across the segments of a SegmentedStore. Each segment's engine
+    returns its top k as (-score, card id) pairs; shifted to global ids,
+    those merge into the ranking one engine over all the cards would give,
+    since scores only depend on the card itself and the IDF statistics,
+    which are summed over the segments and handed to every engine. (Length
+    norms are relative to each segment's own average field lengths, which
+    a delta drawn from the same cards barely moves.)
+    """
+
+    def __init__(self, engines: list, offsets: list[int]):
+        self.engines = engines
+        self.offsets = offsets
+
+    def rank(self, filters: dict, search_tokens: Optional[list[str]], k: int,
+             stats: Optional[SearchStats] = None) -> tuple:
+        top, total, facets = self.top(filters, search_tokens, k, stats)
+        return [card_id for _, card_id in top], total, facets
+
+    def top(self, filters: dict, search_tokens: Optional[list[str]], k: int,
+            stats: Optional[SearchStats] = None) -> tuple:
+        stats = stats if stats is not None else SearchStats()
+        corpus_stats = None
+        if search_tokens is not None and self.engines[0].ranking == "bm25f":
+            stats.start()
+            corpus_stats = self.corpus_stats(search_tokens)
+            stats.lap("relevance")
+        tops = []
+        total = 0
+        facets = None
+        for engine, offset in zip(self.engines, self.offsets):
+            # Stage timings and counts add up over the segments
+            top, segment_total, segment_facets = engine.top(filters, search_tokens, k, stats, corpus_stats)
+            tops.append([(score, card_id + offset) for score, card_id in top])
+            total += segment_total
+            facets = segment_facets if facets is None else merge_facets(facets, segment_facets)
+        stats.start()
+        top = list(islice(heapq.merge(*tops), max(k, 0)))
+        stats.lap("select")
+        return top, total, facets
+
+    def corpus_stats(self, search_tokens: list[str]) -> tuple:
+        """
+        (number of cards, {token: document frequency}) over all segments.
+        """
+        num_cards = 0
+        frequencies = dict.fromkeys(search_tokens, 0)
+        for engine in self.engines:
+            num_cards += len(engine.store)
+            for token, frequency in engine.index.document_frequencies(search_tokens, engine.prefix).items():
+                frequencies[token] += frequency
+        return num_cards, frequencies
+
+
+class SegmentedSuggest:
+    """
+    /suggest over several segments. Completions found in any segment's top
+    list get their weight summed over all segments, so a completion spread
+    thinly over the segments can be missed, but the weights shown are exact.
+    """
+
+    def __init__(self, suggests: list):
+        self.suggests = suggests
+
+    def suggest(self, query: str, limit: int = 10) -> list[dict]:
+        split = split_query(query)
+        if split is None or limit <= 0:
+            return []
+        lead, prefix = split
+        texts = {text for suggest in self.suggests for text, _ in suggest.top(prefix, limit)}
+        weighted = sorted((-sum(suggest.weight(text) for suggest in self.suggests), text) for text in texts)
+        return [
+            {"text": f"{lead} {text}" if lead else text, "weight": -weight}
+            for weight, text in weighted[:limit]
+        ]
+
+
+class SegmentedIndex:
+    """
+    Term positions (SearchIndex.match_positions) over the segments' search
+    indexes, for card ids that run on from one segment to the next.
+    """
+
+    def __init__(self, indexes: list, offsets: list[int]):
+        self.indexes = indexes
+        self.offsets = offsets    # first card id of every segment, plus end sentinel
+
+    def match_positions(self, search_tokens: list[str], card_ids, prefix: bool = False) -> dict:
+        by_segment = {}
+        for card_id in card_ids:
+            segment = bisect_right(self.offsets, card_id) - 1
+            by_segment.setdefault(segment, []).append(card_id - self.offsets[segment])
+        found = {}
+        for segment, segment_ids in by_segment.items():
+            offset = self.offsets[segment]
+            for card_id, fields in self.indexes[segment].match_positions(search_tokens, segment_ids, prefix).items():
+                found[card_id + offset] = fields
+        return found
+
+
+# --------------- FACTORY ---------------
+def make_segmented(segments: list[tuple], scorer: str = "python", match_mode: str = "substring",
+                   ranking: str = "bm25f") -> tuple:
+    """
+    Return (store, engine, suggest) over a list of (store, index, facets)
+    segments. A single segment is served directly, without the merging.
+    """
+    engines = [make_engine(store, index, facets, scorer, match_mode, ranking) for store, index, facets in segments]
+    if len(segments) == 1:
+        store, index, _ = segments[0]
+        return store, engines[0], index.suggest
+    store = SegmentedStore([store for store, _, _ in segments])
+    engine = SegmentedEngine(engines, store.offsets[:-1])
+    return store, engine, SegmentedSuggest([index.suggest for _, index, _ in segments])
+
+
+def segmented_index(segments: list[tuple]):
+    """
+    Return the search index (for term positions) over a list of (store,
+    index, facets) segments: the index itself for a single segment.
+    """
+    if len(segments) == 1:
+        return segments[0][1]
+    offsets = [0]
+    for store, _, _ in segments:
+        offsets.append(offsets[-1] + len(store))
+    return SegmentedIndex([index for _, index, _ in segments], offsets)
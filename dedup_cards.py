@@ -0,0 +1,306 @@
+import argparse
+import html
+import json
+import os
+import re
+import shutil
+import zlib
+from functools import lru_cache, partial
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from filter_cards import TAG_PATTERN, map_chunks
+
+# MinHash signature length and the LSH banding of it (bands * rows <= NUM_PERM).
+# 32 bands of 4 rows make cards with a Jaccard similarity of 0.6 candidates
+# with ~98% probability, and the signatures are then checked against THRESHOLD.
+NUM_PERM = 128
+BANDS = 32
+ROWS = 4
+THRESHOLD = 0.7
+
+# Evidence is compared as sets of overlapping word 5-grams
+SHINGLE_WORDS = 5
+WORD_PATTERN = re.compile(r"\w+")
+
+DEFAULT_CHUNKSIZE = 20000
+SEED = 1
+
+# Odd 64-bit multiplier for combining word hashes into shingle and band keys
+MIX = np.uint64(0x9E3779B97F4A7C15)
+EMPTY = np.uint32(0xFFFFFFFF)
+SHIFT = np.uint64(32)
+
+
+# --------------- MINHASH ---------------
+@lru_cache(maxsize=None)
+def permutations(num_perm, seed=SEED):
+    # Multiply-shift hash functions ((a * x + b) mod 2^64) >> 32 with odd a
+    rng = np.random.default_rng(seed)
+    a = rng.integers(0, 2**64, size=(num_perm, 1), dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2**64, size=(num_perm, 1), dtype=np.uint64)
+    return a, b
+
+
+# crc32 of every word seen by this process (words repeat a lot across cards)
+WORD_HASHES = {}
+
+
+def word_hashes(words):
+    get = WORD_HASHES.get
+    hashes = []
+    for word in words:
+        h = get(word)
+        if h is None:
+            h = WORD_HASHES[word] = zlib.crc32(word.encode("utf-8", "surrogatepass"))
+        hashes.append(h)
+    return hashes
+
+
+def evidence_words(evidence):
+    if not isinstance(evidence, str):
+        return []
+    return WORD_PATTERN.findall(html.unescape(TAG_PATTERN.sub("", evidence)).lower())
+
+
+def shingle_hashes(hashes, shingle_words=SHINGLE_WORDS):
+    """
+    64-bit hashes of the word shingles of a card, given its word hashes (the
+    whole text is one shingle when it is shorter than shingle_words).
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    width = min(shingle_words, len(hashes))
+    count = len(hashes) - width + 1
+    shingles = hashes[:count].copy()
+    for offset in range(1, width):
+        shingles = shingles * MIX + hashes[offset:offset + count]
+    return shingles
+
+
+def minhash(evidence_list, num_perm=NUM_PERM, shingle_words=SHINGLE_WORDS, batch_shingles=1 << 13):
+    """
+    MinHash signatures (one row of num_perm uint32 per card) of the evidence
+    of many cards. Shingles of about batch_shingles at a time are hashed in
+    one array and reduced per card: much faster than card by card, while
+    the num_perm x batch_shingles array still fits in cache.
+    Cards without any words get an all-EMPTY signature.
+    """
+    a, b = permutations(num_perm)
+    signatures = np.full((len(evidence_list), num_perm), EMPTY, dtype=np.uint32)
+    batch, cards, size = [], [], 0
+
+    def flush():
+        shingles = np.concatenate(batch)
+        starts = np.cumsum([0] + [len(s) for s in batch[:-1]])
+        hashed = np.multiply(a, shingles)
+        hashed += b
+        hashed >>= SHIFT
+        signatures[cards] = np.minimum.reduceat(hashed, starts, axis=1).T
+        batch.clear()
+        cards.clear()
+
+    for i, evidence in enumerate(evidence_list):
+        words = evidence_words(evidence)
+        if not words:
+            continue
+        shingles = shingle_hashes(word_hashes(words), shingle_words)
+        batch.append(shingles)
+        cards.append(i)
+        size += len(shingles)
+        if size >= batch_shingles:
+            flush()
+            size = 0
+    if batch:
+        flush()
+    return signatures
+
+
+def chunk_signatures(chunk, num_perm=NUM_PERM, shingle_words=SHINGLE_WORDS):
+    number, evidence_list = chunk
+    return number, minhash(evidence_list, num_perm, shingle_words)
+
+
+# --------------- CHECKPOINT ---------------
+class SignatureStore:
+    """
+    Directory of per-chunk signature files (signatures_<n>.npy). A chunk whose
+    file exists is not hashed again, so an interrupted run picks up where it
+    stopped. meta.json records the input file and parameters the signatures
+    were computed with; if they change, the old files are thrown away.
+    """
+
+    def __init__(self, path, meta):
+        self.path = path
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                if json.load(f) != meta:
+                    shutil.rmtree(path)
+        os.makedirs(path, exist_ok=True)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    def chunk_path(self, number):
+        return os.path.join(self.path, f"signatures_{number}.npy")
+
+    def has(self, number):
+        return os.path.exists(self.chunk_path(number))
+
+    def save(self, number, signatures):
+        tmp_path = self.chunk_path(number) + ".tmp.npy"
+        np.save(tmp_path, signatures)
+        os.replace(tmp_path, self.chunk_path(number))
+
+    def load(self, number):
+        return np.load(self.chunk_path(number), mmap_mode="r")
+
+
+def compute_signatures(input_csv, store, chunksize=DEFAULT_CHUNKSIZE, workers=1,
+                       num_perm=NUM_PERM, shingle_words=SHINGLE_WORDS):
+    """
+    MinHash the evidence of every card in input_csv into store, chunk by
+    chunk across workers. Returns the duplicate_count of every card (1 where
+    the input has none).
+    """
+    counts = []
+    todo = []
+
+    def missing_chunks():
+        for number, df in enumerate(pd.read_csv(input_csv, chunksize=chunksize)):
+            if "duplicate_count" in df.columns:
+                counts.append(pd.to_numeric(df["duplicate_count"], errors="coerce").fillna(1).astype(np.int64).to_numpy())
+            else:
+                counts.append(np.ones(len(df), dtype=np.int64))
+            todo.append(number)
+            if not store.has(number):
+                yield number, df["evidence"].tolist()
+
+    func = partial(chunk_signatures, num_perm=num_perm, shingle_words=shingle_words)
+    for number, signatures in tqdm(map_chunks(func, missing_chunks(), workers), desc="Hashing", unit="chunk"):
+        store.save(number, signatures)
+    return [store.load(number) for number in todo], np.concatenate(counts) if counts else np.zeros(0, np.int64)
+
+
+# --------------- LSH CLUSTERING ---------------
+def find(parent, i):
+    root = i
+    while parent[root] != root:
+        root = parent[root]
+    while parent[i] != root:
+        parent[i], i = root, parent[i]
+    return root
+
+
+def cluster_signatures(chunks, bands=BANDS, rows=ROWS, threshold=THRESHOLD):
+    """
+    Group cards whose signatures agree on at least one band, and join a group
+    member to the group's first card when their signatures agree on at least
+    threshold of all positions (the estimated Jaccard similarity). Returns
+    the cluster root of every card.
+    """
+    offsets = np.cumsum([0] + [len(chunk) for chunk in chunks])
+    num_cards = int(offsets[-1])
+    parent = list(range(num_cards))
+
+    def signature(i):
+        c = int(np.searchsorted(offsets, i, side="right")) - 1
+        return chunks[c][i - offsets[c]]
+
+    for band in tqdm(range(bands), desc="Clustering", unit="band"):
+        columns = slice(band * rows, (band + 1) * rows)
+        keys = np.zeros(num_cards, dtype=np.uint64)
+        for start, chunk in zip(offsets, chunks):
+            part = np.asarray(chunk[:, columns], dtype=np.uint64)
+            key = np.zeros(len(part), dtype=np.uint64)
+            for column in range(part.shape[1]):
+                key = key * MIX + part[:, column]
+            empty = (part == EMPTY).all(axis=1)
+            keys[start:start + len(part)] = key
+            # Cards without evidence never match
+            keys[start:start + len(part)][empty] = 0
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        sizes = np.diff(np.r_[starts, num_cards])
+        for start, size in zip(starts[sizes > 1], sizes[sizes > 1]):
+            if sorted_keys[start] == 0:
+                continue
+            members = order[start:start + size]
+            first = int(members[0])
+            first_signature = signature(first)
+            for member in members[1:]:
+                member = int(member)
+                a, b = find(parent, first), find(parent, member)
+                if a != b and np.mean(signature(member) == first_signature) >= threshold:
+                    parent[b] = a
+
+    return np.array([find(parent, i) for i in range(num_cards)], dtype=np.int64)
+
+
+def canonical_cards(roots, counts):
+    """
+    Return (keep, cluster_counts): which cards represent their cluster and,
+    for each card, the summed duplicate_count of its cluster. The kept card
+    is the one with the highest duplicate_count, the last one on ties (like
+    drop_duplicates(keep="last") in filter_cards.py).
+    """
+    positions = np.arange(len(roots))
+    order = np.lexsort((positions, counts, roots))
+    last_of_cluster = np.r_[roots[order][1:] != roots[order][:-1], True]
+    keep = np.zeros(len(roots), dtype=bool)
+    keep[order[last_of_cluster]] = True
+    totals = np.bincount(roots, weights=counts, minlength=len(roots)).astype(np.int64)
+    return keep, totals[roots]
+
+
+def write_canonical(input_csv, output_csv, keep, cluster_counts, chunksize=DEFAULT_CHUNKSIZE):
+    # Stream the input again and write each cluster's card with the cluster's count
+    position = written = 0
+    header = True
+    for df in pd.read_csv(input_csv, chunksize=chunksize):
+        rows = slice(position, position + len(df))
+        position += len(df)
+        df = df.assign(duplicate_count=cluster_counts[rows])[keep[rows]]
+        df.to_csv(output_csv, mode="w" if header else "a", header=header, index=False)
+        header = False
+        written += len(df)
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge near-duplicate cards (re-cut or lightly reworded evidence) with MinHash/LSH.")
+    parser.add_argument("--input_csv", required=True, help="Filtered cards CSV from filter_cards.py")
+    parser.add_argument("--output_csv", required=True, help="Path to the output CSV file")
+    parser.add_argument("--checkpoint_dir", help="Where chunk signatures are kept between runs (default: <output_csv>.minhash)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes hashing chunks in parallel")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Cards per chunk")
+    parser.add_argument("--num_perm", type=int, default=NUM_PERM, help="MinHash signature length")
+    parser.add_argument("--bands", type=int, default=BANDS, help="LSH bands")
+    parser.add_argument("--rows", type=int, default=ROWS, help="Signature rows per LSH band")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="Estimated Jaccard similarity to merge two cards")
+    parser.add_argument("--shingle_words", type=int, default=SHINGLE_WORDS, help="Words per shingle")
+    args = parser.parse_args()
+
+    if args.bands * args.rows > args.num_perm:
+        parser.error("--bands * --rows must not exceed --num_perm")
+
+    stat = os.stat(args.input_csv)
+    store = SignatureStore(args.checkpoint_dir or args.output_csv + ".minhash", {
+        "input_csv": os.path.abspath(args.input_csv), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+        "chunksize": args.chunksize, "num_perm": args.num_perm, "shingle_words": args.shingle_words, "seed": SEED,
+    })
+
+    # 1) MinHash every card's evidence (resumable)
+    chunks, counts = compute_signatures(args.input_csv, store, args.chunksize, args.workers,
+                                        args.num_perm, args.shingle_words)
+
+    # 2) Cluster near-duplicates with LSH
+    roots = cluster_signatures(chunks, args.bands, args.rows, args.threshold)
+    keep, cluster_counts = canonical_cards(roots, counts)
+
+    # 3) Write one card per cluster
+    written = write_canonical(args.input_csv, args.output_csv, keep, cluster_counts, args.chunksize)
+    print(f"Merged {len(roots)} cards into {written} clusters")
+    print(f"Deduplicated CSV saved to: {args.output_csv}")
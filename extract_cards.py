@@ -1,34 +1,20 @@
 import os
+import sys
 import json
 import argparse
-import pandas as pd
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from docx import Document
 import fitz
+from functools import partial
+from itertools import chain
 from tqdm import tqdm
-from concurrent.futures import ProcessPoolExecutor, as_completed
-
-# Global list of tournaments
-ALL_TOURNAMENTS = [
-
-    # Sep/Oct tournaments
-    'loyola', 'opener', 'grapevine', 'niles', 'knight', 'scottsdale', 'washburn', 'greenhill',
-    'yale', 'stephen', 'lindale', 'america', 'georgetown', 'bvsw', 'marist', 'howe', 'nova',
-    'delores', 'tennent', 'westminster', 'york', 'trevian', 'averill', 'kansas', 'heart', 'iowa',
-    # Nov/Dec tournaments
-    'blue', 'kckcc', 'quarry', 'michigan', 'hockaday', 'minneapple', 'peach', 'badgerland',
-    'dragon', 'katy', 'stampede', 'ucla', 'swing', 'glenbrooks', 'longhorn', 'princeton',
-    'series-1', 'mamaroneck', 'alta-silver', 'alief', 'costa', 'cypress', 'wphs', 'holiday-classic',
-    'paradigm', 'isidore-newman', 'chapel-hill',
-    # Jan/Feb tournaments
-    'blake', 'college-prep', 'strake-jesuit', 'billy-tate', 'churchill', 'hdshc', 'samford',
-    'peninsula', 'harvard-westlake', 'cavalier', 'rebel-speech', 'mount-vernon', 'cougar-classic',
-    'jean-ward', 'camp-cabot', 'columbia', 'pennsbury', 'unlv', 'foley', 'jasper', 'regatta',
-    'marshall-spalter', 'bellaire', 'three-rivers', 'pennsylvania-liberty', 'newman-smith', 'langham',
-    'stanford', 'harvard-national', 'bingham-bids', 'berkeley', 'chisholm', 'john-marshall',
-    'series-2', 'milo', 'series-3',
-    # March/April tournaments
-    'debate-coaches', 'of-champions'
-]
+
+from card_shards import DEFAULT_SHARD_SIZE, OUTPUT_FORMATS, ShardWriter, remove_file_cards
+from extract_manifest import MANIFEST_NAME, Manifest, hash_file
+from fast_docx import parse_docx_fast
+from file_scheduler import FileScheduler
+from tournament_classifier import DEFAULT_SEASON_FILE, load_classifier, scan_files
 
 # Return file extension
 def get_file_extension(file_path):
@@ -69,43 +55,85 @@ def parse_docx(docx_file):
 
     return plain_paragraphs, marked_paragraphs
 
-# Return list of plain paragraphs and marked_pararaphs from the PDF file
-def parse_pdf(pdf_file):
-    doc = fitz.open(pdf_file)
+# PDF text is read in "dict" mode without images: text blocks come out the
+# same, but image blocks are not decoded and copied into the result
+PDF_TEXT_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+
+# Fewest pages worth handing to a separate process in parse_pdf
+MIN_PAGES_PER_WORKER = 40
+
+
+def parse_pdf_pages(pdf_file, start=0, stop=None):
+    """
+    Paragraphs (plain and marked) of pages start..stop-1 of a PDF. Every
+    text block is one paragraph, so the paragraphs of consecutive page
+    ranges add up to those of the whole file.
+    """
     plain_paragraphs = []
     marked_paragraphs = []
+    bold_fonts = {}
 
-    for page in doc:
-        blocks = page.get_text("dict")["blocks"]
-        for block in blocks:
-            if block["type"] == 0:
+    with fitz.open(pdf_file) as doc:
+        for page in doc.pages(start, stop):
+            for block in page.get_text("dict", flags=PDF_TEXT_FLAGS)["blocks"]:
+                if block["type"] != 0:
+                    continue
                 plain_spans = []
                 marked_spans = []
 
                 for line in block.get("lines", []):
                     for span in line.get("spans", []):
-                        
-                        # Plain text
-                        plain_spans.append(span["text"])
-
-                        # Minimal marked text
                         span_text = span["text"]
-                        if "Bold" in span["font"]:
-                            span_text = f"<b>{span_text}</b>"
-                        marked_spans.append(span_text)
+                        plain_spans.append(span_text)
+
+                        # Minimal marked text: bold by font name, checked once per font
+                        font = span["font"]
+                        bold = bold_fonts.get(font)
+                        if bold is None:
+                            bold = bold_fonts[font] = "Bold" in font
+                        marked_spans.append(f"<b>{span_text}</b>" if bold else span_text)
 
-                    # Separate lines with a newline if desired
+                    # Separate lines with a newline
                     plain_spans.append("\n")
                     marked_spans.append("\n")
 
                 paragraph_plain = "".join(plain_spans).strip()
-                paragraph_marked = "".join(marked_spans).strip()
                 if paragraph_plain:
                     plain_paragraphs.append(paragraph_plain)
-                    marked_paragraphs.append(paragraph_marked)
+                    marked_paragraphs.append("".join(marked_spans).strip())
 
     return plain_paragraphs, marked_paragraphs
 
+
+def parse_pdf(pdf_file, page_workers=1):
+    """
+    Paragraphs (plain and marked) of a PDF. With page_workers > 1 a long PDF
+    is split into consecutive page ranges parsed in that many processes.
+    Processes that are themselves pool workers (daemonic, like the
+    FileScheduler workers) cannot start processes and parse serially.
+    """
+    if page_workers > 1 and not multiprocessing.current_process().daemon:
+        with fitz.open(pdf_file) as doc:
+            page_count = doc.page_count
+        workers = min(page_workers, page_count // MIN_PAGES_PER_WORKER)
+        if workers > 1:
+            bounds = [page_count * i // workers for i in range(workers + 1)]
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                ranges = list(pool.map(parse_pdf_pages, [pdf_file] * workers, bounds[:-1], bounds[1:]))
+            return ([p for plain, _ in ranges for p in plain],
+                    [p for _, marked in ranges for p in marked])
+    return parse_pdf_pages(pdf_file)
+
+
+# Number of pages of a PDF (0 if it cannot be opened)
+def pdf_page_count(pdf_file):
+    try:
+        with fitz.open(pdf_file) as doc:
+            return doc.page_count
+    except Exception:
+        return 0
+
 # Get Side from file path (AFF or NEG) 
 def extract_side(filepath):
     filename = os.path.basename(filepath).lower()
@@ -116,45 +144,9 @@ def extract_side(filepath):
     else:
         return None
 
-# Detect topic based on tournament name
-def determine_topic(filename):
-    filename = filename.lower()
-
-    tournaments_sep_oct = [
-        'loyola-invitational', 'hendrickson-tfatoc', 'niles-township', 'season-opener',
-        'grapevine-classic', 'falls-knight', 'washburn-rural-debate', 'greenhill-fall-classic',
-        'yale-invitational', 'stephen-stewart', 'lindale-tfa', 'mid-america', 'georgetown-day-school',
-        'bvsw', 'marist-ivy', 'jack-howe', 'nova-titan', 'delores-taylor', 'nano-nagle',
-        'william-tennent', 'westminster', 'new-york-city-invitational', 'trevian-invitational',
-        'tim-averill', 'kansas-city-invitational', 'heart-of-texas', 'iowa-caucus'
-    ]
-    tournaments_nov_dec = [
-        'blue-key', 'kckcc', 'quarry-lane', 'of-michigan', 'hockaday-school', 'minneapple',
-        'peach-state', 'badgerland-chung', 'debate-dragon', 'katy-taylor', 'bison-stampede',
-        'ucla', 'cat-swing', 'glenbrooks-speech', 'longhorn-classic', 'princeton-classic',
-        'series-1', 'mamaroneck', 'alta-silver', 'alief', 'la-costa', 'cypress-', 'wphs',
-        'holiday-classic', 'paradigm-', 'isidore-newman', 'chapel-hill'
-    ]
-    tournaments_jan_feb = [
-        'blake-', 'college-prep', 'strake-jesuit', 'billy-tate', 'churchill-', 'hdshc',
-        'samford-', 'peninsula-', 'harvard-westlake', 'cavalier-', 'rebel-speech',
-        'mount-vernon', 'cougar-classic', 'jean-ward', 'camp-cabot', 'columbia-',
-        'pennsbury-falcon', 'unlv', 'martin-luther', 'barkely-forum', 'jasper-howl', 'regatta',
-        'marshall-spalter', 'bellaire', 'three-rivers', 'pennsylvania-liberty', 'newman-smith',
-        'langham', 'stanford', 'harvard-national', 'bingham-bids', 'berkeley-', 'chisholm-',
-        'john-marshall', 'series-2', 'milo-', 'series-3'
-    ]
-
-    for t in tournaments_sep_oct:
-        if t in filename:
-            return 'Sep/Oct 24'
-    for t in tournaments_nov_dec:
-        if t in filename:
-            return 'Nov/Dec 24'
-    for t in tournaments_jan_feb:
-        if t in filename:
-            return 'Jan/Feb 25'
-    return None
+# Detect topic based on tournament name, from the topic tables of the season file
+def determine_topic(filename, season_file=DEFAULT_SEASON_FILE):
+    return load_classifier(season_file).topic(filename)
 
 # Cut cards with tagline, citation, evidence, fil path, side, topic and event
 def cut_card(paragraphs, marked_paragraphs, file_path, side=None, topic=None, event=None):
@@ -192,27 +184,29 @@ def cut_card(paragraphs, marked_paragraphs, file_path, side=None, topic=None, ev
             i += 1
     return cards
 
-# Get all PDF and DOCX Files from directory
-def find_files(root_folders):
+# Get all PDF and DOCX Files of the season's tournaments from directory
+def find_files(root_folders, season_file=DEFAULT_SEASON_FILE):
+    classifier = load_classifier(season_file)
     files_found = []
     for root_folder in root_folders:
-        for dirpath, _, filenames in os.walk(root_folder):
-            for file in filenames:
-                ext = os.path.splitext(file)[1].lower()
-                if ext in ['.docx', '.pdf'] and any(t in file.lower() for t in ALL_TOURNAMENTS):
-                    files_found.append(os.path.join(dirpath, file))
+        files_found.extend(scan_files(root_folder, classifier))
 
     print(f"Found {len(files_found)} files (.docx or .pdf) across all folders.")
     return files_found
 
-# Process files in one pass
-def process_file(file, event=None):
+# Process files in one pass. docx_parser is 'python-docx' or 'fast' (streams document.xml,
+# see fast_docx.py), and docx_styles also counts formatting inherited from styles (fast only).
+# page_workers > 1 parses a long PDF's page ranges in parallel (see parse_pdf)
+def process_file(file, event=None, docx_parser='python-docx', docx_styles=False, season_file=DEFAULT_SEASON_FILE,
+                 page_workers=1):
     try:
         file_type = get_file_extension(file)
-        if file_type == 'docx':
+        if file_type == 'docx' and docx_parser == 'fast':
+            paragraphs, marked_paragraphs = parse_docx_fast(file, resolve_styles=docx_styles)
+        elif file_type == 'docx':
             paragraphs, marked_paragraphs = parse_docx(file)
         elif file_type == 'pdf':
-            paragraphs, marked_paragraphs = parse_pdf(file)
+            paragraphs, marked_paragraphs = parse_pdf(file, page_workers)
         else:
             return []
 
@@ -222,7 +216,7 @@ def process_file(file, event=None):
 
         # Extract side and topic once per file
         side = extract_side(file)
-        topic = determine_topic(file)
+        topic = determine_topic(file, season_file)
 
         # Cut Card
         return cut_card(paragraphs, marked_paragraphs, file, side=side, topic=topic, event=event)
@@ -231,17 +225,22 @@ def process_file(file, event=None):
         print(f"Error processing {file}: {e}")
         return []
 
-# Process files in batches and parallel using ParallelPoolExecutor
-def process_batch_parallel(files, event, max_workers=8):
-    all_cards = []
-    with ProcessPoolExecutor(max_workers=max_workers) as executor:
-        futures = {executor.submit(process_file, file, event): file for file in files}
-        for future in tqdm(as_completed(futures), total=len(futures),
-                           desc="Processing files", unit="file"):
-            result = future.result()
-            if result:
-                all_cards.extend(result)
-    return all_cards
+# Cut the cards of a file and hash its contents for the manifest
+def extract_file(file, event=None, docx_parser='python-docx', docx_styles=False, season_file=DEFAULT_SEASON_FILE,
+                 page_workers=1):
+    return process_file(file, event, docx_parser, docx_styles, season_file, page_workers), hash_file(file)
+
+
+# Extract long PDFs one at a time in this process, each split into page ranges parsed by
+# page_workers processes (pool workers are daemonic and cannot start them). Files that
+# cannot be read are added to failed as (file, reason), like FileScheduler.failed
+def extract_long_pdfs(extract, files, page_workers, failed):
+    for file in tqdm(files, desc="Processing long PDFs", unit="file", disable=not files):
+        try:
+            yield file, extract(file, page_workers=page_workers)
+        except OSError as e:
+            failed.append((file, f"{type(e).__name__}: {e}"))
+            tqdm.write(f"Skipping {file}: {e}")
 
 
 
@@ -250,6 +249,24 @@ if __name__ == "__main__":
     parser.add_argument("--input_dir", required=True, help="Path to the input directory with cards")
     parser.add_argument("--output_dir", required=True, help="Path to the output directory")
     parser.add_argument("--event", required=True, help="Enter event category of all cards (e.g PF, LD, or CX)")
+    parser.add_argument("--docx_parser", choices=["python-docx", "fast"], default="python-docx",
+                        help="DOCX parser: python-docx, or fast (streams word/document.xml, same output)")
+    parser.add_argument("--docx_styles", action="store_true",
+                        help="With --docx_parser fast, also count bold/underline/highlight inherited from styles")
+    parser.add_argument("--max_workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes")
+    parser.add_argument("--chunksize", type=int, default=1, help="Files per worker task")
+    parser.add_argument("--file_timeout", type=float, default=600,
+                        help="Seconds before a file is killed and skipped (0 = no limit)")
+    parser.add_argument("--output_format", choices=OUTPUT_FORMATS, default="jsonl",
+                        help="Card shard format: jsonl, or csv (the old cards_batch_<n>.csv layout)")
+    parser.add_argument("--shard_size", type=int, default=DEFAULT_SHARD_SIZE, help="Cards per output shard")
+    parser.add_argument("--pdf_page_workers", type=int, default=0,
+                        help="Parse PDFs of at least --pdf_min_pages pages in this many processes each, "
+                             "one PDF at a time before the other files (0 = off)")
+    parser.add_argument("--pdf_min_pages", type=int, default=200,
+                        help="Pages a PDF needs to be parsed by page range with --pdf_page_workers")
+    parser.add_argument("--season_file", default=DEFAULT_SEASON_FILE,
+                        help="JSON file with the season's tournaments and topic tables (see seasons/)")
     args = parser.parse_args()
 
     # Set input and output folder
@@ -261,43 +278,64 @@ if __name__ == "__main__":
     event = args.event
 
     # Find all matching files.
-    all_files = find_files([input_folder])
-
-    # Load checkpoint
-    processed_files = set()
-
-    # Filter out files already processed.
-    unprocessed_files = [f for f in all_files if f not in processed_files]
-    print(f"Total files to process: {len(unprocessed_files)}")
-
-    # Split the list of unprocessed files into N batches.
-    num_batches = 100
-    batch_size = max(1, len(unprocessed_files) // num_batches)
-    batches = [unprocessed_files[i:i + batch_size]
-               for i in range(0, len(unprocessed_files), batch_size)]
-    print(f"Created {len(batches)} batches.")
-
-    # Specify the starting batch 
-    start_batch =1
-
-    # Process each batch starting from the specified start_batch.
-    for batch_num, batch_files in enumerate(batches, start=1):
-        if batch_num < start_batch:
-            print(f"Skipping batch {batch_num} as it's already processed.")
-            processed_files.update(batch_files)
-            continue
-
-        print(f"\nProcessing batch {batch_num} with {len(batch_files)} files...")
-        cards = process_batch_parallel(batch_files, event, max_workers=4)
-        if not cards:
-            print(f"No cards found in batch {batch_num}.")
-        else:
-            df_cards = pd.DataFrame(cards)
-            output_csv = os.path.join(output_folder, f"cards_batch_{batch_num}.csv")
-            df_cards.to_csv(output_csv, index=False, encoding="utf-8")
-            print(f"Batch {batch_num}: Saved {len(df_cards)} cards to {output_csv}")
-
-        # Update checkpoint in memory 
-        processed_files.update(batch_files)
-
-    print("All batches processed successfully.")
+    all_files = find_files([input_folder], args.season_file)
+
+    # Load checkpoint: the manifest records every file processed by earlier runs
+    # (size, mtime, content hash and the shard holding its cards)
+    manifest = Manifest(os.path.join(output_folder, MANIFEST_NAME))
+    unprocessed_files, stale_entries = manifest.plan(all_files)
+
+    # Remove the cards of deleted and changed files, and any partial cards of
+    # a file that was being written when an earlier run stopped
+    if stale_entries:
+        remove_file_cards(output_folder, stale_entries)
+        manifest.remove(entry.path for entry in stale_entries)
+
+    print(f"Total files to process: {len(unprocessed_files)} "
+          f"({len(all_files) - len(unprocessed_files)} unchanged files skipped)")
+
+    # Stream cards into the output shards file by file as workers finish them,
+    # recording each file in the manifest, so parent memory stays flat and a
+    # rerun after a crash resumes at the first unfinished file
+    file_stats = {path: (size, mtime_ns) for path, size, mtime_ns in unprocessed_files}
+    writer = ShardWriter(output_folder, args.output_format, args.shard_size)
+    total_cards = 0
+
+    # One long-lived pool handles every file, largest first; files running past
+    # --file_timeout are killed and skipped (see file_scheduler.py)
+    extract = partial(extract_file, event=event, docx_parser=args.docx_parser, docx_styles=args.docx_styles,
+                      season_file=args.season_file)
+    scheduler = FileScheduler(extract, args.max_workers, args.chunksize, args.file_timeout)
+
+    # With --pdf_page_workers, long PDFs are parsed first, outside the pool, with their
+    # page ranges spread over processes (no --file_timeout applies to them)
+    long_pdfs = set()
+    if args.pdf_page_workers > 1:
+        long_pdfs = {path for path in file_stats
+                     if get_file_extension(path) == 'pdf' and pdf_page_count(path) >= args.pdf_min_pages}
+    pool_files = [path for path in file_stats if path not in long_pdfs]
+    long_pdfs = sorted(long_pdfs, key=lambda path: file_stats[path][0], reverse=True)
+    long_failed = []
+    results = chain(extract_long_pdfs(extract, long_pdfs, args.pdf_page_workers, long_failed),
+                    scheduler.run(pool_files, {path: file_stats[path][0] for path in pool_files}))
+    for file, (cards, content_hash) in results:
+        shard = writer.next_shard() if cards else None
+        size, mtime_ns = file_stats[file]
+        manifest.start(file, size, mtime_ns, content_hash, shard)
+        if cards:
+            writer.write(cards)
+            total_cards += len(cards)
+        manifest.finish(file, len(cards))
+
+    writer.close()
+    manifest.close()
+    failed = long_failed + scheduler.failed
+    print(f"Saved {total_cards} cards from {len(file_stats) - len(failed)} files to {output_folder}")
+
+    # Failed files are not recorded in the manifest, so the next run tries them again
+    if failed:
+        print(f"{len(failed)} files were skipped:")
+        for file, reason in failed:
+            print(f"  {file}: {reason}")
+        sys.exit(1)
+    print("All files processed successfully.")
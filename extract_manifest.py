@@ -0,0 +1,115 @@
+import hashlib
+import os
+import sqlite3
+from typing import NamedTuple
+
+# File name of the manifest inside the extract_cards.py output directory
+MANIFEST_NAME = "manifest.sqlite"
+
+# Read size for hashing files
+HASH_CHUNK_BYTES = 1 << 20
+
+
+# Return the SHA-256 of a file's contents
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FileEntry(NamedTuple):
+    path: str
+    size: int
+    mtime_ns: int
+    content_hash: str
+    shard: str          # output shard holding the file's cards (None if it had none)
+    num_cards: int
+    done: bool          # False while the file's cards are being written
+
+
+# --------------- MANIFEST ---------------
+class Manifest:
+    """
+    Persistent record of every input file extract_cards.py has processed:
+    its size, mtime and content hash, and the output shard holding its cards.
+
+    A file is recorded as pending before its cards are appended to a shard
+    and marked done right after, each in its own transaction, so after a
+    crash every file is either done, or pending with possibly partial cards
+    that the next run removes before parsing the file again.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                shard TEXT,
+                num_cards INTEGER NOT NULL DEFAULT 0,
+                done INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self.connection.commit()
+
+    def entries(self):
+        rows = self.connection.execute(
+            "SELECT path, size, mtime_ns, content_hash, shard, num_cards, done FROM files"
+        )
+        return {row[0]: FileEntry(*row[:6], bool(row[6])) for row in rows}
+
+    def plan(self, files):
+        """
+        Compare the files found on disk with the manifest. Return
+        (to_process, stale): the (path, size, mtime_ns) of new or changed
+        files, and the manifest entries whose cards must be removed from
+        their shards (deleted, changed or unfinished files).
+
+        Size and mtime decide whether a file is unchanged; a file whose mtime
+        moved but whose size and content hash did not (e.g. downloaded again)
+        is kept as is.
+        """
+        entries = self.entries()
+        to_process = []
+        stale = []
+        for path in files:
+            stat = os.stat(path)
+            entry = entries.pop(path, None)
+            if entry is not None and entry.done and entry.size == stat.st_size:
+                if entry.mtime_ns == stat.st_mtime_ns:
+                    continue
+                if entry.content_hash == hash_file(path):
+                    self.connection.execute("UPDATE files SET mtime_ns = ? WHERE path = ?", (stat.st_mtime_ns, path))
+                    continue
+            if entry is not None:
+                stale.append(entry)
+            to_process.append((path, stat.st_size, stat.st_mtime_ns))
+
+        # Whatever is left was deleted from the input directory
+        stale.extend(entries.values())
+        self.connection.commit()
+        return to_process, stale
+
+    def start(self, path, size, mtime_ns, content_hash, shard):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, content_hash, shard, num_cards, done) "
+            "VALUES (?, ?, ?, ?, ?, 0, 0)",
+            (path, size, mtime_ns, content_hash, shard),
+        )
+        self.connection.commit()
+
+    def finish(self, path, num_cards):
+        self.connection.execute("UPDATE files SET num_cards = ?, done = 1 WHERE path = ?", (num_cards, path))
+        self.connection.commit()
+
+    def remove(self, paths):
+        self.connection.executemany("DELETE FROM files WHERE path = ?", ((path,) for path in paths))
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
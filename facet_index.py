@@ -0,0 +1,118 @@
+from array import array
+
+from card_store import CATEGORICAL_FIELDS, MISSING_CODE
+
+# Fields that can be filtered on and get facet counts
+FACET_FIELDS = CATEGORICAL_FIELDS
+
+# Bit positions set in each possible byte, used to turn bitmaps into card ids
+BYTE_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+
+# --------------- HELPER FUNCTIONS ---------------
+def ids_to_bitmap(card_ids, num_cards: int) -> int:
+    """
+    Build a bitmap (bit i set = card i) from card ids.
+    """
+    bits = bytearray((num_cards + 7) // 8)
+    for card_id in card_ids:
+        bits[card_id >> 3] |= 1 << (card_id & 7)
+    return int.from_bytes(bits, "little")
+
+
+def bitmap_to_bytes(bitmap: int, num_cards: int) -> bytes:
+    """
+    Return the bitmap as little-endian bytes, for fast per-card bit tests.
+    """
+    return bitmap.to_bytes((num_cards + 7) // 8, "little")
+
+
+def bitmap_to_ids(bitmap: int, num_cards: int, limit: int = None) -> array:
+    """
+    Return the ids of the cards set in a bitmap, in ascending order, stopping
+    once limit ids have been found (if given).
+    """
+    card_ids = array("I")
+    for position, byte in enumerate(bitmap_to_bytes(bitmap, num_cards)):
+        if byte:
+            base = position << 3
+            card_ids.extend(base + bit for bit in BYTE_BITS[byte])
+            if limit is not None and len(card_ids) >= limit:
+                del card_ids[limit:]
+                break
+    return card_ids
+
+
+# --------------- FACET INDEX ---------------
+class FacetIndex:
+    """
+    Bitmap index over the side, topic, event and evidence_set of every card.
+
+    Each (field, lowercased value) maps to a bitmap stored as a Python int,
+    with bit i set if card i has that value. A combination of filters is an
+    AND of bitmaps, and facet counts are popcounts of those ANDs, so neither
+    needs a pass over the cards.
+    """
+
+    def __init__(self, bitmaps: dict, labels: dict, num_cards: int):
+        self.bitmaps = bitmaps      # field -> {lowercased value: bitmap}
+        self.labels = labels        # field -> {lowercased value: value as shown to users}
+        self.num_cards = num_cards
+        self.all_cards = (1 << num_cards) - 1
+
+    @classmethod
+    def from_store(cls, store) -> "FacetIndex":
+        num_bytes = (store.num_cards + 7) // 8
+        bitmaps = {}
+        labels = {}
+        for field in FACET_FIELDS:
+            bitmaps[field] = {}
+            labels[field] = {}
+            column = store.columns.get(field)
+            if column is None:
+                continue
+
+            # One bit array per distinct code, filled in a single pass
+            code_bits = [bytearray(num_bytes) for _ in column.values]
+            for card_id, code in enumerate(column.codes):
+                code_bits[code][card_id >> 3] |= 1 << (card_id & 7)
+
+            # Values that only differ in case share a bitmap, like the filters do.
+            # Empty values are left out since an empty filter is ignored.
+            for code, bits in enumerate(code_bits):
+                lowered = column.lowered[code]
+                if code == MISSING_CODE or not lowered:
+                    continue
+                bitmap = int.from_bytes(bits, "little")
+                bitmaps[field][lowered] = bitmaps[field].get(lowered, 0) | bitmap
+                labels[field].setdefault(lowered, str(column.values[code]))
+
+        return cls(bitmaps, labels, store.num_cards)
+
+    def filter_bitmap(self, filters: dict, exclude: str = None) -> int:
+        """
+        AND together the bitmaps of the given {field: value} filters
+        (case-insensitive). Empty filter values and the excluded field are
+        ignored; an unknown value matches no cards.
+        """
+        bitmap = self.all_cards
+        for field, value in filters.items():
+            if not value or field == exclude:
+                continue
+            bitmap &= self.bitmaps.get(field, {}).get(str(value).lower(), 0)
+        return bitmap
+
+    def counts(self, match_bitmap: int, filters: dict) -> dict:
+        """
+        Return {field: {value: count}} for the cards in match_bitmap. Counts for
+        a field apply every filter except the one on that field, so they show
+        how many results each alternative value of that filter would give.
+        """
+        facets = {}
+        for field in FACET_FIELDS:
+            base = match_bitmap & self.filter_bitmap(filters, exclude=field)
+            facets[field] = {
+                self.labels[field][lowered]: (base & bitmap).bit_count()
+                for lowered, bitmap in self.bitmaps[field].items()
+            }
+        return facets
@@ -0,0 +1,197 @@
+import zipfile
+
+from lxml import etree
+
+# --------------- WORDPROCESSINGML NAMES ---------------
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+W = f"{{{W_NS}}}"
+
+W_BODY = W + "body"
+W_P = W + "p"
+W_PPR = W + "pPr"
+W_PSTYLE = W + "pStyle"
+W_R = W + "r"
+W_RPR = W + "rPr"
+W_RSTYLE = W + "rStyle"
+W_HYPERLINK = W + "hyperlink"
+W_B = W + "b"
+W_U = W + "u"
+W_HIGHLIGHT = W + "highlight"
+W_VAL = W + "val"
+W_TYPE = W + "type"
+W_STYLE = W + "style"
+W_STYLE_ID = W + "styleId"
+W_BASED_ON = W + "basedOn"
+W_DEFAULT = W + "default"
+W_DOC_DEFAULTS = W + "docDefaults"
+W_RPR_DEFAULT = W + "rPrDefault"
+
+# Text of the run content elements python-docx includes in run.text
+# (w:br is handled separately since page and column breaks have no text)
+RUN_TEXT = {W + "tab": "\t", W + "ptab": "\t", W + "cr": "\n", W + "noBreakHyphen": "-"}
+W_T = W + "t"
+W_BR = W + "br"
+
+FALSE_VALUES = ("0", "false", "off")
+
+
+# --------------- RUN PROPERTIES ---------------
+def run_properties(rPr):
+    """
+    Return (bold, underline, highlight) of a w:rPr element, each True, False
+    or None when not set, with the same truthiness as python-docx's
+    run.bold, run.underline and run.font.highlight_color.
+    """
+    if rPr is None:
+        return None, None, None
+    bold = underline = highlight = None
+    b = rPr.find(W_B)
+    if b is not None:
+        bold = b.get(W_VAL) not in FALSE_VALUES
+    u = rPr.find(W_U)
+    if u is not None:
+        # python-docx maps a missing val to None and "none" to False
+        val = u.get(W_VAL)
+        underline = None if val is None else val != "none"
+    h = rPr.find(W_HIGHLIGHT)
+    if h is not None:
+        # "default" is WD_COLOR_INDEX.AUTO, which is falsy; python-docx
+        # raises on "none", which means no highlight
+        highlight = h.get(W_VAL) not in (None, "none", "default")
+    return bold, underline, highlight
+
+
+class StyleResolver:
+    """
+    Bold/underline/highlight inherited through styles.xml: run style, then
+    paragraph style (or the default paragraph style), then document defaults,
+    each following its basedOn chain. Every style ID is resolved once.
+    """
+
+    def __init__(self, styles_xml):
+        root = etree.fromstring(styles_xml)
+        self.styles = {}
+        self.default_paragraph_style = None
+        for style in root.iter(W_STYLE):
+            style_id = style.get(W_STYLE_ID)
+            based_on = style.find(W_BASED_ON)
+            self.styles[style_id] = (
+                run_properties(style.find(W_RPR)),
+                None if based_on is None else based_on.get(W_VAL),
+            )
+            if style.get(W_TYPE) == "paragraph" and style.get(W_DEFAULT) in ("1", "true", "on"):
+                self.default_paragraph_style = style_id
+        defaults = root.find(f"{W_DOC_DEFAULTS}/{W_RPR_DEFAULT}/{W_RPR}")
+        self.defaults = run_properties(defaults)
+        self.resolved = {}
+
+    def resolve(self, style_id):
+        """
+        Return the (bold, underline, highlight) a style and the styles it is
+        based on set, None where none of them does.
+        """
+        if style_id is None:
+            return None, None, None
+        properties = self.resolved.get(style_id)
+        if properties is None:
+            # Mark it while resolving so a basedOn cycle ends here
+            self.resolved[style_id] = (None, None, None)
+            own, based_on = self.styles.get(style_id, ((None, None, None), None))
+            inherited = self.resolve(based_on)
+            properties = self.resolved[style_id] = merge(own, inherited)
+        return properties
+
+    def run_properties(self, run_rPr, paragraph_style):
+        direct = run_properties(run_rPr)
+        run_style = None if run_rPr is None else run_rPr.find(W_RSTYLE)
+        if run_style is not None:
+            direct = merge(direct, self.resolve(run_style.get(W_VAL)))
+        paragraph = self.resolve(paragraph_style or self.default_paragraph_style)
+        return merge(merge(direct, paragraph), self.defaults)
+
+
+def merge(properties, fallback):
+    return tuple(fallback[i] if value is None else value for i, value in enumerate(properties))
+
+
+# --------------- PARSER ---------------
+def run_text(run):
+    parts = []
+    for child in run:
+        tag = child.tag
+        if tag == W_T:
+            parts.append(child.text or "")
+        elif tag == W_BR:
+            if child.get(W_TYPE, "textWrapping") == "textWrapping":
+                parts.append("\n")
+        elif tag in RUN_TEXT:
+            parts.append(RUN_TEXT[tag])
+    return "".join(parts)
+
+
+def parse_docx_fast(docx_file, resolve_styles=False):
+    """
+    Return (plain_paragraphs, marked_paragraphs) like parse_docx in
+    extract_cards.py, but by stream-parsing word/document.xml out of the zip
+    instead of building python-docx's object model.
+
+    By default this gives exactly what the python-docx path gives: only
+    paragraphs directly in the body, hyperlink text in the plain text but
+    not in the marked text, and bold/underline/highlight from the run's own
+    properties. With resolve_styles, properties a run inherits from its
+    character and paragraph styles count too. The one difference: python-
+    docx raises on a highlight of "none" (so extract_cards.py skips the
+    file), while this reads it as no highlight.
+    """
+    plain_paragraphs = []
+    marked_paragraphs = []
+    with zipfile.ZipFile(docx_file) as archive:
+        resolver = None
+        if resolve_styles and "word/styles.xml" in archive.namelist():
+            resolver = StyleResolver(archive.read("word/styles.xml"))
+
+        with archive.open("word/document.xml") as document:
+            for _, paragraph in etree.iterparse(document, events=("end",), tag=W_P):
+                parent = paragraph.getparent()
+                if parent is None or parent.tag != W_BODY:
+                    continue
+
+                paragraph_style = None
+                if resolver is not None:
+                    pPr = paragraph.find(W_PPR)
+                    pStyle = None if pPr is None else pPr.find(W_PSTYLE)
+                    paragraph_style = None if pStyle is None else pStyle.get(W_VAL)
+
+                plain_parts = []
+                marked_text = ""
+                for child in paragraph:
+                    if child.tag == W_R:
+                        text = run_text(child)
+                        plain_parts.append(text)
+                        rPr = child.find(W_RPR)
+                        if resolver is None:
+                            bold, underline, highlight = run_properties(rPr)
+                        else:
+                            bold, underline, highlight = resolver.run_properties(rPr, paragraph_style)
+                        if bold:
+                            text = f"<b>{text}</b>"
+                        if underline:
+                            text = f"<u>{text}</u>"
+                        if highlight:
+                            text = f"<mark>{text}</mark>"
+                        marked_text += text
+                    elif child.tag == W_HYPERLINK:
+                        plain_parts.extend(run_text(run) for run in child.iterchildren(W_R))
+
+                # Free the paragraphs parsed so far
+                paragraph.clear()
+                while paragraph.getprevious() is not None:
+                    del parent[0]
+
+                text = "".join(plain_parts).strip()
+                if not text:
+                    continue
+                plain_paragraphs.append(text)
+                marked_paragraphs.append(marked_text)
+
+    return plain_paragraphs, marked_paragraphs
@@ -0,0 +1,143 @@
+from collections import deque
+import multiprocessing
+from multiprocessing.connection import wait
+import os
+import time
+
+from tqdm import tqdm
+
+
+# --------------- WORKER PROCESS ---------------
+def _worker_loop(conn, func):
+    # Run func on every file of each chunk received, sending back one
+    # (file, result) per file, until told to stop with None
+    while True:
+        chunk = conn.recv()
+        if chunk is None:
+            return
+        for file in chunk:
+            conn.send((file, func(file)))
+
+
+class _Worker:
+    def __init__(self, context, func):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_loop, args=(child_conn, func), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.pending = deque()    # files of the current chunk not finished yet
+        self.started = 0.0        # when the current file started
+
+    def assign(self, chunk):
+        self.pending.extend(chunk)
+        self.started = time.monotonic()
+        self.conn.send(chunk)
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+# --------------- FILE SCHEDULER ---------------
+class FileScheduler:
+    """
+    Runs func(file) over many files in one long-lived pool of worker
+    processes and yields (file, result) as files finish.
+
+    Files are handed out largest first, a chunk at a time, to whichever
+    worker is idle, so one huge document never holds up a batch while the
+    other workers wait, and the small files at the end fill in the gaps. A
+    file that runs longer than timeout seconds (or crashes its worker) is
+    skipped and recorded in failed: its worker is killed and replaced, and
+    the rest of its chunk goes back to the front of the queue.
+    """
+
+    def __init__(self, func, max_workers=None, chunksize=1, timeout=None):
+        self.func = func
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunksize = max(1, chunksize)
+        self.timeout = timeout or None
+        self.failed = []    # (file, reason)
+        self.context = multiprocessing.get_context()
+
+    def run(self, files, sizes=None):
+        """
+        Yield (file, result) for every file as it finishes. sizes ({file:
+        size in bytes}, e.g. from the scan) orders the files without a stat
+        call each, so a file deleted since the scan fails on its own instead
+        of failing the whole run.
+        """
+        files = sorted(files, key=sizes.__getitem__ if sizes is not None else os.path.getsize, reverse=True)
+        queue = deque(files[i:i + self.chunksize] for i in range(0, len(files), self.chunksize))
+        workers = [_Worker(self.context, self.func) for _ in range(min(self.max_workers, len(queue)))]
+        busy = {}    # conn -> worker
+        try:
+            with tqdm(total=len(files), desc="Processing files", unit="file") as progress:
+                for worker in workers:
+                    worker.assign(queue.popleft())
+                    busy[worker.conn] = worker
+
+                while busy:
+                    for conn in wait(list(busy), timeout=self._wait_time(busy.values())):
+                        worker = busy[conn]
+                        try:
+                            file, result = conn.recv()
+                        except EOFError:
+                            # The worker died (e.g. a crash inside a parser library)
+                            self._replace(worker, busy, queue, "worker crashed")
+                            progress.update(1)
+                            continue
+                        worker.pending.popleft()
+                        worker.started = time.monotonic()
+                        progress.update(1)
+                        yield file, result
+                        if not worker.pending:
+                            if queue:
+                                worker.assign(queue.popleft())
+                            else:
+                                del busy[conn]
+                                worker.stop()
+
+                    if self.timeout is not None:
+                        now = time.monotonic()
+                        for worker in [w for w in busy.values() if now - w.started > self.timeout]:
+                            self._replace(worker, busy, queue, f"timed out after {self.timeout:g}s")
+                            progress.update(1)
+        finally:
+            for worker in busy.values():
+                worker.kill()
+
+    def _wait_time(self, workers):
+        if self.timeout is None:
+            return None
+        oldest = min(worker.started for worker in workers)
+        return max(0.0, oldest + self.timeout - time.monotonic())
+
+    def _replace(self, worker, busy, queue, reason):
+        """
+        Kill a worker stuck on (or crashed by) its current file, record that
+        file as failed and start a new worker on the rest of its chunk (or
+        the next chunk in the queue).
+        """
+        file = worker.pending.popleft()
+        self.failed.append((file, reason))
+        tqdm.write(f"Skipping {file}: {reason}")
+
+        del busy[worker.conn]
+        worker.kill()
+        if worker.pending:
+            queue.appendleft(list(worker.pending))
+        if queue:
+            replacement = _Worker(self.context, self.func)
+            replacement.assign(queue.popleft())
+            busy[replacement.conn] = replacement
@@ -1,13 +1,30 @@
 import pandas as pd
 import ast
+import hashlib
+import html
+import os
+import pickle
+import re
+import tempfile
 import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
-from bs4 import BeautifulSoup
 
-tqdm.pandas()
+# Word count limits (inclusive) a card must be within to be kept
+TAGLINE_WORDS = (5, 29)
+CITATION_WORDS = (19, 84)
+EVIDENCE_WORDS = (200, 2701)
+MARKED_WORDS = (15, 150)
 
-# Converts string array of evidence into one string
+# Text of each <mark>...</mark> in the evidence, and the tags left inside it
+MARK_PATTERN = re.compile(r"<mark\b[^>]*>(.*?)</mark\s*>", re.S | re.I)
+TAG_PATTERN = re.compile(r"</?[A-Za-z][^>]*>")
+
+# Converts string array of evidence (or a list, from JSONL shards) into one string
 def flatten_evidence(evidence):
+    if isinstance(evidence, list):
+        return " ".join(evidence)
     if isinstance(evidence, str):
         try:
             parsed = ast.literal_eval(evidence)
@@ -17,103 +34,182 @@ def flatten_evidence(evidence):
             pass
     return evidence
 
-def extract_marked_text(df):
-    for index, row in df.iterrows():
-        soup = BeautifulSoup(row['evidence'], 'html.parser')
-        # Find all <mark> tags and extract their text
-        mark_tags = soup.find_all('mark')
-        extracted_text = ' '.join([tag.get_text() for tag in mark_tags])
-        df.loc[index, 'marked_evidence'] = extracted_text
-    return df
-
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Process CSV files with evidence and filtering operations.")
-    parser.add_argument("--input_csv", required=True, help="Path to the input CSV file")
-    parser.add_argument("--output_csv", required=True, help="Path to the output CSV file")
-    args = parser.parse_args()
-
-    input_csv = args.input_csv
-    output_csv = args.output_csv
-
-    # 1) Read CSV
-    df = pd.read_csv(input_csv)
-
-    # 2) Flatten 'evidence' column
-    if "evidence" in df.columns:
-        df["evidence"] = df["evidence"].progress_apply(flatten_evidence)
-
-    # 3) Create marked_evidence column
-    df = extract_marked_text(df)
-
-    # 4) Calculate word counts for each main field
-
-    # Tagline
-    if "tagline" in df.columns:
-        df["tagline_count"] = df["tagline"].astype(str).progress_apply(lambda x: len(x.split()))
-    else:
-        print("'tagline' column does not exist in Dataframe")
-    
-    # Citation
-    if "citation" in df.columns:
-        df["citation_count"] = df["citation"].astype(str).progress_apply(lambda x: len(x.split()))
-    else:
-        print("'citation' column does not exist in Dataframe")
-
-    # Evidence
-    if "evidence" in df.columns:
-        df["evidence_count"] = df["evidence"].astype(str).progress_apply(lambda x: len(x.split()))
-    else:
-        print("'evidence' column does not exist in Dataframe")
-    
-    # Marked Evidence
-    if "marked_evidence" in df.columns:
-        df["marked_evidence_count"] = df["marked_evidence"].astype(str).progress_apply(lambda x: len(x.split()))
+# Input files: a single CSV/JSONL file, or every file with that extension in a directory of shards
+def input_files(path, extension):
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith(extension))
+    return [path]
+
+# Read cards from a JSONL shard or a directory of shards written by extract_cards.py
+def read_jsonl_cards(path):
+    return pd.concat([pd.read_json(f, lines=True, dtype=False) for f in input_files(path, '.jsonl')], ignore_index=True)
+
+def read_csv_cards(path):
+    return pd.concat([pd.read_csv(f) for f in input_files(path, '.csv')], ignore_index=True)
+
+# Yield the input in DataFrames of at most chunksize rows (all of it at once without chunksize)
+def read_chunks(input_csv=None, input_jsonl=None, chunksize=None):
+    if chunksize is None:
+        yield read_jsonl_cards(input_jsonl) if input_jsonl else read_csv_cards(input_csv)
+    elif input_jsonl:
+        for f in input_files(input_jsonl, '.jsonl'):
+            yield from pd.read_json(f, lines=True, dtype=False, chunksize=chunksize)
     else:
-        print("'marked_evidence' column does not exist in Dataframe")
-
-    # 5) Filtering 
-
-    # Drop rows where tagline contains http
-    if "tagline" in df.columns:
-        df = df[~df["tagline"].str.contains("http", na=False)]
-
-    # Drop rows where evidence contains http
-    if "evidence" in df.columns:
-        df = df[~df["evidence"].str.contains("http", na=False)]
-
-    # Keep taglines with tagline count between 5 and 29 
-    df = df[df["tagline_count"].between(5, 29)]
-
-    # Keep citations with citation count between 19 and 84 
-    df = df[df["citation_count"].between(19, 84)]
-
-    # Keep evidence with evidence count between 200 and 2701 
-    df = df[df["evidence_count"].between(200, 2701)]
-
-    # Keep marked_evidence with marked evidence count between 15 and 150
-    df = df[df["marked_evidence_count"].between(15, 150)]
-
+        for f in input_files(input_csv, '.csv'):
+            yield from pd.read_csv(f, chunksize=chunksize)
+
+# Join the text of all <mark> tags in the evidence, like BeautifulSoup's get_text() would
+def extract_marked_text(evidence):
+    if not isinstance(evidence, str):
+        return ""
+    return " ".join(html.unescape(TAG_PATTERN.sub("", text)) for text in MARK_PATTERN.findall(evidence))
+
+# Number of whitespace separated words in each value (len(str(x).split()))
+def word_count(series):
+    return series.astype(str).str.count(r"\S+")
+
+# --------------- ROW FILTERS ---------------
+def filter_rows(df):
+    """
+    Steps 2-5: flatten evidence, extract marked_evidence and keep the rows
+    within the word count limits and without links. Every step only looks at
+    its own row, so this can run on any chunk of the input. The cheap checks
+    go first, so evidence is only parsed for cards that can still be kept.
+    """
+    # Taglines and citations
+    keep = word_count(df["tagline"]).between(*TAGLINE_WORDS)
+    keep &= ~df["tagline"].str.contains("http", na=False)
+    keep &= word_count(df["citation"]).between(*CITATION_WORDS)
+    df = df[keep]
+
+    # Evidence: a link inside the list literal is a link in the joined text,
+    # so links are dropped before paying for literal_eval
+    df = df[~df["evidence"].str.contains("http", na=False)]
+    df = df.assign(evidence=df["evidence"].map(flatten_evidence))
+    keep = ~df["evidence"].str.contains("http", na=False)
+    keep &= word_count(df["evidence"]).between(*EVIDENCE_WORDS)
+    df = df[keep]
+
+    # Marked evidence
+    df = df.assign(marked_evidence=df["evidence"].map(extract_marked_text))
+    return df[word_count(df["marked_evidence"]).between(*MARKED_WORDS)]
+
+def drop_unused_columns(df):
+    return df.drop(columns=[col for col in ['Unnamed: 0'] if col in df.columns])
+
+# Steps 6-9 on all rows that passed filter_rows
+def finalize(df):
     # 6) Reset index
-    df.reset_index(drop=True, inplace=True)
+    df = df.reset_index(drop=True)
 
     # 7) Count duplicates by tagline and drop duplicates
-    if "tagline" in df.columns:
-        tagline_counts = df["tagline"].value_counts()
-        df["duplicate_count"] = df["tagline"].map(tagline_counts)
-        df = df.drop_duplicates(subset=["tagline"], keep="last")
+    tagline_counts = df["tagline"].value_counts()
+    df["duplicate_count"] = df["tagline"].map(tagline_counts)
+    df = df.drop_duplicates(subset=["tagline"], keep="last")
 
     # 8) Drop unnecessary columns
-    drop_cols = ['Unnamed: 0', 'tagline_count', 'citation_count', 'evidence_count', 'marked_evidence_count']
-    df.drop([col for col in drop_cols if col in df.columns], axis=1, inplace=True)
+    df = drop_unused_columns(df)
     print(df.columns.tolist())
 
     # 9) Drop all rows with null values and reset index
-    df.dropna(inplace=True)
-    df.reset_index(drop=True, inplace=True)
+    return df.dropna().reset_index(drop=True)
+
+# --------------- CHUNKED MODE ---------------
+def map_chunks(func, chunks, workers):
+    """
+    Yield func(chunk) for every chunk, in order. With more than one worker
+    the chunks run in a process pool, with at most two per worker read ahead
+    so memory stays bounded however large the input is.
+    """
+    if workers <= 1:
+        yield from map(func, chunks)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(func, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+# Filter chunks of raw cards (see read_chunks) into the final DataFrame
+def filter_cards(chunks, workers=1):
+    filtered = list(tqdm(map_chunks(filter_rows, chunks, workers), desc="Filtering", unit="chunk"))
+    return finalize(pd.concat(filtered))
+
+# --------------- OUT-OF-CORE MODE ---------------
+def tagline_key(tagline):
+    return hashlib.blake2b(tagline.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+def filter_cards_to_csv(chunks, output_csv, workers=1):
+    """
+    Same output as filter_cards(...).to_csv(output_csv, index=False), but
+    streamed: only one chunk and a 16-byte digest per kept tagline are in
+    memory at a time. Returns the number of cards written.
+
+    Pass 1 filters each chunk, spills the cards that pass to a temporary
+    file next to the output and counts every tagline along with the position
+    of its last card. Pass 2 reads the spill back and writes each tagline's
+    last card with its duplicate_count, dropping nulls afterwards like
+    finalize does.
+    """
+    counts = {}    # tagline digest -> [number of cards, position of the last one]
+    with tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(output_csv))) as spill:
+        position = 0
+        for df in tqdm(map_chunks(filter_rows, chunks, workers), desc="Filtering", unit="chunk"):
+            for tagline in df["tagline"]:
+                entry = counts.setdefault(tagline_key(tagline), [0, 0])
+                entry[0] += 1
+                entry[1] = position
+                position += 1
+            pickle.dump(df, spill, protocol=pickle.HIGHEST_PROTOCOL)
+
+        # The output is opened up front and every chunk (even one with no
+        # cards left) goes through it, so an empty result still gets its header
+        spill.seek(0)
+        position = written = 0
+        header = True
+        with open(output_csv, 'w', encoding='utf-8', newline='') as output:
+            while True:
+                try:
+                    df = pickle.load(spill)
+                except EOFError:
+                    break
+                entries = [counts[tagline_key(tagline)] for tagline in df["tagline"]]
+                last = [entry[1] == position + i for i, entry in enumerate(entries)]
+                position += len(df)
+                # .loc, since df[[]] would select no columns rather than no rows
+                df = df.assign(duplicate_count=[entry[0] for entry in entries]).loc[last]
+                df = drop_unused_columns(df).dropna()
+                if header:
+                    print(df.columns.tolist())
+                df.to_csv(output, header=header, index=False)
+                header = False
+                written += len(df)
+    return written
 
-    # Output summary
-    print(f'Final rows after filtering: {len(df)}')
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process CSV files with evidence and filtering operations.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input_csv", help="Path to the input CSV file or a directory of CSV shards")
+    source.add_argument("--input_jsonl", help="Path to a JSONL card shard or a directory of shards")
+    parser.add_argument("--output_csv", required=True, help="Path to the output CSV file")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Stream the input this many rows at a time instead of loading it all into memory")
+    parser.add_argument("--workers", type=int, default=1, help="Processes filtering chunks in parallel (with --chunksize)")
+    args = parser.parse_args()
+
+    # 1) Read CSV (or JSONL shards), 2-5) flatten, extract marks and filter each chunk,
+    # 6-9) count and drop duplicates, drop unused columns and nulls, 10) write filtered CSV
+    chunks = read_chunks(args.input_csv, args.input_jsonl, args.chunksize)
+    if args.chunksize is None:
+        df = filter_cards(chunks, args.workers)
+        df.to_csv(args.output_csv, index=False)
+        num_rows = len(df)
+    else:
+        num_rows = filter_cards_to_csv(chunks, args.output_csv, args.workers)
 
-    # 10) Write filtered CSV
-    df.to_csv(output_csv, index=False)
-    print(f'Filtered CSV saved to: {output_csv}')
+    # Output summary
+    print(f'Final rows after filtering: {num_rows}')
+    print(f'Filtered CSV saved to: {args.output_csv}')
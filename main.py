@@ -1,9 +1,24 @@
-from fastapi import FastAPI, Query, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Query, HTTPException, Request, Header, Body
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import Literal, Optional
+import asyncio
+import hmac
 import json
 import os
+import time
+
+from card_views import (COMPRESS_MIN_BYTES, IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, body_etag,
+                        brotli_body, compact_cards, etag_matches)
+from corpus_reload import CorpusManager, ReloadBusy
+from query_cache import make_cache_key
+from search_executor import run_unless_disconnected
+from search_metrics import SearchMetrics, SearchStats
+from settings import (ADMIN_TOKEN, CORPUS_FILE, DATA_FILE, MATCH_MODE, RANKING, RELOAD_POLL_SECONDS,
+                      SCORER, SEARCH_WORKERS, SLOW_QUERY_LOG, SLOW_QUERY_SECONDS, STATIC_DIR)
 
 # --------------- STOP WORDS ---------------
 STOP_WORDS = {
@@ -17,19 +32,51 @@ STOP_WORDS = {
 }
 
 # --------------- FASTAPI APP ---------------
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Swap in a new corpus when DATA_FILE changes or another worker reloaded
+    watcher = asyncio.create_task(CORPUS.watch(RELOAD_POLL_SECONDS)) if RELOAD_POLL_SECONDS > 0 else None
+    yield
+    if watcher is not None:
+        watcher.cancel()
+    CORPUS.close()
+
+app = FastAPI(lifespan=lifespan)
+
+# Compress responses with gzip (brotli-compressed ones, see json_response,
+# pass through untouched)
+app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_BYTES, compresslevel=6)
 
 # Mount static files (for serving index.html, CSS, JS, etc.)
-app.mount("/static", StaticFiles(directory=r"C:\Users\senth\DebateVault\static"), name="static")
+app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+
+# --------------- LOAD CARDS ---------------
+# DATA_FILE and CORPUS_FILE are set in settings.py. With a corpus file, the
+# prebuilt card store, search index and facet index are memory-mapped (in
+# milliseconds, and uvicorn workers share the file's pages); otherwise they
+# are built from DATA_FILE in memory.
+#
+# Everything a request uses (card store, Python or NumPy engine with
+# substring or prefix matching, suggest index, search executor and query
+# cache) belongs to one snapshot of the corpus, which /admin/reload,
+# /admin/append and the DATA_FILE watch replace without a restart. Searches
+# run in worker processes that memory-map the corpus file (or on the
+# threadpool without one), so they never block the event loop, and the
+# query cache keeps the ranked card ids of recent queries, so infinite
+# scroll pages are slices.
+#
+# METRICS collects the latency of every /data stage and the counters shown
+# on /metrics, across snapshots.
+METRICS = SearchMetrics(SLOW_QUERY_SECONDS, SLOW_QUERY_LOG)
+CORPUS = CorpusManager(DATA_FILE, CORPUS_FILE, SCORER, MATCH_MODE, RANKING, SEARCH_WORKERS, METRICS)
+CORPUS.load()
 
-# --------------- LOAD CARDS (IN-MEMORY) ---------------
-# Adjust "cards_index.json" to the path where you store all 6000 cards.
-DATA_FILE = r"C:\Users\senth\DebateVault\valid_Jan-Feb_LD_cards.json"
-if not os.path.exists(DATA_FILE):
-    raise RuntimeError(f"Data file not found: {DATA_FILE}")
+# Rank this many pages ahead of the requested one, so the next few infinite
+# scroll pages are served from the cache
+RANK_PREFETCH_PAGES = 4
 
-with open(DATA_FILE, "r", encoding="utf-8") as f:
-    ALL_CARDS = json.load(f)  # ALL_CARDS is now a list of dicts (each dict = one card)
+# Most cards one /cards request can fetch
+MAX_BATCH_CARDS = 100
 
 
 # --------------- HELPER FUNCTIONS ---------------
@@ -42,6 +89,70 @@ def remove_stop_words(query: str) -> str:
     filtered_words = [word for word in words if word.lower() not in STOP_WORDS]
     return " ".join(filtered_words)
 
+def dump_json(content) -> bytes:
+    # The same encoding as JSONResponse
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def json_response(body: bytes, accept_encoding: Optional[str], headers: Optional[dict] = None) -> Response:
+    """
+    A JSON response of a serialized body, brotli-compressed if the client
+    accepts it and brotli is installed (otherwise GZipMiddleware compresses
+    it later).
+    """
+    compressed = brotli_body(body, accept_encoding)
+    if compressed is not None:
+        body = compressed
+        headers = {**(headers or {}), "Content-Encoding": "br", "Vary": "Accept-Encoding"}
+    return Response(body, media_type="application/json", headers=headers)
+
+def render_page(snapshot, card_ids, total: int, page: int, size: int, facets: dict, stats: SearchStats,
+                view: str = "full", search_tokens: Optional[list[str]] = None,
+                accept_encoding: Optional[str] = None) -> Response:
+    """
+    Build the card dicts of one page and serialize the /data response (off
+    the event loop, since evidence makes it the largest part of a request).
+    The compact view leaves the evidence out, and for a search has the
+    snippet and match offsets from the index's term positions (see
+    card_views.py).
+    """
+    stats.start()
+    if view == "compact":
+        matches = None
+        if search_tokens:
+            matches = snapshot.index.match_positions(search_tokens, card_ids, snapshot.match_mode == "prefix")
+            stats.lap("matches")
+        paginated_cards = compact_cards(snapshot.store, card_ids, matches)
+    else:
+        paginated_cards = snapshot.store.cards(card_ids)
+    stats.lap("cards")
+    response = json_response(dump_json({
+        "cards": paginated_cards,
+        "total": total,
+        "page": page,
+        "size": size,
+        "facets": facets,
+        "version": snapshot.version
+    }), accept_encoding)
+    stats.lap("serialize")
+    return response
+
+def render_cards(store, card_ids: list[int], version: str, requested_version: Optional[str],
+                 if_none_match: Optional[str], accept_encoding: Optional[str], single: bool) -> Response:
+    """
+    Serialize full cards for /card and /cards with an ETag of the body, and
+    cache them for good if the request named the current corpus version.
+    """
+    cards = store.cards(card_ids)
+    body = dump_json(cards[0] if single else {"cards": cards, "version": version})
+    etag = body_etag(body)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if requested_version == version else REVALIDATE_CACHE_CONTROL,
+    }
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return json_response(body, accept_encoding, headers)
+
 def compute_score(card: dict, search_tokens: list[str]) -> float:
     """
     Very simple scoring approach:
@@ -74,7 +185,7 @@ def root():
     """
     Serve index.html from the static directory.
     """
-    index_path = os.path.join("static", "index.html")
+    index_path = os.path.join(STATIC_DIR, "index.html")
     if os.path.exists(index_path):
         with open(index_path, "r", encoding="utf-8") as file:
             return HTMLResponse(content=file.read())
@@ -83,74 +194,224 @@ def root():
 
 
 @app.get("/data")
-def get_data(
+async def get_data(
+    request: Request,
     side: Optional[str] = None,
     topic: Optional[str] = None,
     event: Optional[str] = None,
     evidence_set: Optional[str] = None,
     search: Optional[str] = None,
     size: int = 50,
-    page: int = 1
+    page: int = 1,
+    view: Literal["full", "compact"] = "full"
 ):
     """
-    In-memory search across ALL_CARDS.
-    - Optional filters for side, topic, event, evidence_set
-    - 'search' query with naive substring matching + scoring
-    - Paginated with ?size=&page=
+    In-memory search across the card store.
+    - Optional filters for side, topic, event, evidence_set (bitmap facet index)
+    - 'search' query scored through the inverted index (substring matching + scoring)
+    - Paginated with ?size=&page= (rankings are cached across pages)
+    - Returns facet counts per side/topic/event/evidence_set value
+    - Searches run in search worker processes, off the event loop
+    - ?view=compact returns card ids, taglines, citations and evidence
+      snippets instead of whole cards (evidence from /card or /cards)
     """
+    start = time.perf_counter()
+    stats = SearchStats()
+    search_stats = None
+    cache_hit = False
     try:
-        # 1) Filter by side, topic, event, evidence_set if provided
-        filtered_cards = []
-        for card in ALL_CARDS:
-            if side and card.get("side", "").lower() != side.lower():
-                continue
-            if topic and card.get("topic", "").lower() != topic.lower():
-                continue
-            if event and card.get("event", "").lower() != event.lower():
-                continue
-            if evidence_set and str(card.get("evidence_set", "")).lower() != evidence_set.lower():
-                continue
-            # If all checks passed, this card is included
-            filtered_cards.append(card)
-
-        # 2) If there's a search query, do scoring
-        if search and search.strip():
-            # Remove stop words
-            cleaned_search = remove_stop_words(search.strip().lower())
-            search_tokens = cleaned_search.split()
-            
-            # Score each card
-            scored_results = []
-            for card in filtered_cards:
-                score = compute_score(card, search_tokens)
-                scored_results.append((score, card))
-
-            # We mimic the 'min_score=5.0' from your ES code
-            # Keep only cards with score >= 5.0 (adjust if you prefer)
-            final_results = [(s, c) for (s, c) in scored_results if s >= 5.0]
-
-            # Sort by descending score
-            final_results.sort(key=lambda x: x[0], reverse=True)
-
-            # Unpack cards after sorting
-            filtered_cards = [c for (s, c) in final_results]
-        else:
-            # If no search query, keep them in the original order
-            pass
-
-        # 3) Pagination
-        from_index = (page - 1) * size
-        to_index = from_index + size
-        total = len(filtered_cards)
-        paginated_cards = filtered_cards[from_index:to_index]
-
-        # 4) Return results
-        return {
-            "cards": paginated_cards,
-            "total": total,
-            "page": page,
-            "size": size
-        }
+        with CORPUS.snapshot() as snapshot:
+            # 1) Remove stop words from the search query, if there is one
+            search_tokens = None
+            if search and search.strip():
+                cleaned_search = remove_stop_words(search.strip().lower())
+                search_tokens = cleaned_search.split()
+            stats.lap("stop_words")
+
+            # 2) Reuse the ranking of an earlier page if it reaches this page,
+            #    otherwise rank the top cards up to a few pages past this one
+            from_index = (page - 1) * size
+            to_index = from_index + size
+            filters = {"side": side, "topic": topic, "event": event, "evidence_set": evidence_set}
+            cache_key = make_cache_key(side, topic, event, evidence_set, search_tokens)
+            result = snapshot.cache.get(cache_key)
+            cache_hit = result is not None and len(result.ranked_ids) >= min(to_index, result.total)
+            METRICS.inc("debatevault_query_cache_hits" if cache_hit else "debatevault_query_cache_misses")
+            stats.lap("cache")
+            if not cache_hit:
+                # Identical in-flight queries share one search; if the client
+                # aborts (e.g. a newer keystroke superseded this query) the
+                # search is cancelled and nothing is returned
+                k = max(to_index, size, 1) * RANK_PREFETCH_PAGES
+                ranked = await run_unless_disconnected(
+                    request, snapshot.executor.rank((cache_key, k), filters, search_tokens, k)
+                )
+                # The time spent waiting for the search (queueing included);
+                # the engine's own stages are recorded by the executor
+                stats.lap("rank")
+                if ranked is None:
+                    METRICS.inc("debatevault_search_disconnected")
+                    return Response(status_code=499)  # client closed request
+                *ranked, search_stats = ranked
+                result = snapshot.cache.put(cache_key, *ranked)
+
+            # 3) Pagination (card dicts are only built for this page) and
+            # 4) the response
+            response = await run_in_threadpool(
+                render_page, snapshot, result.ranked_ids[from_index:to_index],
+                result.total, page, size, result.facets, stats,
+                view, search_tokens, request.headers.get("accept-encoding")
+            )
+
+        METRICS.observe_request(
+            "data", time.perf_counter() - start, stats,
+            {"side": side, "topic": topic, "event": event, "evidence_set": evidence_set,
+             "search": search, "size": size, "page": page, "view": view},
+            search_stats, cache_hit=cache_hit, total=result.total,
+        )
+        return response
 
     except Exception as e:
+        METRICS.inc("debatevault_search_errors")
         raise HTTPException(status_code=500, detail=f"Error retrieving cards: {e}")
+
+
+@app.get("/card/{card_id}")
+async def get_card(request: Request, card_id: int, v: Optional[str] = None):
+    """
+    One whole card (with its evidence) by the id /data returned. Pass the
+    corpus version from /data as ?v= to let the browser cache it for good.
+    """
+    start = time.perf_counter()
+    with CORPUS.snapshot() as snapshot:
+        if not 0 <= card_id < snapshot.num_cards:
+            raise HTTPException(status_code=404, detail="Card not found")
+        response = await run_in_threadpool(
+            render_cards, snapshot.store, [card_id], snapshot.version, v,
+            request.headers.get("if-none-match"), request.headers.get("accept-encoding"), True
+        )
+    METRICS.observe_request("card", time.perf_counter() - start)
+    return response
+
+
+@app.get("/cards")
+async def get_cards(request: Request, ids: str, v: Optional[str] = None):
+    """
+    Whole cards for a comma-separated list of up to MAX_BATCH_CARDS ids, in
+    the order given, e.g. the evidence of the cards scrolled into view.
+    """
+    start = time.perf_counter()
+    try:
+        card_ids = [int(card_id) for card_id in ids.split(",") if card_id.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated card ids")
+    if len(card_ids) > MAX_BATCH_CARDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_CARDS} cards per request")
+    with CORPUS.snapshot() as snapshot:
+        if any(not 0 <= card_id < snapshot.num_cards for card_id in card_ids):
+            raise HTTPException(status_code=404, detail="Card not found")
+        response = await run_in_threadpool(
+            render_cards, snapshot.store, card_ids, snapshot.version, v,
+            request.headers.get("if-none-match"), request.headers.get("accept-encoding"), False
+        )
+    METRICS.observe_request("cards", time.perf_counter() - start)
+    return response
+
+
+@app.get("/suggest")
+def suggest(q: str = "", limit: int = Query(10, ge=1, le=50)):
+    """
+    Autocomplete for the search box: tagline words and two-word phrases that
+    complete what was typed so far, ranked by how many cards (counting
+    duplicates) have them in their tagline.
+    """
+    start = time.perf_counter()
+    with CORPUS.snapshot() as snapshot:
+        suggestions = snapshot.suggest.suggest(q, limit)
+    METRICS.observe_request("suggest", time.perf_counter() - start)
+    return {"query": q, "suggestions": suggestions}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Prometheus metrics of this worker process: latency histograms (and
+    recent p50/p95/p99) per /data stage, cards scanned/scored per search,
+    query cache hit ratio and search executor counts.
+    """
+    with CORPUS.snapshot() as snapshot:
+        cache = snapshot.cache.stats()
+        gauges = {
+            "debatevault_query_cache_entries": ("Rankings in the query cache", cache["entries"]),
+            "debatevault_query_cache_bytes": ("Bytes used by the query cache", cache["bytes"]),
+            "debatevault_corpus_cards": ("Cards in the corpus being served", snapshot.num_cards),
+            "debatevault_corpus_segments": ("Segments (base and deltas) of the corpus", len(snapshot.segments)),
+            "debatevault_corpus_generation": ("Times the corpus was loaded or reloaded", snapshot.generation),
+        }
+    return PlainTextResponse(METRICS.render(gauges), media_type="text/plain; version=0.0.4")
+
+
+# --------------- ADMIN ROUTES ---------------
+# Reloads started by /admin/reload. The event loop only keeps a weak
+# reference to a task, so they are held here until they finish.
+RELOAD_TASKS = set()
+
+
+def check_admin(token: Optional[str]) -> None:
+    # Admin routes do not exist unless ADMIN_TOKEN is set
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not token or not hmac.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@app.get("/admin/status")
+def admin_status(x_admin_token: Optional[str] = Header(None)):
+    """
+    Generation, card count per segment and reload state of the corpus this
+    worker serves.
+    """
+    check_admin(x_admin_token)
+    return CORPUS.status()
+
+
+@app.post("/admin/reload", status_code=202)
+async def admin_reload(rebuild: Optional[bool] = None, x_admin_token: Optional[str] = Header(None)):
+    """
+    Rebuild the corpus from DATA_FILE (by default only if DATA_FILE is newer,
+    ?rebuild=true to force it) and swap it in, in the background. Requests
+    keep being served from the current corpus meanwhile; poll /admin/status
+    for the new generation. Other workers pick the new corpus up on their
+    next RELOAD_POLL_SECONDS check.
+    """
+    check_admin(x_admin_token)
+    if CORPUS.reloading:
+        raise HTTPException(status_code=409, detail="A reload is already running")
+
+    async def reload():
+        try:
+            await run_in_threadpool(CORPUS.reload, rebuild)
+        except Exception as e:
+            print(f"Corpus reload failed: {type(e).__name__}: {e}")
+
+    task = asyncio.create_task(reload())
+    RELOAD_TASKS.add(task)
+    task.add_done_callback(RELOAD_TASKS.discard)
+    return {"status": "reloading", "generation": CORPUS.generation}
+
+
+@app.post("/admin/append")
+async def admin_append(cards: list[dict] = Body(...), x_admin_token: Optional[str] = Header(None)):
+    """
+    Add cards (a JSON list of card dicts) to the corpus as a delta segment,
+    without rebuilding it. The next full rebuild from DATA_FILE replaces the
+    deltas, so the cards should be added to DATA_FILE as well.
+    """
+    check_admin(x_admin_token)
+    if not cards:
+        raise HTTPException(status_code=400, detail="No cards given")
+    try:
+        await run_in_threadpool(CORPUS.append, cards)
+    except ReloadBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return CORPUS.status()
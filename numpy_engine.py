@@ -0,0 +1,181 @@
+from collections import Counter
+from typing import Optional
+
+import numpy as np
+
+from facet_index import FACET_FIELDS
+from search_engine import MIN_SCORE, SearchEngine
+from search_index import BM25F_K1, BM25F_WEIGHTS, FIELD_WEIGHTS, SEARCH_FIELDS, inverse_document_frequency
+from search_metrics import SearchStats
+
+
+# --------------- HELPER FUNCTIONS ---------------
+def posting_positions(post_offsets: np.ndarray, term_ids: np.ndarray) -> np.ndarray:
+    """
+    Return the positions of the postings (CSR rows) of the given terms,
+    concatenated, in one vectorized step without a Python loop over the terms.
+    """
+    starts = post_offsets[term_ids].astype(np.int64)
+    lengths = post_offsets[term_ids + 1].astype(np.int64) - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    # Output position p of row j maps to starts[j] + (p - row start in output)
+    shifts = starts - (np.cumsum(lengths) - lengths)
+    return np.repeat(shifts, lengths) + np.arange(total)
+
+
+# --------------- NUMPY SEARCH ENGINE ---------------
+class NumpySearchEngine(SearchEngine):
+    """
+    SearchEngine that scores with NumPy instead of per-card Python loops.
+
+    Each field's posting lists already form a CSR matrix (terms x cards:
+    post_offsets is the row pointer, post_ids the column indices), viewed
+    here as NumPy arrays without copying, also when they live in the memory-
+    mapped corpus file. A query gathers the rows of the terms each token
+    matches and sums their term counts per card with np.bincount; the cards
+    with a nonzero sum get the field weight (the sparse product of the
+    weighted query with the matrix, with presence semantics) and the sums
+    feed BM25F relevance. Filters are boolean masks over the interned
+    side/topic/event/evidence_set codes.
+    """
+
+    def __init__(self, store, index, facets, match_mode: str = "substring", ranking: str = "bm25f"):
+        super().__init__(store, index, facets, match_mode, ranking)
+        self.num_cards = len(store)
+
+        self.postings = {}
+        self.term_freqs = {}
+        self.norms = {}
+        for field in SEARCH_FIELDS:
+            field_index = index.fields[field]
+            self.postings[field] = (
+                np.frombuffer(field_index.post_ids, dtype=np.uint32),
+                np.frombuffer(field_index.post_offsets, dtype=np.uint64),
+            )
+            self.term_freqs[field] = np.frombuffer(field_index.term_freqs, dtype=np.uint8)
+            self.norms[field] = np.frombuffer(field_index.norms, dtype=np.float32)
+        self.boosts = np.frombuffer(index.boosts, dtype=np.float32)
+
+        # Per facet field: the facet value group (position in facets.bitmaps)
+        # of every card, or -1 for cards without a value
+        self.groups = {}
+        self.card_groups = {}
+        for field in FACET_FIELDS:
+            groups = list(facets.bitmaps.get(field, {}))
+            self.groups[field] = groups
+            column = store.columns.get(field)
+            if column is None:
+                self.card_groups[field] = np.full(self.num_cards, -1, dtype=np.int32)
+                continue
+            group_of = {lowered: position for position, lowered in enumerate(groups)}
+            code_groups = np.array([group_of.get(lowered, -1) for lowered in column.lowered], dtype=np.int32)
+            self.card_groups[field] = code_groups[np.frombuffer(column.codes, dtype=np.uint32)]
+
+    def filter_mask(self, filters: dict, exclude: str = None) -> np.ndarray:
+        """
+        Boolean mask of the cards passing the {field: value} filters, with the
+        same rules as FacetIndex.filter_bitmap.
+        """
+        mask = np.ones(self.num_cards, dtype=bool)
+        for field, value in filters.items():
+            if not value or field == exclude:
+                continue
+            groups = self.groups.get(field, [])
+            lowered = str(value).lower()
+            if lowered not in groups:
+                return np.zeros(self.num_cards, dtype=bool)
+            mask &= self.card_groups[field] == groups.index(lowered)
+        return mask
+
+    def score_vectors(self, search_tokens: list[str], terms: dict,
+                      corpus_stats: Optional[tuple] = None) -> tuple:
+        """
+        Return the score of every card as one float array, and with BM25F
+        ranking also the relevance times the duplicate boost of every card
+        (as SearchIndex.relevance computes it for some), or None. Both come
+        from one gather of each (token, field)'s postings: the per-card sums
+        of their term counts, whose nonzero cards are the ones present.
+        """
+        bm25f = self.ranking == "bm25f"
+        if bm25f and corpus_stats is None:
+            corpus_stats = (self.num_cards, self.index.document_frequencies(search_tokens, self.prefix, terms))
+        scores = np.zeros(self.num_cards, dtype=np.float64)
+        relevance = np.zeros(self.num_cards, dtype=np.float64) if bm25f else None
+        for token, repeats in Counter(search_tokens).items():
+            weights = np.zeros(self.num_cards, dtype=np.float64) if bm25f else None
+            for field in SEARCH_FIELDS:
+                term_ids = np.array(terms[field, token], dtype=np.int64)
+                if not len(term_ids):
+                    continue
+                post_ids, post_offsets = self.postings[field]
+                positions = posting_positions(post_offsets, term_ids)
+                counts = np.bincount(post_ids[positions], weights=self.term_freqs[field][positions],
+                                     minlength=self.num_cards)
+                present = np.flatnonzero(counts)
+                scores[present] += repeats * FIELD_WEIGHTS[field]
+                if bm25f:
+                    weights[present] += BM25F_WEIGHTS[field] * counts[present] * self.norms[field][present]
+            if bm25f:
+                num_cards, frequencies = corpus_stats
+                token_weight = repeats * inverse_document_frequency(frequencies[token], num_cards) * (BM25F_K1 + 1)
+                relevance += token_weight * weights / (BM25F_K1 + weights)
+        if bm25f:
+            relevance *= self.boosts
+        return scores, relevance
+
+    def facet_counts(self, match_mask: np.ndarray, filters: dict) -> dict:
+        facets = {}
+        for field in FACET_FIELDS:
+            groups = self.groups[field]
+            base = match_mask & self.filter_mask(filters, exclude=field)
+            card_groups = self.card_groups[field][base]
+            counts = np.bincount(card_groups[card_groups >= 0], minlength=len(groups))
+            labels = self.facets.labels[field]
+            facets[field] = {labels[lowered]: int(counts[position]) for position, lowered in enumerate(groups)}
+        return facets
+
+    def top(self, filters: dict, search_tokens: Optional[list[str]], k: int,
+            stats: Optional[SearchStats] = None, corpus_stats: Optional[tuple] = None) -> tuple:
+        stats = stats if stats is not None else SearchStats()
+        stats.start()
+        filter_mask = self.filter_mask(filters)
+
+        # 1) If there's a search query, score every card in one vectorized pass
+        if search_tokens is not None:
+            terms = self.index.matching_terms(search_tokens, self.prefix)
+            scores, relevance = self.score_vectors(search_tokens, terms, corpus_stats)
+            stats.lap("score")
+            match_mask = scores >= MIN_SCORE
+            candidate_ids = np.flatnonzero(match_mask & filter_mask)
+            total = len(candidate_ids)
+            stats.count("candidates", int(np.count_nonzero(scores)))
+            stats.count("matches", int(np.count_nonzero(match_mask)))
+            stats.count("results", total)
+            stats.lap("filter")
+
+            candidate_scores = (scores if relevance is None else relevance)[candidate_ids]
+
+            # Keep only candidates that can be in the top k, then order them by
+            # descending score with ties in the original card order
+            if total > k > 0:
+                kth_score = np.partition(candidate_scores, total - k)[total - k]
+                keep = candidate_scores >= kth_score
+                candidate_ids = candidate_ids[keep]
+                candidate_scores = candidate_scores[keep]
+            order = np.lexsort((candidate_ids, -candidate_scores))[:max(k, 0)]
+            top_results = list(zip((-candidate_scores[order]).tolist(), candidate_ids[order].tolist()))
+            stats.lap("select")
+
+        # 2) If no search query, keep the filtered cards in the original order
+        else:
+            match_mask = np.ones(self.num_cards, dtype=bool)
+            filtered_ids = np.flatnonzero(filter_mask)
+            top_results = [(0.0, card_id) for card_id in filtered_ids[:max(k, 0)].tolist()]
+            total = len(filtered_ids)
+            stats.lap("filter")
+
+        facet_counts = self.facet_counts(match_mask, filters)
+        stats.lap("facets")
+        return top_results, total, facet_counts
@@ -0,0 +1,129 @@
+from array import array
+from collections import OrderedDict
+import threading
+import time
+from typing import NamedTuple
+
+# --------------- DEFAULTS ---------------
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024   # memory budget for cached ranked id lists
+DEFAULT_TTL_SECONDS = 600.0            # drop entries older than this
+
+
+# --------------- HELPER FUNCTIONS ---------------
+def make_cache_key(side, topic, event, evidence_set, search_tokens) -> tuple:
+    """
+    Normalize a /data query into a cache key. Filters compare case-insensitively
+    and token order does not change scores, so both are normalized away.
+    search_tokens is None when there is no search query at all.
+    """
+    def normalize(value):
+        return str(value).lower() if value else None
+
+    return (
+        normalize(side),
+        normalize(topic),
+        normalize(event),
+        normalize(evidence_set),
+        None if search_tokens is None else tuple(sorted(search_tokens)),
+    )
+
+
+# --------------- QUERY CACHE ---------------
+class CachedResult(NamedTuple):
+    ranked_ids: array   # the top matching card ids in ranked order
+    total: int          # number of matching cards (may exceed len(ranked_ids))
+    facets: dict        # facet counts for the query
+
+
+
+class QueryCache:
+    """
+    Thread-safe LRU + TTL cache from a normalized query to its top ranked card
+    ids, total and facet counts.
+
+    Infinite scroll asks for page 2, 3, ... of the same query, so keeping the
+    ranked ids turns every page they cover into a slice. Ids are
+    stored as a uint32 array and the total size of all cached arrays is kept
+    under max_bytes by evicting the least recently used entries.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()   # key -> (created_at, CachedResult)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def bytes_used(self) -> int:
+        return self._bytes
+
+    def get(self, key):
+        """
+        Return the CachedResult for a key, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl_seconds:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, ranked_ids, total: int, facets=None) -> CachedResult:
+        """
+        Cache the ranked ids (as a compact array), total and facet counts for
+        a key and return them. Results larger than the whole budget are
+        returned but not cached.
+        """
+        result = CachedResult(array("I", ranked_ids), total, facets or {})
+        size = _result_size(result)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return result
+            while self._bytes + size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            self._entries[key] = (time.monotonic(), result)
+            self._bytes += size
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, key) -> None:
+        _, result = self._entries.pop(key)
+        self._bytes -= _result_size(result)
+
+
+def _result_size(result: CachedResult) -> int:
+    # Facet dicts are small; count a fixed cost per facet value
+    facet_values = sum(len(values) for values in result.facets.values())
+    return result.ranked_ids.itemsize * len(result.ranked_ids) + 64 * facet_values
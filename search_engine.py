@@ -0,0 +1,127 @@
+from typing import Optional
+
+from facet_index import bitmap_to_bytes, bitmap_to_ids, ids_to_bitmap
+from search_index import MATCH_MODES
+from search_metrics import SearchStats
+
+# Minimum score a card needs to show up in search results
+MIN_SCORE = 5.0
+
+# How the cards reaching MIN_SCORE are ordered: "bm25f" (relevance from term
+# counts, field lengths and duplicate_count, see search_index.py) or
+# "presence" (the MIN_SCORE points themselves: +50 / +10 / +1 per token
+# found in the tagline / evidence / citation, ties in corpus order)
+RANKINGS = ("bm25f", "presence")
+
+
+# --------------- SEARCH ENGINE ---------------
+class SearchEngine:
+    """
+    Ranks cards for /data using the card store, search index and facet
+    index. Kept free of FastAPI and module-level loading so it can also run
+    inside search worker processes.
+    """
+
+    def __init__(self, store, index, facets, match_mode: str = "substring", ranking: str = "bm25f"):
+        self.store = store
+        self.index = index
+        self.facets = facets
+        self.prefix = match_mode == "prefix"
+        self.ranking = ranking
+
+    def rank(self, filters: dict, search_tokens: Optional[list[str]], k: int,
+             stats: Optional[SearchStats] = None) -> tuple:
+        """
+        Return the ids of the top k cards that pass the {field: value} filters,
+        ranked by score if search tokens are given (None means no search) or in
+        corpus order if not, along with the exact number of matching cards and
+        the facet counts for the query. Stage timings and card counts are
+        added to stats if given.
+        """
+        top, total, facets = self.top(filters, search_tokens, k, stats)
+        return [card_id for _, card_id in top], total, facets
+
+    def top(self, filters: dict, search_tokens: Optional[list[str]], k: int,
+            stats: Optional[SearchStats] = None, corpus_stats: Optional[tuple] = None) -> tuple:
+        """
+        Like rank, but with the top cards as (-score, card id) pairs (score 0
+        without a search), which sort in rank order, so the results of
+        several engines (e.g. corpus segments) can be merged. corpus_stats
+        are the IDF statistics of the whole corpus when this engine only
+        searches a segment of it (see SearchIndex.relevance).
+        """
+        stats = stats if stats is not None else SearchStats()
+        stats.start()
+        num_cards = len(self.store)
+        facets = self.facets
+        filter_bitmap = facets.filter_bitmap(filters)
+
+        # 1) If there's a search query, score only the cards the index says
+        #    contain a search token, then apply the filters to those
+        if search_tokens is not None:
+            # Score candidate cards and keep only cards with score >= MIN_SCORE
+            # (mimics the 'min_score=5.0' from your ES code), then the ones
+            # whose bit is set in the filter bitmap
+            allowed = None if filter_bitmap == facets.all_cards else bitmap_to_bytes(filter_bitmap, num_cards)
+            stats.lap("filter")
+            terms = self.index.matching_terms(search_tokens, self.prefix)
+            # Presence ranking selects the k best in the index, pruning cards
+            # that cannot enter them; BM25F only needs the results
+            top_results, matches, result_ids = self.index.top_scores(
+                search_tokens, k if self.ranking == "presence" else 0, MIN_SCORE, allowed, self.prefix, stats, terms)
+            match_bitmap = ids_to_bitmap(matches, num_cards)
+            stats.lap("score")
+
+            # Rank only the cards that passed: their relevance comes from the
+            # postings of the matching terms, probed for just those cards, and
+            # the k best (ties keep the original card order) are selected
+            # with the tokens' weights as bounds, so cards that cannot enter
+            # them are not fully scored
+            if self.ranking == "bm25f":
+                top_results = self.index.top_relevance(
+                    search_tokens, result_ids, k, self.prefix, corpus_stats, terms, stats)
+                stats.lap("relevance")
+            total = len(result_ids)
+            stats.count("matches", len(matches))
+            stats.count("results", total)
+            stats.lap("select")
+
+        # 2) If no search query, keep the filtered cards in the original order
+        else:
+            match_bitmap = facets.all_cards
+            if filter_bitmap == facets.all_cards:
+                ranked_ids = range(min(k, num_cards))
+                total = num_cards
+            else:
+                ranked_ids = bitmap_to_ids(filter_bitmap, num_cards, limit=k)
+                total = filter_bitmap.bit_count()
+            top_results = [(0.0, card_id) for card_id in ranked_ids]
+            stats.lap("filter")
+
+        facet_counts = facets.counts(match_bitmap, filters)
+        stats.lap("facets")
+        return top_results, total, facet_counts
+
+
+# --------------- ENGINE FACTORY ---------------
+SCORERS = ("python", "numpy")
+
+
+def make_engine(store, index, facets, scorer: str = "python", match_mode: str = "substring",
+                ranking: str = "bm25f") -> SearchEngine:
+    """
+    Return the search engine for the configured scorer: "python" (posting
+    list loops) or "numpy" (vectorized scoring, needs NumPy), matching search
+    tokens as substrings or prefixes of words and ordering the results by
+    the given ranking.
+    """
+    if match_mode not in MATCH_MODES:
+        raise ValueError(f"Unknown match mode {match_mode!r}, expected one of {', '.join(MATCH_MODES)}")
+    if ranking not in RANKINGS:
+        raise ValueError(f"Unknown ranking {ranking!r}, expected one of {', '.join(RANKINGS)}")
+    if scorer == "python":
+        return SearchEngine(store, index, facets, match_mode, ranking)
+    if scorer == "numpy":
+        from numpy_engine import NumpySearchEngine
+        return NumpySearchEngine(store, index, facets, match_mode, ranking)
+    raise ValueError(f"Unknown scorer {scorer!r}, expected one of {', '.join(SCORERS)}")
@@ -0,0 +1,144 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+import asyncio
+import multiprocessing
+
+from corpus_segments import make_segmented, open_segments
+from search_metrics import SearchStats
+
+# How often a waiting request checks whether its client went away
+DISCONNECT_POLL_SECONDS = 0.05
+
+# Search engine of a search worker process, set by _init_worker
+_WORKER_ENGINE = None
+
+
+# --------------- WORKER PROCESS ---------------
+def _init_worker(corpus_files: list[str], scorer: str, match_mode: str, ranking: str) -> None:
+    # Every worker memory-maps the same corpus files (the base corpus and any
+    # deltas), so they share their pages
+    global _WORKER_ENGINE
+    _, _WORKER_ENGINE, _ = make_segmented(open_segments(corpus_files), scorer, match_mode, ranking)
+
+
+def _ping() -> None:
+    pass
+
+
+def _rank_with_stats(engine, filters: dict, search_tokens: Optional[list[str]], k: int) -> tuple:
+    stats = SearchStats()
+    ranked_ids, total, facets = engine.rank(filters, search_tokens, k, stats)
+    return list(ranked_ids), total, facets, stats
+
+
+def _rank_in_worker(filters: dict, search_tokens: Optional[list[str]], k: int) -> tuple:
+    return _rank_with_stats(_WORKER_ENGINE, filters, search_tokens, k)
+
+
+# --------------- SEARCH EXECUTOR ---------------
+class SearchExecutor:
+    """
+    Runs SearchEngine.rank off the event loop.
+
+    With corpus files and max_workers > 0, searches run in a pool of
+    processes that each memory-map the corpus, so concurrent searches are not
+    serialized by the GIL. Otherwise they run on the default threadpool with
+    the in-process engine.
+
+    Identical queries that are in flight at the same time share one
+    computation, and a computation whose every waiter was cancelled (e.g. the
+    client aborted a superseded query) is cancelled too if it has not
+    started yet.
+
+    With metrics (a SearchMetrics), the engine's stage timings are recorded
+    once per computation, along with the coalesced and cancelled counts.
+    """
+
+    def __init__(self, engine, corpus_files: Optional[list[str]] = None, max_workers: int = 0,
+                 scorer: str = "python", match_mode: str = "substring", ranking: str = "bm25f", metrics=None):
+        self.engine = engine
+        self.max_workers = max_workers
+        self.metrics = metrics
+        self.pool = None
+        if corpus_files and max_workers > 0:
+            # Spawn (not fork) so workers never inherit the web server's threads
+            self.pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(list(corpus_files), scorer, match_mode, ranking),
+            )
+        self.coalesced = 0
+        self.cancelled = 0
+        self._in_flight = {}   # key -> [future, number of waiters]
+
+    async def rank(self, key, filters: dict, search_tokens: Optional[list[str]], k: int) -> tuple:
+        """
+        Return engine.rank(filters, search_tokens, k) and the SearchStats of
+        the computation, sharing the work with any in-flight call that has
+        the same key.
+        """
+        entry = self._in_flight.get(key)
+        if entry is None:
+            loop = asyncio.get_running_loop()
+            if self.pool is not None:
+                future = loop.run_in_executor(self.pool, _rank_in_worker, filters, search_tokens, k)
+            else:
+                future = loop.run_in_executor(None, _rank_with_stats, self.engine, filters, search_tokens, k)
+            entry = self._in_flight[key] = [future, 0]
+            future.add_done_callback(lambda _: self._forget(key, entry))
+        else:
+            self.coalesced += 1
+            self._count("debatevault_search_coalesced")
+
+        entry[1] += 1
+        try:
+            # shield() so one waiter giving up does not cancel the shared future
+            return await asyncio.shield(entry[0])
+        except asyncio.CancelledError:
+            if entry[1] == 1 and not entry[0].done():
+                entry[0].cancel()
+                self.cancelled += 1
+                self._count("debatevault_search_cancelled")
+            raise
+        finally:
+            entry[1] -= 1
+
+    def warm_up(self) -> None:
+        """
+        Start every worker process now (and wait for them to open the
+        corpus) instead of on the first searches.
+        """
+        if self.pool is not None:
+            for future in [self.pool.submit(_ping) for _ in range(self.max_workers)]:
+                future.result()
+
+    def shutdown(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _forget(self, key, entry) -> None:
+        if self._in_flight.get(key) is entry:
+            del self._in_flight[key]
+        future = entry[0]
+        if self.metrics is not None and not future.cancelled() and future.exception() is None:
+            self.metrics.observe_search(future.result()[3])
+
+    def _count(self, name: str) -> None:
+        if self.metrics is not None:
+            self.metrics.inc(name)
+
+
+async def run_unless_disconnected(request, awaitable):
+    """
+    Await the awaitable, but cancel it and return None as soon as the client
+    of the request disconnects.
+    """
+    task = asyncio.ensure_future(awaitable)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+        if done:
+            return task.result()
+        if await request.is_disconnected():
+            task.cancel()
+            return None
@@ -0,0 +1,698 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+import heapq
+from itertools import accumulate, compress, groupby, islice
+import math
+
+# --------------- FIELD WEIGHTS ---------------
+# Points a card earns for each search token found in the field
+FIELD_WEIGHTS = {
+    "tagline": 50.0,
+    "evidence": 10.0,
+    "citation": 1.0,
+}
+SEARCH_FIELDS = tuple(FIELD_WEIGHTS)
+
+# Probe a posting list by binary search (instead of walking it) when it is
+# this many times longer than the set of candidate cards
+PROBE_RATIO = 16
+
+# Separator between terms in a field's term blob (terms never contain whitespace)
+TERM_SEPARATOR = b"\n"
+
+# How a search token matches a field: anywhere inside a term (like the
+# `token in text` check of compute_score) or only at the start of a term
+MATCH_MODES = ("substring", "prefix")
+
+# Fields whose index also keeps where each term occurs in a card (its word
+# positions in the field text), for snippets and highlights. Only the first
+# MAX_TERM_POSITIONS occurrences of a term in a card are kept, and only
+# positions that fit in 16 bits.
+POSITION_FIELDS = ("tagline", "evidence")
+MAX_TERM_POSITIONS = 4
+MAX_POSITION = 0xFFFF
+
+# --------------- RELEVANCE ---------------
+# Cards that reach the minimum score above are ranked with BM25F: a token's
+# occurrences in the three fields are weighted, normalized by the field's
+# length (b is how much the length counts) and added up before they
+# saturate (k1), so a term repeated in a short card beats one mention in
+# thousands of words of evidence. Every posting stores its term count (up to
+# MAX_TERM_FREQUENCY, long past saturation) and every field the length norm
+# of each card, both computed when the index is built.
+BM25F_WEIGHTS = {
+    "tagline": 10.0,
+    "evidence": 0.2,
+    "citation": 0.5,
+}
+BM25F_B = {
+    "tagline": 0.3,
+    "evidence": 0.75,
+    "citation": 0.5,
+}
+BM25F_K1 = 1.2
+MAX_TERM_FREQUENCY = 255
+
+# Byte tables mapping a term count to one of its bits (see
+# FieldIndex.term_frequencies)
+COUNT_BITS = [bytes((count >> bit) & 1 for count in range(256)) for bit in range(MAX_TERM_FREQUENCY.bit_length())]
+
+# Relevance is multiplied by 1 + DUPLICATE_WEIGHT * ln(duplicate_count), so
+# among equally relevant cards the ones cut most often come first
+DUPLICATE_WEIGHT = 0.02
+
+
+# --------------- HELPER FUNCTIONS ---------------
+def field_texts(card: dict) -> tuple[str, str, str]:
+    """
+    Return the lowercased tagline, evidence and citation text of a card,
+    built exactly the way compute_score in main.py builds them.
+    """
+    tagline_text = card.get("tagline", "").lower()
+    evidence_text = " ".join(card.get("evidence", [])).lower()
+    citation_text = card.get("citation", "").lower()
+    return tagline_text, evidence_text, citation_text
+
+
+def inverse_document_frequency(document_frequency: int, num_cards: int) -> float:
+    # BM25's IDF, which stays positive for terms in over half the cards
+    document_frequency = min(document_frequency, num_cards)
+    return math.log(1.0 + (num_cards - document_frequency + 0.5) / (document_frequency + 0.5))
+
+
+def length_norms(lengths: array, b: float) -> array:
+    """
+    Per card, the BM25 factor its term counts in a field are multiplied by:
+    1 / (1 - b + b * length / average length).
+    """
+    average = sum(lengths) / len(lengths) if lengths else 0.0
+    if not average:
+        return array("f", [1.0] * len(lengths))
+    return array("f", (1.0 / (1.0 - b + b * length / average) for length in lengths))
+
+
+def max_score_clauses(search_tokens: list[str], min_score: float) -> tuple[list, list, float]:
+    """
+    Split the (weight, field, token) clauses of a search for max-score
+    pruning: each clause adds at most its field weight, so the lowest-weight
+    clauses whose weights sum to less than min_score cannot qualify a card
+    on their own. Return those optional clauses, the other (essential) ones
+    and the most the optional ones can add to a card.
+    """
+    clauses = sorted(
+        ((FIELD_WEIGHTS[field], field, token) for token in search_tokens for field in SEARCH_FIELDS),
+        key=lambda clause: clause[0],
+    )
+    upper_bound = 0.0
+    num_optional = 0
+    for weight, field, token in clauses:
+        if upper_bound + weight >= min_score:
+            break
+        upper_bound += weight
+        num_optional += 1
+    return clauses[:num_optional], clauses[num_optional:], upper_bound
+
+
+# --------------- FIELD INDEX ---------------
+class FieldIndex:
+    """
+    Term dictionary and posting lists for one card field.
+
+    Terms are the whitespace separated words of the lowercased field text,
+    sorted and stored back to back in a single bytes blob. Because search
+    tokens never contain whitespace, `token in field_text` is true exactly
+    when the token is a substring of one of the field's terms, so a query
+    only has to scan the (much smaller) term blob and union the posting
+    lists of the terms it hits.
+
+    Posting j (card post_ids[j]) also has the number of times its term
+    occurs in that card, term_freqs[j], and card n the length norm norms[n]
+    of its field text. With positions, posting j also has the word positions
+    positions[pos_offsets[j]:pos_offsets[j + 1]] of its term in that card.
+    """
+
+    def __init__(self, term_blob: bytes, term_offsets: array, post_offsets: array, post_ids: array,
+                 term_freqs: array, norms: array, pos_offsets: array = None, positions: array = None):
+        self.term_blob = term_blob          # b"term1\nterm2\n..."
+        self.term_offsets = term_offsets    # start of term i in term_blob, plus end sentinel
+        self.post_offsets = post_offsets    # start of term i's postings in post_ids, plus end sentinel
+        self.post_ids = post_ids            # card ids, ascending within each term
+        self.term_freqs = term_freqs        # occurrences of the term in the card of each posting
+        self.norms = norms                  # BM25 length norm of every card's field text
+        self.pos_offsets = pos_offsets      # start of posting j's positions, plus end sentinel (or None)
+        self.positions = positions          # word positions, ascending within each posting (or None)
+
+    @classmethod
+    def build(cls, texts, positions: bool = False, b: float = 0.75) -> "FieldIndex":
+        """
+        Build the index from an iterable of lowercased field texts, where the
+        n-th text belongs to card id n, with term positions if positions is
+        set. b is the BM25 length normalization of the field.
+        """
+        postings = {}
+        lengths = array("I")
+        for card_id, text in enumerate(texts):
+            words = text.split()
+            lengths.append(len(words))
+            counts = Counter(words)
+            if not positions:
+                for term, count in counts.items():
+                    entry = postings.get(term)
+                    if entry is None:
+                        postings[term] = entry = (array("I"), array("B"))
+                    entry[0].append(card_id)
+                    entry[1].append(min(count, MAX_TERM_FREQUENCY))
+                continue
+
+            # Word positions sorted by term (a C sort, instead of a Python
+            # loop over every word), ascending within each term
+            order = sorted(range(min(len(words), MAX_POSITION + 1)), key=words.__getitem__)
+            for term, group in groupby(order, words.__getitem__):
+                entry = postings.get(term)
+                if entry is None:
+                    postings[term] = entry = (array("I"), array("B"), array("B"), array("H"))
+                ids, freqs, found_counts, found = entry
+                ids.append(card_id)
+                freqs.append(min(counts[term], MAX_TERM_FREQUENCY))
+                start = len(found)
+                found.extend(islice(group, MAX_TERM_POSITIONS))
+                found_counts.append(len(found) - start)
+            if len(words) > MAX_POSITION + 1:
+                # Terms only found past the last position get no positions
+                for term in set(words[MAX_POSITION + 1:]).difference(words[:MAX_POSITION + 1]):
+                    entry = postings.get(term)
+                    if entry is None:
+                        postings[term] = entry = (array("I"), array("B"), array("B"), array("H"))
+                    entry[0].append(card_id)
+                    entry[1].append(min(counts[term], MAX_TERM_FREQUENCY))
+                    entry[2].append(0)
+
+        term_blob = bytearray()
+        term_offsets = array("Q")
+        post_offsets = array("Q")
+        post_ids = array("I")
+        term_freqs = array("B")
+        pos_offsets = array("Q") if positions else None
+        term_positions = array("H") if positions else None
+        for term in sorted(postings):
+            term_offsets.append(len(term_blob))
+            term_blob += term.encode("utf-8")
+            term_blob += TERM_SEPARATOR
+            post_offsets.append(len(post_ids))
+            if positions:
+                ids, freqs, found_counts, found = postings[term]
+                pos_offsets.extend(islice(accumulate(found_counts, initial=len(term_positions)), len(found_counts)))
+                term_positions.extend(found)
+            else:
+                ids, freqs = postings[term]
+            post_ids.extend(ids)
+            term_freqs.extend(freqs)
+        term_offsets.append(len(term_blob))
+        post_offsets.append(len(post_ids))
+        if positions:
+            pos_offsets.append(len(term_positions))
+            if len(term_positions) < 2**32:
+                pos_offsets = array("I", pos_offsets)
+
+        return cls(bytes(term_blob), term_offsets, post_offsets, post_ids, term_freqs, length_norms(lengths, b),
+                   pos_offsets, term_positions)
+
+    def __len__(self) -> int:
+        return len(self.term_offsets) - 1
+
+    def term(self, term_id: int) -> str:
+        start = self.term_offsets[term_id]
+        end = self.term_offsets[term_id + 1] - len(TERM_SEPARATOR)
+        return self.term_blob[start:end].decode("utf-8")
+
+    def postings(self, term_id: int) -> array:
+        return self.post_ids[self.post_offsets[term_id]:self.post_offsets[term_id + 1]]
+
+    def matching_terms(self, token: str, prefix: bool = False) -> list[int]:
+        """
+        Return the ids of all terms that contain the token as a substring, or
+        only those that start with it if prefix is set.
+        """
+        needle = token.encode("utf-8")
+        if not needle:
+            return []
+        if prefix:
+            return list(self.prefix_range(needle))
+
+        term_ids = []
+        blob = self.term_blob
+        offsets = self.term_offsets
+        pos = blob.find(needle)
+        while pos != -1:
+            term_id = bisect_right(offsets, pos) - 1
+            term_ids.append(term_id)
+            # Skip the rest of this term so it is only reported once
+            pos = blob.find(needle, offsets[term_id + 1])
+        return term_ids
+
+    def prefix_range(self, needle: bytes) -> range:
+        """
+        Return the ids of the terms starting with needle. Terms are sorted, so
+        they are one contiguous range, found with two binary searches instead
+        of a scan of the term blob.
+        """
+        return SortedTerms(self.term_blob, self.term_offsets).prefix_range(needle)
+
+    def match(self, token: str, prefix: bool = False) -> set[int]:
+        """
+        Return the ids of all cards whose field text contains the token.
+        """
+        return self.match_terms(self.matching_terms(token, prefix))
+
+    def match_terms(self, term_ids) -> set[int]:
+        """
+        Return the ids of all cards with one of the terms.
+        """
+        card_ids = set()
+        for term_id in term_ids:
+            card_ids.update(self.postings(term_id))
+        return card_ids
+
+    def match_within(self, token: str, candidates: set[int], prefix: bool = False) -> set[int]:
+        """
+        Return the candidate cards whose field text contains the token.
+        """
+        return self.match_terms_within(self.matching_terms(token, prefix), candidates)
+
+    def match_terms_within(self, term_ids, candidates: set[int]) -> set[int]:
+        """
+        Return the candidate cards with one of the terms. Long posting lists
+        are probed with a binary search per candidate instead of being read
+        in full.
+        """
+        card_ids = set()
+        post_ids = self.post_ids
+        for term_id in term_ids:
+            start = self.post_offsets[term_id]
+            end = self.post_offsets[term_id + 1]
+            if (end - start) > PROBE_RATIO * len(candidates):
+                for card_id in candidates:
+                    position = bisect_left(post_ids, card_id, start, end)
+                    if position < end and post_ids[position] == card_id:
+                        card_ids.add(card_id)
+            else:
+                card_ids.update(candidates.intersection(post_ids[start:end]))
+        return card_ids
+
+    def document_frequency(self, term_ids) -> int:
+        """
+        Number of postings of the terms: the number of cards with one of
+        them, or more when a card has several.
+        """
+        post_offsets = self.post_offsets
+        return sum(post_offsets[term_id + 1] - post_offsets[term_id] for term_id in term_ids)
+
+    def term_frequencies(self, term_ids, candidates: set[int]) -> dict[int, int]:
+        """
+        Return {card id: occurrences of the terms} for the candidate cards
+        with one of them, probing long posting lists like match_terms_within.
+
+        Posting lists that are read in full are counted in C, one bit of the
+        term counts at a time: planes[bit] counts the postings per card whose
+        term count has that bit set (Counter.update over itertools.compress
+        with a byte mask), so a card's occurrences are sum(planes[bit][card]
+        << bit). Term counts are small, so that is only a few passes.
+        """
+        planes = [Counter() for _ in COUNT_BITS]
+        post_ids = self.post_ids
+        term_freqs = self.term_freqs
+        for term_id in term_ids:
+            start = self.post_offsets[term_id]
+            end = self.post_offsets[term_id + 1]
+            if (end - start) > PROBE_RATIO * len(candidates):
+                for card_id in candidates:
+                    position = bisect_left(post_ids, card_id, start, end)
+                    if position < end and post_ids[position] == card_id:
+                        # Bit 0 counts once, so whole counts can go there
+                        planes[0][card_id] += term_freqs[position]
+                continue
+            ids = post_ids[start:end]
+            freqs = bytes(term_freqs[start:end])
+            if len(term_ids) == 1:
+                # One term: its postings already are the counts
+                counts = dict(zip(ids, freqs))
+                return {card_id: counts[card_id] for card_id in candidates.intersection(counts)}
+            for bit in range(max(freqs).bit_length()):
+                planes[bit].update(compress(ids, freqs.translate(COUNT_BITS[bit])))
+
+        counts = planes[0]
+        for bit in range(1, len(planes)):
+            for card_id, count in planes[bit].items():
+                counts[card_id] += count << bit
+        return {card_id: counts[card_id] for card_id in candidates.intersection(counts)}
+
+    def card_positions(self, token: str, card_ids, prefix: bool = False) -> dict[int, list[int]]:
+        """
+        Return {card id: word positions} of the terms containing the token
+        (or starting with it, if prefix is set) in each of the given cards
+        that has one. Each matching term's posting list is probed for just
+        those cards, so the cost grows with the matches, not with the text
+        of the cards. Empty without positions.
+        """
+        found = {}
+        if self.positions is None or not card_ids:
+            return found
+        wanted = set(card_ids)
+        post_ids = self.post_ids
+        for term_id in self.matching_terms(token, prefix):
+            start = self.post_offsets[term_id]
+            end = self.post_offsets[term_id + 1]
+            if (end - start) > PROBE_RATIO * len(wanted):
+                hits = wanted
+            else:
+                hits = wanted.intersection(post_ids[start:end])
+            for card_id in hits:
+                posting = bisect_left(post_ids, card_id, start, end)
+                if posting < end and post_ids[posting] == card_id:
+                    positions = self.positions[self.pos_offsets[posting]:self.pos_offsets[posting + 1]]
+                    if len(positions):
+                        found.setdefault(card_id, []).extend(positions)
+        for positions in found.values():
+            positions.sort()
+        return found
+
+
+class SortedTerms:
+    """
+    Sequence view of the terms in a term blob as bytes, for bisect.
+    """
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, term_id: int) -> bytes:
+        return self.blob[self.offsets[term_id]:self.offsets[term_id + 1] - len(TERM_SEPARATOR)]
+
+    def prefix_range(self, needle: bytes) -> range:
+        start = bisect_left(self, needle)
+        # No UTF-8 byte is 0xff, so this sorts after every term with the prefix
+        end = bisect_left(self, needle + b"\xff", start)
+        return range(start, end)
+
+
+# --------------- SEARCH INDEX ---------------
+class SearchIndex:
+    """
+    Inverted index over the tagline, evidence and citation of every card,
+    plus the autocomplete index over the taglines (used by /suggest).
+    Card ids are positions in the list of cards the index was built from.
+    boosts holds the duplicate_count factor of every card's relevance.
+    """
+
+    def __init__(self, fields: dict, num_cards: int, suggest=None, boosts: array = None):
+        self.fields = fields
+        self.num_cards = num_cards
+        self.suggest = suggest
+        self.boosts = boosts if boosts is not None else array("f", [1.0] * num_cards)
+
+    @classmethod
+    def from_cards(cls, cards: list[dict]) -> "SearchIndex":
+        from suggest_index import SuggestIndex, card_weight
+
+        texts = [field_texts(card) for card in cards]
+        fields = {
+            field: FieldIndex.build((text[position] for text in texts), positions=field in POSITION_FIELDS,
+                                    b=BM25F_B[field])
+            for position, field in enumerate(SEARCH_FIELDS)
+        }
+        boosts = array("f", (1.0 + DUPLICATE_WEIGHT * math.log(card_weight(card)) for card in cards))
+        return cls(fields, len(cards), SuggestIndex.from_cards(cards), boosts)
+
+    def match_positions(self, search_tokens: list[str], card_ids, prefix: bool = False) -> dict:
+        """
+        Where the search tokens occur in the given cards, from the term
+        positions of POSITION_FIELDS: {card id: {field: {token: word
+        positions}}}, for the cards, fields and tokens with a match.
+        """
+        found = {}
+        for field in POSITION_FIELDS:
+            for token in dict.fromkeys(search_tokens):
+                for card_id, positions in self.fields[field].card_positions(token, card_ids, prefix).items():
+                    found.setdefault(card_id, {}).setdefault(field, {})[token] = positions
+        return found
+
+    def matching_terms(self, search_tokens: list[str], prefix: bool = False) -> dict:
+        """
+        Return {(field, token): term ids} for every field and distinct token,
+        so scoring and ranking a query only scan the term blobs once.
+        """
+        return {
+            (field, token): self.fields[field].matching_terms(token, prefix)
+            for token in dict.fromkeys(search_tokens) for field in SEARCH_FIELDS
+        }
+
+    def document_frequencies(self, search_tokens: list[str], prefix: bool = False,
+                             terms: dict = None) -> dict[str, int]:
+        """
+        Return {token: document frequency}, read off the posting list lengths
+        without reading the postings: per field, the postings of the terms
+        the token matches, and the largest of those over the fields (like a
+        card with the token in its tagline nearly always has it in its
+        evidence too). Overcounts cards with several matching terms in one
+        field, which only happens for substring and prefix matches.
+        """
+        terms = terms if terms is not None else self.matching_terms(search_tokens, prefix)
+        return {
+            token: max(self.fields[field].document_frequency(terms[field, token]) for field in SEARCH_FIELDS)
+            for token in dict.fromkeys(search_tokens)
+        }
+
+    def clause_scores(self, clauses: list, terms: dict, candidates: set[int] = None) -> dict[int, float]:
+        """
+        Return {card id: summed weight of the (weight, field, token) clauses
+        it matches} over all cards, or over the candidate cards only (long
+        posting lists are then probed, see FieldIndex.match_terms_within).
+        """
+        # Count, per field, how many tokens each card matches (Counter.update
+        # runs in C), then combine the counts with the field weights once
+        hits = {field: Counter() for field in SEARCH_FIELDS}
+        for weight, field, token in clauses:
+            if candidates is None:
+                hits[field].update(self.fields[field].match_terms(terms[field, token]))
+            else:
+                hits[field].update(self.fields[field].match_terms_within(terms[field, token], candidates))
+
+        scores = {}
+        for field in SEARCH_FIELDS:
+            weight = FIELD_WEIGHTS[field]
+            for card_id, count in hits[field].items():
+                scores[card_id] = scores.get(card_id, 0.0) + weight * count
+        return scores
+
+    def score(self, search_tokens: list[str], min_score: float = 0.0, prefix: bool = False,
+              stats=None, terms: dict = None) -> dict[int, float]:
+        """
+        Score every card that contains at least one search token using the
+        same +50 tagline / +10 evidence / +1 citation weights as compute_score,
+        and return the cards scoring at least min_score.
+
+        Uses max-score pruning (see max_score_clauses): only the essential
+        clauses produce candidates; the optional ones are just checked
+        against those candidates. For fewer than five tokens this means the
+        citation postings are probed instead of read.
+
+        With prefix set, a token only matches terms that start with it. terms
+        (from matching_terms) saves scanning the term blobs again. The
+        number of cards scored is counted as "candidates" in stats if given.
+        """
+        terms = terms if terms is not None else self.matching_terms(search_tokens, prefix)
+        optional, essential, _ = max_score_clauses(search_tokens, min_score)
+        scores = self.clause_scores(essential, terms)
+        if optional:
+            for card_id, extra in self.clause_scores(optional, terms, set(scores)).items():
+                scores[card_id] += extra
+        if stats is not None:
+            stats.count("candidates", len(scores))
+        if min_score > 0:
+            scores = {card_id: score for card_id, score in scores.items() if score >= min_score}
+        return scores
+
+    def top_scores(self, search_tokens: list[str], k: int, min_score: float = 0.0, allowed: bytes = None,
+                   prefix: bool = False, stats=None, terms: dict = None) -> tuple[list, list, list]:
+        """
+        Return (top, matches, results): the ids of the cards scoring at least
+        min_score, those of them that pass the filters, and the k best of
+        those as (-score, card id) pairs in rank order (ties by card id),
+        with the scores of score(). allowed is the filter bitmap as bytes
+        (see facet_index.bitmap_to_bytes), or None to keep every card.
+
+        Max-score pruning with the running k-th best score as threshold: the
+        optional clauses are only probed for cards that need them to reach
+        min_score, and for results that could still enter the top k with
+        them. Results are taken in descending order of their essential score
+        into a heap of the k best; once it is full and the essential score
+        plus the optional clauses' bound falls below its minimum, no later
+        result can enter and the rest are never fully scored. Matches and
+        results are still exact. k = 0 only finds them (to rank them some
+        other way).
+        """
+        terms = terms if terms is not None else self.matching_terms(search_tokens, prefix)
+        optional, essential, upper_bound = max_score_clauses(search_tokens, min_score)
+        essential_scores = self.clause_scores(essential, terms)
+        if stats is not None:
+            stats.count("candidates", len(essential_scores))
+
+        # Cards short of min_score need the optional clauses to qualify, and
+        # then their scores are complete
+        scored = {}
+        if optional:
+            short = {card_id for card_id, score in essential_scores.items() if score < min_score}
+            for card_id, extra in self.clause_scores(optional, terms, short).items():
+                if essential_scores[card_id] + extra >= min_score:
+                    scored[card_id] = essential_scores[card_id] + extra
+        qualified = [card_id for card_id, score in essential_scores.items() if score >= min_score]
+        matches = qualified + list(scored)
+        if allowed is not None:
+            qualified = [card_id for card_id in qualified if allowed[card_id >> 3] >> (card_id & 7) & 1]
+            scored = {card_id: score for card_id, score in scored.items()
+                      if allowed[card_id >> 3] >> (card_id & 7) & 1}
+        results = qualified + list(scored)
+        if not k:
+            return [], matches, results
+
+        # Heap of the k best as (score, -card id), the worst at heap[0]
+        heap = []
+
+        def offer(score: float, card_id: int) -> None:
+            if len(heap) < k:
+                heapq.heappush(heap, (score, -card_id))
+            elif (score, -card_id) > heap[0]:
+                heapq.heapreplace(heap, (score, -card_id))
+
+        for card_id, score in scored.items():
+            offer(score, card_id)
+        by_score = {}
+        for card_id in qualified:
+            by_score.setdefault(essential_scores[card_id], []).append(card_id)
+        for score in sorted(by_score, reverse=True):
+            if len(heap) == k and score + upper_bound < heap[0][0]:
+                break
+            card_ids = by_score[score]
+            extras = self.clause_scores(optional, terms, set(card_ids)) if optional else {}
+            for card_id in card_ids:
+                offer(score + extras.get(card_id, 0.0), card_id)
+        return sorted((-score, -negative_id) for score, negative_id in heap), matches, results
+
+    def token_weights(self, search_tokens: list[str], prefix: bool = False, corpus_stats: tuple = None,
+                      terms: dict = None) -> list[tuple[str, float]]:
+        """
+        Return (token, weight) per distinct search token, in query order: its
+        repeats times its IDF times (k1 + 1). A token adds weight * x / (k1 + x)
+        to a card's relevance (x its weighted, normalized occurrences), so
+        always less than its weight. corpus_stats as for relevance.
+        """
+        terms = terms if terms is not None else self.matching_terms(search_tokens, prefix)
+        if corpus_stats is None:
+            corpus_stats = (self.num_cards, self.document_frequencies(search_tokens, prefix, terms))
+        num_cards, frequencies = corpus_stats
+        return [(token, repeats * inverse_document_frequency(frequencies[token], num_cards) * (BM25F_K1 + 1))
+                for token, repeats in Counter(search_tokens).items()]
+
+    def token_relevance(self, token: str, token_weight: float, terms: dict,
+                        candidates: set[int]) -> dict[int, float]:
+        """
+        Return {card id: relevance the token adds} for the candidate cards
+        containing it, before the duplicate boost.
+        """
+        # Weighted, length-normalized occurrences over the fields
+        weights = {}
+        for field in SEARCH_FIELDS:
+            field_index = self.fields[field]
+            field_weight = BM25F_WEIGHTS[field]
+            norms = field_index.norms
+            for card_id, count in field_index.term_frequencies(terms[field, token], candidates).items():
+                weights[card_id] = weights.get(card_id, 0.0) + field_weight * count * norms[card_id]
+        return {card_id: token_weight * weight / (BM25F_K1 + weight) for card_id, weight in weights.items()}
+
+    def relevance(self, search_tokens: list[str], card_ids, prefix: bool = False,
+                  corpus_stats: tuple = None, terms: dict = None) -> dict[int, float]:
+        """
+        Return the BM25F relevance of the given cards, times their duplicate
+        boost: {card id: relevance}. Only the posting lists of the matching
+        terms are read, and only the given cards' counts are combined.
+
+        corpus_stats is (number of cards, {token: document frequency}) of the
+        whole corpus when this index is one segment of it, so the IDF of a
+        token is the same in every segment; by default it is this index's.
+        """
+        terms = terms if terms is not None else self.matching_terms(search_tokens, prefix)
+        candidates = set(card_ids)
+        scores = dict.fromkeys(candidates, 0.0)
+        for token, token_weight in self.token_weights(search_tokens, prefix, corpus_stats, terms):
+            for card_id, score in self.token_relevance(token, token_weight, terms, candidates).items():
+                scores[card_id] += score
+        boosts = self.boosts
+        return {card_id: score * boosts[card_id] for card_id, score in scores.items()}
+
+    def top_relevance(self, search_tokens: list[str], card_ids, k: int, prefix: bool = False,
+                      corpus_stats: tuple = None, terms: dict = None, stats=None) -> list:
+        """
+        Return the k most relevant of the given cards as (-relevance, card id)
+        pairs in rank order (ties by card id), with the relevance of
+        relevance().
+
+        Max-score pruning with token weights as bounds: only the rarest
+        (heaviest, shortest posting lists) token is scored for every card.
+        The others can add at most their weights, so cards are taken in
+        descending order of that bound, in chunks that double from k, into
+        a heap of the k best; the other tokens are only probed for the
+        chunk's cards, or read once for all the rest when the chunk gets
+        near their size. Once the heap is full and the next bound falls
+        below its minimum, no later card can enter. The number of cards fully
+        scored is counted as "ranked" in stats if given.
+        """
+        candidates = set(card_ids)
+        if not k or not candidates:
+            return []
+        terms = terms if terms is not None else self.matching_terms(search_tokens, prefix)
+        weights = self.token_weights(search_tokens, prefix, corpus_stats, terms)
+        essential = max(range(len(weights)), key=lambda index: weights[index][1])
+        optional = [index for index in range(len(weights)) if index != essential]
+        upper_bound = sum(weights[index][1] for index in optional)
+        contributions = [{} for _ in weights]
+        contributions[essential] = self.token_relevance(*weights[essential], terms, candidates)
+        partial = contributions[essential]
+        boosts = self.boosts
+        bounds = {card_id: (partial.get(card_id, 0.0) + upper_bound) * boosts[card_id] for card_id in candidates}
+        order = sorted(candidates, key=bounds.__getitem__, reverse=True)
+
+        # Heap of the k best as (relevance, -card id), the worst at heap[0]
+        heap = []
+        start = 0
+        size = k
+        while start < len(order):
+            if len(heap) == k and bounds[order[start]] < heap[0][0]:
+                break
+            if size * PROBE_RATIO >= len(order) - start:
+                # Probing costs about as much as reading the postings in full
+                size = len(order) - start
+            chunk = order[start:start + size]
+            chunk_ids = set(chunk)
+            for index in optional:
+                contributions[index] = self.token_relevance(*weights[index], terms, chunk_ids)
+            for card_id in chunk:
+                # Summed in query order, exactly like relevance()
+                score = 0.0
+                for token_scores in contributions:
+                    if card_id in token_scores:
+                        score += token_scores[card_id]
+                score *= boosts[card_id]
+                if len(heap) < k:
+                    heapq.heappush(heap, (score, -card_id))
+                elif (score, -card_id) > heap[0]:
+                    heapq.heapreplace(heap, (score, -card_id))
+            start += len(chunk)
+            size *= 2
+        if stats is not None:
+            stats.count("ranked", start)
+        return sorted((-score, -negative_id) for score, negative_id in heap)
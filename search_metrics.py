@@ -0,0 +1,267 @@
+from bisect import bisect_left
+from collections import deque
+from typing import Optional
+import json
+import threading
+import time
+
+# --------------- DEFAULTS ---------------
+# Histogram bucket upper bounds: seconds for stage timings, cards for counts
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 10, 100, 1000, 10000, 100000, 1000000, 10000000)
+
+# p50/p95/p99 are computed over this many most recent observations per series
+QUANTILES = (0.5, 0.95, 0.99)
+WINDOW = 1024
+
+
+# --------------- SEARCH STATS ---------------
+class SearchStats:
+    """
+    Seconds spent in each stage of one search and counts of the cards it
+    went through. Stages are timed back to back: lap(stage) charges the time
+    since the previous lap (or start()) to stage. Plain attributes, so it can
+    be returned from a search worker process.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self.counts = {}
+        self._last = time.perf_counter()
+
+    def start(self) -> None:
+        self._last = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + now - self._last
+        self._last = now
+
+    def count(self, name: str, value: int) -> None:
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def add(self, other: "SearchStats") -> None:
+        # Fold in the stats of another part of the search (e.g. a segment)
+        for stage, seconds in other.seconds.items():
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        for name, value in other.counts.items():
+            self.count(name, value)
+
+
+# --------------- HISTOGRAM ---------------
+class Histogram:
+    """
+    Prometheus-style histogram of one series (cumulative buckets, sum and
+    count since startup) that also keeps the last WINDOW observations, from
+    which recent quantiles are computed at scrape time.
+    """
+
+    def __init__(self, buckets: tuple = SECONDS_BUCKETS, window: int = WINDOW):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)   # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.bucket_counts[bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+            self.recent.append(value)
+
+    def quantiles(self, qs: tuple = QUANTILES) -> dict:
+        with self._lock:
+            recent = sorted(self.recent)
+        if not recent:
+            return {q: 0.0 for q in qs}
+        return {q: recent[min(len(recent) - 1, int(q * len(recent)))] for q in qs}
+
+    def snapshot(self) -> tuple:
+        with self._lock:
+            return list(self.bucket_counts), self.sum, self.count
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+def _number(value) -> str:
+    if isinstance(value, float) and value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class HistogramFamily:
+    """
+    Histograms of one metric keyed by the value of one label (e.g. stage),
+    rendered as a Prometheus histogram plus a summary of the recent
+    quantiles named <name>_recent.
+    """
+
+    def __init__(self, name: str, help_text: str, label: str, buckets: tuple = SECONDS_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float) -> None:
+        histogram = self.series.get(label_value)
+        if histogram is None:
+            with self._lock:
+                histogram = self.series.setdefault(label_value, Histogram(self.buckets))
+        histogram.observe(value)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        series = sorted(self.series.items())
+        for label_value, histogram in series:
+            bucket_counts, total, count = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                lines.append(f"{self.name}_bucket{_labels({self.label: label_value, 'le': le})} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels({self.label: label_value})} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels({self.label: label_value})} {count}")
+
+        recent = f"{self.name}_recent"
+        lines += [f"# HELP {recent} {self.help_text} (last {WINDOW} observations)", f"# TYPE {recent} summary"]
+        for label_value, histogram in series:
+            for q, value in histogram.quantiles().items():
+                lines.append(f"{recent}{_labels({self.label: label_value, 'quantile': q})} {_number(value)}")
+            values = list(histogram.recent)
+            lines.append(f"{recent}_sum{_labels({self.label: label_value})} {_number(sum(values))}")
+            lines.append(f"{recent}_count{_labels({self.label: label_value})} {len(values)}")
+        return lines
+
+
+# --------------- SLOW QUERY LOG ---------------
+class SlowQueryLog:
+    """
+    Appends one JSON line per query that took at least threshold seconds:
+    its parameters, stage timings and counts. Written to path, or printed
+    when path is empty.
+    """
+
+    def __init__(self, threshold: float, path: str = ""):
+        self.threshold = threshold
+        self.path = path
+        self._lock = threading.Lock()
+
+    def log(self, seconds: float, params: dict, stats: SearchStats, **extra) -> None:
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seconds": round(seconds, 6),
+            "params": params,
+            "stages": {stage: round(value, 6) for stage, value in stats.seconds.items()},
+            "counts": stats.counts,
+            **extra,
+        }
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            if not self.path:
+                print(f"Slow query: {line}")
+                return
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+# --------------- SEARCH METRICS ---------------
+# Counters exported as <name>_total
+COUNTERS = {
+    "debatevault_query_cache_hits": "Searches answered from the query cache",
+    "debatevault_query_cache_misses": "Searches that had to be ranked",
+    "debatevault_search_coalesced": "Searches that shared an identical in-flight search",
+    "debatevault_search_cancelled": "Searches cancelled before they ran because every client went away",
+    "debatevault_search_disconnected": "Requests whose client went away while waiting for a search",
+    "debatevault_search_errors": "Requests to /data that failed",
+    "debatevault_search_candidates": "Cards found by the index for a search (scanned)",
+    "debatevault_search_matches": "Cards scoring at least MIN_SCORE (scored)",
+    "debatevault_search_results": "Cards scoring at least MIN_SCORE that passed the filters",
+    "debatevault_search_ranked": "Results whose BM25F relevance was fully computed (Python scorer)",
+    "debatevault_slow_queries": "Searches written to the slow query log",
+}
+
+
+class SearchMetrics:
+    """
+    Everything /metrics reports for one web worker process: request and
+    per-stage latency histograms, card count histograms and counters.
+    Stage timings of the search engine are observed once per search that
+    actually ran (not once per coalesced request).
+    """
+
+    def __init__(self, slow_query_seconds: float = 0.0, slow_query_log: str = ""):
+        self.requests = HistogramFamily("debatevault_request_seconds", "Request latency", "endpoint")
+        self.stages = HistogramFamily("debatevault_search_stage_seconds", "Time spent per /data stage", "stage")
+        self.cards = HistogramFamily("debatevault_search_cards", "Cards per search", "kind", COUNT_BUCKETS)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.slow_log = SlowQueryLog(slow_query_seconds, slow_query_log) if slow_query_seconds > 0 else None
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    def observe_search(self, stats: SearchStats) -> None:
+        """
+        Record the stage timings and counts of a search the engine ran.
+        """
+        for stage, seconds in stats.seconds.items():
+            self.stages.observe(stage, seconds)
+        for kind, value in stats.counts.items():
+            self.cards.observe(kind, value)
+            self.inc(f"debatevault_search_{kind}", value)
+
+    def observe_request(self, endpoint: str, seconds: float, stats: Optional[SearchStats] = None,
+                        params: Optional[dict] = None, search_stats: Optional[SearchStats] = None,
+                        **extra) -> None:
+        """
+        Record a request's latency and the stages timed outside the engine,
+        and log it if it was slow. search_stats are the engine's stages of
+        the search this request ran, if any: observe_search already recorded
+        them, so they only go into the slow query log.
+        """
+        self.requests.observe(endpoint, seconds)
+        if stats is None:
+            return
+        for stage, seconds_in_stage in stats.seconds.items():
+            self.stages.observe(stage, seconds_in_stage)
+        if self.slow_log is not None and seconds >= self.slow_log.threshold:
+            self.inc("debatevault_slow_queries")
+            if search_stats is not None:
+                merged = SearchStats()
+                merged.add(stats)
+                merged.add(search_stats)
+                stats = merged
+            self.slow_log.log(seconds, params or {}, stats, **extra)
+
+    def render(self, gauges: Optional[dict] = None) -> str:
+        """
+        The Prometheus text exposition of every metric, plus the given
+        {name: (help, value)} gauges.
+        """
+        lines = []
+        for family in (self.requests, self.stages, self.cards):
+            lines += family.render()
+        with self._lock:
+            counters = dict(self.counters)
+        for name, help_text in COUNTERS.items():
+            lines += [f"# HELP {name}_total {help_text}", f"# TYPE {name}_total counter",
+                      f"{name}_total {counters[name]}"]
+        lookups = counters["debatevault_query_cache_hits"] + counters["debatevault_query_cache_misses"]
+        gauges = {
+            "debatevault_query_cache_hit_ratio": ("Share of searches answered from the query cache",
+                                                  counters["debatevault_query_cache_hits"] / lookups if lookups else 0.0),
+            **(gauges or {}),
+        }
+        for name, (help_text, value) in gauges.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {_number(value)}"]
+        return "\n".join(lines) + "\n"
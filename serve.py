@@ -0,0 +1,46 @@
+import argparse
+import os
+
+import uvicorn
+
+from build_corpus import build_corpus, load_json_cards
+from corpus_file import FORMAT_VERSION, corpus_version
+from settings import CORPUS_FILE, DATA_FILE
+
+
+# Build CORPUS_FILE from DATA_FILE if it is missing, older than the JSON or
+# written in an older format. This runs once in the parent, before any worker
+# starts, so every worker just memory-maps the same file and shares its pages.
+def ensure_corpus_file():
+    if os.path.exists(CORPUS_FILE) and corpus_version(CORPUS_FILE) != FORMAT_VERSION:
+        if not os.path.exists(DATA_FILE):
+            raise RuntimeError(f"{CORPUS_FILE} has an old format and {DATA_FILE} was not found to rebuild it")
+        print(f"{CORPUS_FILE} has an old format, rebuilding it from {DATA_FILE}")
+    elif os.path.exists(CORPUS_FILE):
+        if not os.path.exists(DATA_FILE) or os.path.getmtime(CORPUS_FILE) >= os.path.getmtime(DATA_FILE):
+            return
+        print(f"{DATA_FILE} changed, rebuilding {CORPUS_FILE}")
+    elif not os.path.exists(DATA_FILE):
+        raise RuntimeError(f"Data file not found: {DATA_FILE}")
+    else:
+        print(f"{CORPUS_FILE} not found, building it from {DATA_FILE}")
+
+    build_corpus(load_json_cards(DATA_FILE), CORPUS_FILE)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run DebateVault with several uvicorn workers sharing one corpus file.")
+    parser.add_argument("--host", default="127.0.0.1", help="Host to bind")
+    parser.add_argument("--port", type=int, default=8000, help="Port to bind")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes")
+    args = parser.parse_args()
+
+    ensure_corpus_file()
+
+    # Workers split the CPU cores between their search worker pools (see
+    # settings.py) instead of each starting one search process per core
+    os.environ["DEBATEVAULT_WEB_WORKERS"] = str(args.workers)
+
+    # Workers import main.py, which memory-maps CORPUS_FILE instead of
+    # parsing DATA_FILE, so N workers do not hold N copies of the corpus
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
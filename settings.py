@@ -0,0 +1,60 @@
+import os
+
+# --------------- PATHS ---------------
+# By default the cards are read from data/final/processed_cards.json in the
+# repository (where the card processing pipeline writes them), and the corpus
+# file is built next to it with build_corpus.py. Every setting here can also
+# be overridden with the environment variable of the same name prefixed with
+# DEBATEVAULT_ (e.g. DEBATEVAULT_DATA_FILE).
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.environ.get("DEBATEVAULT_STATIC_DIR", os.path.join(ROOT, "static"))
+DATA_FILE = os.environ.get("DEBATEVAULT_DATA_FILE", os.path.join(ROOT, "data", "final", "processed_cards.json"))
+CORPUS_FILE = os.environ.get("DEBATEVAULT_CORPUS_FILE", os.path.splitext(DATA_FILE)[0] + ".corpus")
+
+# --------------- SEARCH WORKERS ---------------
+# Number of uvicorn worker processes serving the app (serve.py sets it for the
+# workers it starts). Every one of them has its own pool of search workers.
+WEB_WORKERS = max(1, int(os.environ.get("DEBATEVAULT_WEB_WORKERS", 1)))
+
+# Number of processes per web worker that run searches off the event loop
+# (needs CORPUS_FILE, which every search process memory-maps). By default the
+# CPU cores are split between the web workers, so N web workers do not start
+# N times one search process per core. 0 runs searches on the threadpool of
+# the web process instead.
+SEARCH_WORKERS = int(os.environ.get("DEBATEVAULT_SEARCH_WORKERS", max(1, (os.cpu_count() or 1) // WEB_WORKERS)))
+
+# --------------- SCORING ---------------
+# Scoring backend for /data searches: "python" or "numpy" (vectorized, and
+# the default since BM25F ranking, which costs the Python scorer two to three
+# times the time of presence ranking)
+SCORER = os.environ.get("DEBATEVAULT_SCORER", "numpy")
+
+# How matches are ordered: "bm25f" (relevance of the search words in the
+# tagline, evidence and citation, with the duplicate count) or "presence"
+# (the summed field weights of the words found, ties in corpus order)
+RANKING = os.environ.get("DEBATEVAULT_RANKING", "bm25f")
+
+# How search tokens match card text: "substring" (a token matches anywhere in
+# a word, as it always has) or "prefix" (a token only matches the start of a
+# word, answered by binary search over the sorted terms instead of a scan,
+# which suits as-you-type queries)
+MATCH_MODE = os.environ.get("DEBATEVAULT_MATCH_MODE", "substring")
+
+# --------------- RELOADING ---------------
+# How often (in seconds) each worker checks whether DATA_FILE changed (then
+# the corpus is rebuilt and swapped in without a restart) or another worker
+# rebuilt the corpus or appended cards to it. 0 turns the check off.
+RELOAD_POLL_SECONDS = float(os.environ.get("DEBATEVAULT_RELOAD_POLL_SECONDS", 30))
+
+# Token the /admin endpoints require in the X-Admin-Token header. The admin
+# endpoints are disabled while it is empty.
+ADMIN_TOKEN = os.environ.get("DEBATEVAULT_ADMIN_TOKEN", "")
+
+# --------------- METRICS ---------------
+# /data requests taking at least this many seconds are logged with their
+# query parameters and stage timings (one JSON line each). 0 turns the slow
+# query log off.
+SLOW_QUERY_SECONDS = float(os.environ.get("DEBATEVAULT_SLOW_QUERY_SECONDS", 0))
+
+# File the slow query log is appended to; printed to stdout when empty
+SLOW_QUERY_LOG = os.environ.get("DEBATEVAULT_SLOW_QUERY_LOG", "")
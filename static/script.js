@@ -1,6 +1,12 @@
 let page = 1;
 let loading = false;
 let noMoreData = false; // To indicate no more pages are available
+let currentController = null; // Aborts the in-flight request when a newer one starts
+let suggestController = null; // Same for autocomplete requests
+let corpusVersion = null; // Corpus version of the card ids on the page (see /data)
+const evidenceCache = new Map(); // Card id -> evidence, once loaded from /cards
+const pendingEvidence = new Set(); // Card ids whose evidence is about to be loaded
+const MAX_BATCH_CARDS = 100; // Most cards one /cards request returns
 
 
 // Debounce function to optimize search input
@@ -40,7 +46,8 @@ async function fetchData() {
         ...(event && { event }),
         ...(evidence_set && { evidence_set }),
         page,
-        size: 50
+        size: 50,
+        view: 'compact' // Evidence is loaded as cards scroll into view
     });
 
     console.log("Query Parameters Sent to Backend:", params.toString());
@@ -51,7 +58,16 @@ async function fetchData() {
         document.getElementById('loading').style.display = 'block';
         console.log("Loading indicator displayed.");
 
-        const response = await fetch(`/data?${params}`);
+        // A new query (page 1) supersedes whatever is still loading, so abort
+        // it and let the backend cancel its search
+        if (currentController && page === 1) {
+            currentController.abort();
+            console.log("Aborted superseded request.");
+        }
+        const controller = new AbortController();
+        currentController = controller;
+
+        const response = await fetch(`/data?${params}`, { signal: controller.signal });
         console.log("Fetch request sent. Awaiting response...");
 
         if (!response.ok) {
@@ -67,6 +83,12 @@ async function fetchData() {
         const data = await response.json();
         console.log("Data received from backend:", data);
 
+        // Ignore a response that a newer query superseded while it was parsed
+        if (controller !== currentController) {
+            console.log("Discarding response of a superseded request.");
+            return;
+        }
+
         // Validate response structure
         if (!data || typeof data !== 'object') {
             console.error("Invalid data format received:", data);
@@ -89,6 +111,17 @@ async function fetchData() {
             console.log(`Found ${data.total} result${data.total > 1 ? 's' : ''}.`);
         }
 
+        // Cards fetched by id must come from the same version of the corpus
+        if (data.version !== corpusVersion) {
+            evidenceCache.clear();
+            corpusVersion = data.version;
+        }
+
+        // Show how many cards each filter value has for the current query
+        if (page === 1 && data.facets) {
+            updateFacetCounts(data.facets);
+        }
+
         console.log("Rendering cards:", data.cards);
         renderCards(data.cards);
 
@@ -105,6 +138,11 @@ async function fetchData() {
         console.log("Loading indicator hidden after successful fetch.");
 
     } catch (err) {
+        if (err.name === 'AbortError') {
+            // Superseded by a newer query, which owns the loading indicator now
+            console.log("Fetch aborted for a newer query.");
+            return;
+        }
         console.error("Fetch Error:", err);
         alert("Error loading data.");
         loading = false;
@@ -113,6 +151,36 @@ async function fetchData() {
     }
 }
 
+// Add facet counts from the backend to the filter dropdown labels
+function updateFacetCounts(facets) {
+    console.log("=== updateFacetCounts Called ===", facets);
+    const facetSelects = {
+        side: 'sideFilter',
+        event: 'eventFilter',
+        topic: 'topicFilter',
+        evidence_set: 'evidenceSetFilter'
+    };
+
+    Object.entries(facetSelects).forEach(([field, selectId]) => {
+        // Facet values are matched case-insensitively, like the filters
+        const counts = {};
+        Object.entries(facets[field] || {}).forEach(([value, count]) => {
+            counts[value.toLowerCase()] = (counts[value.toLowerCase()] || 0) + count;
+        });
+
+        Array.from(document.getElementById(selectId).options).forEach(option => {
+            if (!option.value) {
+                return; // "All ..." option has no count
+            }
+            if (!option.dataset.label) {
+                option.dataset.label = option.textContent;
+            }
+            const count = counts[option.value.toLowerCase()] || 0;
+            option.textContent = `${option.dataset.label} (${count.toLocaleString()})`;
+        });
+    });
+}
+
 // Render cards dynamically
 function renderCards(cards) {
     console.log("=== renderCards Called ===", cards);
@@ -128,6 +196,8 @@ function renderCards(cards) {
     // If first page and we have results, clear existing content first
     if (page === 1 && cards.length > 0) {
         container.innerHTML = '';
+        evidenceObserver.disconnect();
+        pendingEvidence.clear();
         console.log("Cleared existing cards for the first page.");
     }
 
@@ -140,17 +210,7 @@ function renderCards(cards) {
     cards.forEach(card => {
         const cardDiv = document.createElement('div');
         cardDiv.className = 'card';
-
-        // Handle 'evidence' being either an array or a string
-        let evidenceContent = 'No evidence';
-        if (Array.isArray(card.evidence)) {
-            evidenceContent = card.evidence.join('<br>');
-        } else if (typeof card.evidence === 'string') {
-            evidenceContent = card.evidence;
-        } else if (card.evidence && typeof card.evidence === 'object') {
-            // Handle other object types if necessary
-            evidenceContent = JSON.stringify(card.evidence);
-        }
+        cardDiv.dataset.cardId = card.id;
 
         cardDiv.innerHTML = `
             <div class="copy-button-container">
@@ -162,23 +222,109 @@ function renderCards(cards) {
                     title="Copy Card"
                 />
             </div>
-            <div class="tagline">${card.tagline || 'No tagline'}</div>
+            <div class="tagline"></div>
             <div class="citation">${card.citation || 'No citation'}</div>
             <div class="additional-info">
                 <button>${card.side || 'N/A'}</button>
                 <button>${card.event || 'N/A'}</button>
                 <button>${card.topic || 'N/A'}</button>
             </div>
-            <div class="evidence">${evidenceContent}</div>
+            <div class="evidence"><div class="snippet"></div></div>
         `;
+        // Show the snippet until the evidence is loaded, with the search
+        // matches the backend found highlighted in it and in the tagline
+        showHighlighted(cardDiv.querySelector('.tagline'), card.tagline || 'No tagline', card.tagline_matches);
+        showHighlighted(cardDiv.querySelector('.snippet'), card.snippet || '', card.snippet_matches);
         container.appendChild(cardDiv);
+        if (evidenceCache.has(card.id)) {
+            showEvidence(cardDiv, evidenceCache.get(card.id));
+        } else {
+            evidenceObserver.observe(cardDiv);
+        }
         console.log("Rendered card:", card);
     });
 }
 
+// Fill an element with text, wrapping the [start, end) character ranges in
+// highlight spans (offsets count code points, like Python strings)
+function showHighlighted(element, text, ranges) {
+    const chars = Array.from(text);
+    let last = 0;
+    element.textContent = '';
+    (ranges || []).forEach(([start, end]) => {
+        element.append(chars.slice(last, start).join(''));
+        const match = document.createElement('span');
+        match.className = 'match';
+        match.textContent = chars.slice(start, end).join('');
+        element.append(match);
+        last = end;
+    });
+    element.append(chars.slice(last).join(''));
+}
+
+// Evidence markup of a card: 'evidence' is either an array or a string
+function evidenceHtml(evidence) {
+    if (Array.isArray(evidence)) {
+        return evidence.join('<br>');
+    } else if (typeof evidence === 'string') {
+        return evidence;
+    } else if (evidence && typeof evidence === 'object') {
+        // Handle other object types if necessary
+        return JSON.stringify(evidence);
+    }
+    return 'No evidence';
+}
+
+function showEvidence(cardDiv, evidence) {
+    cardDiv.querySelector('.evidence').innerHTML = evidenceHtml(evidence);
+    cardDiv.dataset.evidenceLoaded = 'true';
+}
+
+// Load the evidence of cards from /cards (in batches) and show it on every
+// rendered card with those ids
+async function loadEvidence(cardIds) {
+    const version = corpusVersion;
+    for (let start = 0; start < cardIds.length; start += MAX_BATCH_CARDS) {
+        const batch = cardIds.slice(start, start + MAX_BATCH_CARDS);
+        const response = await fetch(`/cards?${new URLSearchParams({ ids: batch.join(','), v: version })}`);
+        if (!response.ok) {
+            console.error("Failed to load evidence:", await response.text());
+            continue;
+        }
+        const data = await response.json();
+        if (data.version !== corpusVersion) {
+            return; // The corpus was reloaded meanwhile; the ids are stale
+        }
+        data.cards.forEach((card, i) => {
+            evidenceCache.set(batch[i], card.evidence);
+            document.querySelectorAll(`.card[data-card-id="${batch[i]}"]`).forEach(cardDiv => {
+                showEvidence(cardDiv, card.evidence);
+            });
+        });
+    }
+}
+
+// Collect the cards coming into view for a moment, then load their
+// evidence with one request
+const flushPendingEvidence = debounce(() => {
+    const cardIds = Array.from(pendingEvidence);
+    pendingEvidence.clear();
+    loadEvidence(cardIds).catch(err => console.error("Evidence Error:", err));
+}, 50);
+
+const evidenceObserver = new IntersectionObserver(entries => {
+    entries.forEach(entry => {
+        if (entry.isIntersecting) {
+            evidenceObserver.unobserve(entry.target);
+            pendingEvidence.add(Number(entry.target.dataset.cardId));
+            flushPendingEvidence();
+        }
+    });
+}, { rootMargin: '800px 0px' });
+
 
 // Copy the text of a card
-function copyCardText(copyButton) {
+async function copyCardText(copyButton) {
     console.log("=== copyCardText Called ===");
     try {
         const cardDiv = copyButton.closest('.card');
@@ -187,6 +333,11 @@ function copyCardText(copyButton) {
             return;
         }
 
+        // Copy the whole evidence, not the snippet
+        if (!cardDiv.dataset.evidenceLoaded) {
+            await loadEvidence([Number(cardDiv.dataset.cardId)]);
+        }
+
         const clonedCard = cardDiv.cloneNode(true);
 
         // Remove unnecessary elements
@@ -252,6 +403,45 @@ const debouncedFetchData = debounce(() => {
     fetchData();
 }, 300);
 
+// Fill the search box's autocomplete list with completions from /suggest
+async function fetchSuggestions() {
+    const query = document.getElementById('searchInput').value;
+    const datalist = document.getElementById('searchSuggestions');
+    if (!query.trim()) {
+        datalist.innerHTML = '';
+        return;
+    }
+
+    if (suggestController) {
+        suggestController.abort();
+    }
+    const controller = new AbortController();
+    suggestController = controller;
+
+    try {
+        const response = await fetch(`/suggest?${new URLSearchParams({ q: query, limit: 8 })}`, { signal: controller.signal });
+        if (!response.ok) {
+            return;
+        }
+        const data = await response.json();
+        if (controller !== suggestController) {
+            return;
+        }
+        datalist.innerHTML = '';
+        data.suggestions.forEach(suggestion => {
+            const option = document.createElement('option');
+            option.value = suggestion.text;
+            datalist.appendChild(option);
+        });
+    } catch (err) {
+        if (err.name !== 'AbortError') {
+            console.error("Suggest Error:", err);
+        }
+    }
+}
+
+const debouncedFetchSuggestions = debounce(fetchSuggestions, 100);
+
 function resetFilters() {
     // Reset side, event, topic to empty
     document.getElementById('sideFilter').value = '';
@@ -272,6 +462,7 @@ window.addEventListener('scroll', handleScroll);
 
 // Search input with debounce
 document.getElementById('searchInput').addEventListener('input', debouncedFetchData);
+document.getElementById('searchInput').addEventListener('input', debouncedFetchSuggestions);
 
 // Other filters with immediate fetch
 document.getElementById('sideFilter').addEventListener('change', applyFilters);
@@ -0,0 +1,145 @@
+from array import array
+import heapq
+import re
+
+from search_index import TERM_SEPARATOR, SortedTerms
+
+# Words of a tagline for completions (punctuation is dropped, apostrophes kept)
+WORD_PATTERN = re.compile(r"\w+(?:'\w+)*")
+
+# Completions are single words and two-word phrases of taglines
+MAX_PHRASE_WORDS = 2
+
+# Two-word phrases are only kept if their cards' weights add up to this much
+MIN_PHRASE_WEIGHT = 2
+
+# Prefix ranges up to this size are ranked directly; larger ones are answered
+# by walking the completions in descending weight order instead
+RANGE_SCAN_LIMIT = 2048
+
+
+# --------------- HELPER FUNCTIONS ---------------
+def card_weight(card: dict) -> int:
+    """
+    Weight a card adds to the completions in its tagline: its duplicate_count
+    (how many cards had the same tagline), or 1 if missing or not a number.
+    """
+    try:
+        return max(int(card.get("duplicate_count", 1)), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+# --------------- SUGGEST INDEX ---------------
+class SuggestIndex:
+    """
+    Autocomplete index over the words and two-word phrases of every tagline.
+
+    Completions are sorted and stored back to back in one bytes blob (like
+    the term blob of a FieldIndex), so all completions of a prefix form one
+    contiguous range found with two binary searches. Each completion has a
+    weight, the summed duplicate_count of the cards whose tagline contains
+    it. by_weight lists the completions from heaviest to lightest, which
+    answers short prefixes with huge ranges without ranking the whole range.
+    """
+
+    def __init__(self, blob: bytes, offsets: array, weights: array, by_weight: array):
+        self.blob = blob              # b"completion1\ncompletion2\n..."
+        self.offsets = offsets        # start of completion i in blob, plus end sentinel
+        self.weights = weights        # completion id -> weight
+        self.by_weight = by_weight    # completion ids by descending weight, ties in sorted order
+        self.keys = SortedTerms(blob, offsets)
+
+    @classmethod
+    def from_cards(cls, cards: list[dict]) -> "SuggestIndex":
+        totals = {}
+        for card in cards:
+            words = WORD_PATTERN.findall(card.get("tagline", "").lower())
+            phrases = set(words)
+            for size in range(2, MAX_PHRASE_WORDS + 1):
+                phrases.update(" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+            weight = card_weight(card)
+            for phrase in phrases:
+                totals[phrase] = totals.get(phrase, 0) + weight
+
+        blob = bytearray()
+        offsets = array("Q")
+        weights = array("Q")
+        for phrase in sorted(totals):
+            weight = totals[phrase]
+            if " " in phrase and weight < MIN_PHRASE_WEIGHT:
+                continue
+            offsets.append(len(blob))
+            blob += phrase.encode("utf-8")
+            blob += TERM_SEPARATOR
+            weights.append(weight)
+        offsets.append(len(blob))
+
+        by_weight = array("I", sorted(range(len(weights)), key=lambda i: -weights[i]))
+        return cls(bytes(blob), offsets, weights, by_weight)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def completion(self, completion_id: int) -> str:
+        return self.keys[completion_id].decode("utf-8")
+
+    def top(self, prefix: str, limit: int = 10) -> list[tuple[str, int]]:
+        """
+        Return up to limit (completion, weight) pairs starting with prefix,
+        heaviest first.
+        """
+        matches = self.keys.prefix_range(prefix.encode("utf-8"))
+        if len(matches) <= RANGE_SCAN_LIMIT:
+            weights = self.weights
+            ids = heapq.nsmallest(limit, matches, key=lambda i: (-weights[i], i))
+        else:
+            ids = []
+            for completion_id in self.by_weight:
+                if completion_id in matches:
+                    ids.append(completion_id)
+                    if len(ids) == limit:
+                        break
+        return [(self.completion(i), self.weights[i]) for i in ids]
+
+    def weight(self, completion: str) -> int:
+        """
+        Return the weight of an exact completion, 0 if it is not indexed.
+        """
+        key = completion.encode("utf-8")
+        matches = self.keys.prefix_range(key)
+        if matches and self.keys[matches.start] == key:
+            return self.weights[matches.start]
+        return 0
+
+    def suggest(self, query: str, limit: int = 10) -> list[dict]:
+        """
+        Complete what the user has typed so far. The last MAX_PHRASE_WORDS
+        words are completed and any earlier words are kept as they are.
+        """
+        split = split_query(query)
+        if split is None or limit <= 0:
+            return []
+        lead, prefix = split
+        return [
+            {"text": f"{lead} {text}" if lead else text, "weight": weight}
+            for text, weight in self.top(prefix, limit)
+        ]
+
+
+def split_query(query: str):
+    """
+    Split a typed query into (lead, prefix): the prefix to complete and the
+    earlier words kept in front of every completion. None if there are no
+    words.
+    """
+    words = WORD_PATTERN.findall(query.lower())
+    if not words:
+        return None
+    # A trailing space means the last word is finished, so only complete
+    # phrases that continue it
+    finished = query[-1:].isspace()
+    prefix_words = words[-(MAX_PHRASE_WORDS - 1 if finished else MAX_PHRASE_WORDS):]
+    prefix = " ".join(prefix_words) + (" " if finished else "")
+    lead = " ".join(words[:-len(prefix_words)])
+    return lead, prefix
@@ -0,0 +1,49 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from card_shards import ShardWriter, remove_file_cards
+from extract_manifest import FileEntry
+
+
+def make_card(file_path, number):
+    return {'tagline': f'tag {number}', 'citation': 'cite', 'evidence': ['text'], 'side': 'Aff',
+            'event': 'PF', 'topic': 'topic', 'file_path': file_path}
+
+
+def test_remove_file_cards_drops_torn_last_line(tmp_path, capsys):
+    writer = ShardWriter(str(tmp_path))
+    writer.write([make_card('done.docx', number) for number in range(3)])
+    writer.write([make_card('unfinished.docx', number) for number in range(2)])
+    writer.close()
+
+    # A crash in the middle of writing the unfinished file's last card
+    shard_path = tmp_path / writer.shard
+    data = shard_path.read_bytes()
+    shard_path.write_bytes(data[:len(data) - 20])
+
+    entry = FileEntry('unfinished.docx', 0, 0, '', writer.shard, 2, False)
+    remove_file_cards(str(tmp_path), [entry])
+
+    cards = [json.loads(line) for line in shard_path.read_text(encoding='utf-8').splitlines()]
+    assert [card['file_path'] for card in cards] == ['done.docx'] * 3
+    assert 'Removed 2 cards' in capsys.readouterr().out
+
+
+def test_remove_file_cards_keeps_whole_card_without_newline(tmp_path):
+    writer = ShardWriter(str(tmp_path))
+    writer.write([make_card('done.docx', number) for number in range(2)])
+    writer.close()
+
+    # Cut off only the newline after the last card
+    shard_path = tmp_path / writer.shard
+    shard_path.write_bytes(shard_path.read_bytes()[:-1])
+
+    entry = FileEntry('other.docx', 0, 0, '', writer.shard, 1, False)
+    remove_file_cards(str(tmp_path), [entry])
+
+    text = shard_path.read_text(encoding='utf-8')
+    assert text.endswith('\n')
+    assert [json.loads(line)['tagline'] for line in text.splitlines()] == ['tag 0', 'tag 1']
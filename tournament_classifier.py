@@ -0,0 +1,137 @@
+from functools import lru_cache
+import json
+import os
+import re
+
+# Tournament and topic tables of the season being extracted. Add a file per
+# season to seasons/ and pass it to extract_cards.py with --season_file.
+DEFAULT_SEASON_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "seasons", "2024-25.json")
+
+# Extensions extract_cards.py can parse
+CARD_EXTENSIONS = (".docx", ".pdf")
+
+
+def trie_pattern(names) -> str:
+    """
+    Regex matching any of the names, with their common prefixes factored
+    out (e.g. "b(?:l(?:ake|ue)|vsw)"). Python's re tries the alternatives of
+    a plain "a|b|c" one by one at every position; in the trie at most one
+    branch can match the next character, so a search costs about the same
+    for 90 names as for one. At a given position it matches the longest of
+    the names starting there.
+    """
+    trie = {}
+    for name in names:
+        node = trie
+        for char in name:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        optional = "" in node
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")" + ("?" if optional else "")
+
+    return build(trie)
+
+
+class TournamentClassifier:
+    """
+    Classifies file names by the tournament tables of one season, with each
+    table compiled into a single trie regex instead of a loop of substring
+    checks.
+
+    - wanted(name): whether a file name has a card extension and contains one
+      of the season's tournaments (the files extract_cards.py processes)
+    - topic(path): the topic of the first table (in file order) with a
+      tournament in the path, or None
+
+    Names are lowercased first, like the tables.
+    """
+
+    def __init__(self, season: dict):
+        self.season = season.get("season")
+        self.topics = [table["topic"] for table in season["topics"]]
+        self.tournament_pattern = re.compile(trie_pattern(season["tournaments"]))
+
+        # Priority of every topic tournament (the position of its table)
+        priority = {}
+        for position, table in enumerate(season["topics"]):
+            for name in table["tournaments"]:
+                priority.setdefault(name, position)
+        # One search over all the topic tournaments at once, as a lookahead
+        # so overlapping names are all found. At each position it reports
+        # the longest name starting there; every other name starting there
+        # is a prefix of it, so it stands for the best priority among its
+        # prefixes.
+        self.best_priority = {
+            name: min(priority[prefix] for prefix in priority if name.startswith(prefix)) for name in priority
+        }
+        pattern = trie_pattern(priority)
+        self.any_topic_pattern = re.compile(pattern)
+        self.topic_pattern = re.compile(f"(?=({pattern}))")
+
+    def wanted(self, name: str) -> bool:
+        name = name.lower()
+        return name.endswith(CARD_EXTENSIONS) and self.tournament_pattern.search(name) is not None
+
+    def topic(self, path: str):
+        path = path.lower()
+        # A plain search skips ahead to the first candidate much faster than
+        # the lookahead, which is tried at every position
+        first = self.any_topic_pattern.search(path)
+        if first is None:
+            return None
+        best = None
+        for match in self.topic_pattern.finditer(path, first.start()):
+            priority = self.best_priority[match.group(1)]
+            if best is None or priority < best:
+                best = priority
+                if best == 0:
+                    break
+        return None if best is None else self.topics[best]
+
+
+@lru_cache(maxsize=None)
+def load_classifier(season_file: str = DEFAULT_SEASON_FILE) -> TournamentClassifier:
+    """
+    Return the classifier of a season file (loaded and compiled once per
+    process).
+    """
+    with open(season_file, "r", encoding="utf-8") as f:
+        return TournamentClassifier(json.load(f))
+
+
+def scan_files(root_folder: str, classifier: TournamentClassifier) -> list[str]:
+    """
+    Return the paths of the wanted files under root_folder, in the order
+    os.walk would list them. Directories are read with os.scandir, whose
+    entries already know whether they are directories, so no file is
+    stat()ed; symlinked directories are not followed.
+    """
+    found = []
+    wanted = classifier.wanted
+    stack = [root_folder]
+    while stack:
+        folder = stack.pop()
+        subfolders = []
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        if not entry.is_symlink():
+                            subfolders.append(entry.path)
+                    elif wanted(entry.name):
+                        found.append(entry.path)
+        except OSError:
+            continue
+        stack.extend(reversed(subfolders))
+    return found